@@ -122,6 +122,10 @@ if (!defined('PYTHON_SERVICE_URL')) {
     // Use 127.0.0.1 instead of localhost for better compatibility
     define('PYTHON_SERVICE_URL', getenv('PYTHON_SERVICE_URL') ?: 'http://127.0.0.1:5001');
 }
+if (!defined('PYTHON_SERVICE_SOCKET')) {
+    // Unix socket the Python service listens on when started with SOCKET_PATH (empty if not)
+    define('PYTHON_SERVICE_SOCKET', getenv('SOCKET_PATH') ?: '');
+}
 
 // Timezone
 date_default_timezone_set('UTC');
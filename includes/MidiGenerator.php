@@ -229,6 +229,9 @@ class MidiGenerator {
                 throw new Exception('Failed to save MIDI file metadata to database');
             }
             
+            // Keep the Python service's output sweeper from deleting project files
+            $this->referenceFile($result['filename']);
+            
             return [
                 'success' => true,
                 'file_id' => $fileId,
@@ -292,6 +295,9 @@ class MidiGenerator {
                 throw new Exception('Failed to save MIDI file metadata to database');
             }
             
+            // Keep the Python service's output sweeper from deleting project files
+            $this->referenceFile($result['filename']);
+            
             return [
                 'success' => true,
                 'file_id' => $fileId,
@@ -355,6 +361,9 @@ class MidiGenerator {
                 throw new Exception('Failed to save MIDI file metadata to database');
             }
             
+            // Keep the Python service's output sweeper from deleting project files
+            $this->referenceFile($result['filename']);
+            
             return [
                 'success' => true,
                 'file_id' => $fileId,
@@ -447,6 +456,124 @@ class MidiGenerator {
         }
     }
     
+    /**
+     * Generate MIDI bytes over the Python service's local Unix socket
+     * (PYTHON_SERVICE_SOCKET; see python_service/local_socket.py for the framing).
+     * Skips TCP, HTTP and JSON, and the service doesn't save a file.
+     * 
+     * @param string $type 'bass', 'complex-chords' or 'simple-chords'
+     * @param array $options Optional parameters (seed, scale, rhythm, key, format)
+     * @return array ['success' => bool, 'midi' => string, 'error' => string]
+     */
+    public function generateMidiBytes($type, $options = []) {
+        try {
+            $generators = ['bass' => 0, 'complex-chords' => 1, 'simple-chords' => 2];
+            if (!isset($generators[$type])) {
+                throw new Exception('Unknown generator: ' . $type);
+            }
+            if (!defined('PYTHON_SERVICE_SOCKET') || PYTHON_SERVICE_SOCKET === '') {
+                throw new Exception('PYTHON_SERVICE_SOCKET is not configured');
+            }
+            
+            $scale = $options['scale'] ?? [];
+            $rhythm = $options['rhythm'] ?? [];
+            $key = $options['key'] ?? '';
+            $flags = (isset($options['seed']) ? 1 : 0) | (($options['format'] ?? 0) == 1 ? 2 : 0);
+            
+            // Header, then the key name, one byte per scale note and four per rhythm tick
+            $body = pack('CCCCJnN', 1, $generators[$type], $flags, strlen($key), (int) ($options['seed'] ?? 0),
+                         count($scale), count($rhythm))
+                . $key
+                . ($scale ? pack('C*', ...$scale) : '')
+                . ($rhythm ? pack('N*', ...$rhythm) : '');
+            
+            $response = $this->socketRequest($body);
+            $header = unpack('nstatus/nretry', $response);
+            
+            if ($header['status'] !== 200) {
+                throw new Exception('Python service returned ' . $header['status'] . ': ' . substr($response, 4));
+            }
+            
+            return [
+                'success' => true,
+                'midi' => substr($response, 4)
+            ];
+            
+        } catch (Exception $e) {
+            error_log('MIDI socket generation error: ' . $e->getMessage());
+            return [
+                'success' => false,
+                'error' => $e->getMessage()
+            ];
+        }
+    }
+    
+    /**
+     * Send one length-prefixed frame on the persistent socket connection and read the reply.
+     * A connection the service has since closed (idle timeout, restart) is replaced once.
+     * 
+     * @param string $body Request frame body
+     * @param bool $retry Whether to reconnect and retry if the connection was closed
+     * @return string Response frame body
+     */
+    private function socketRequest($body, $retry = true) {
+        $socket = @stream_socket_client('unix://' . PYTHON_SERVICE_SOCKET, $errno, $errstr, 5,
+                                        STREAM_CLIENT_CONNECT | STREAM_CLIENT_PERSISTENT);
+        if ($socket === false) {
+            throw new Exception('Socket error: ' . $errstr);
+        }
+        stream_set_timeout($socket, 30);
+        
+        // A failed write still leaves any answer (e.g. 413 for a frame over the limit) to read
+        @fwrite($socket, pack('N', strlen($body)) . $body);
+        $length = $this->readExactly($socket, 4);
+        $response = $length === false ? false : $this->readExactly($socket, unpack('N', $length)[1]);
+        
+        if ($response === false) {
+            fclose($socket);
+            if ($retry) {
+                return $this->socketRequest($body, false);
+            }
+            throw new Exception('Connection closed by the Python service');
+        }
+        return $response;
+    }
+    
+    /**
+     * Read exactly $length bytes from a stream
+     * 
+     * @return string|false The bytes, or false if the stream closed or timed out first
+     */
+    private function readExactly($socket, $length) {
+        $data = '';
+        while (strlen($data) < $length) {
+            $chunk = fread($socket, $length - strlen($data));
+            if ($chunk === false || $chunk === '') {
+                return false;
+            }
+            $data .= $chunk;
+        }
+        return $data;
+    }
+    
+    /**
+     * Add a generated file to the manifest of files that belong to projects
+     * (read by the Python service's output sweeper, which never deletes them)
+     * 
+     * @param string $filename Filename returned by the Python service
+     * @return bool
+     */
+    public function referenceFile($filename) {
+        $manifest = getenv('OUTPUT_MANIFEST') ?: __DIR__ . '/../uploads/midi/referenced.txt';
+        $written = file_put_contents($manifest, basename($filename) . "\n", FILE_APPEND | LOCK_EX);
+        
+        if ($written === false) {
+            error_log('Failed to add ' . $filename . ' to the MIDI file manifest');
+            return false;
+        }
+        return true;
+    }
+    
     /**
      * Test connection to Python service
      * 
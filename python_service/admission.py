@@ -0,0 +1,303 @@
+"""
+Admission Control
+Decides whether a generation request runs, before any work starts
+
+Three checks, cheapest first:
+- Rate limiting: a token bucket per client (RATE_LIMIT_RATE requests per
+  second, bursts of RATE_LIMIT_BURST). Over the limit gets 429.
+- Validation: scale, rhythm, seed, key, format, distribution and filename
+  are type and range checked, and the request's cost (MIDI events: notes x voices x 2) is
+  estimated and capped at MAX_REQUEST_COST. Malformed gets 400, too big 413.
+- Concurrency: in-flight work is bounded by total cost (INFLIGHT_COST_LIMIT
+  events), not request count, so one huge request and many small ones are
+  weighed fairly. A request that can't get capacity within ADMISSION_WAIT
+  seconds gets 503.
+Rejections carry Retry-After. Everything is per process, like the metrics.
+"""
+import math
+import time
+import threading
+from collections import OrderedDict
+from generators import parse_key, parse_distribution, parse_operations, notes_in_duration, STYLES
+from generators.bass import default_scale
+from generators.smf import RESOLUTION
+from storage import check_user_filename
+from config import MAX_REQUEST_COST, MAX_SCALE_NOTES, INFLIGHT_COST_LIMIT, ADMISSION_WAIT
+from config import STREAM_MAX_NOTES, DEFAULT_BPM
+from config import RATE_LIMIT_RATE, RATE_LIMIT_BURST, RATE_LIMIT_CLIENTS
+
+# Notes in the default rhythm (RHYTHM_DATA has 24 points)
+DEFAULT_NOTES = 23
+
+# Largest tick a rhythm may use (MIDI event ticks are int32)
+MAX_TICK = 2 ** 31 - 1
+
+# Fewest bytes a MIDI event takes (delta time plus two data bytes under running
+# status), so a file of n bytes holds at most n / 3 events
+MIN_EVENT_BYTES = 3
+
+# Longest streamed piece in seconds and fastest tempo a request may ask for
+# (STREAM_MAX_NOTES caps the length in notes either way)
+MAX_STREAM_SECONDS = 7 * 24 * 3600
+MAX_BPM = 1000
+
+# Seconds to suggest in Retry-After when the worker is at capacity
+OVERLOAD_RETRY_AFTER = 1
+
+
+class Rejection(Exception):
+    """A request that should not run: HTTP status, message and optional Retry-After seconds"""
+
+    def __init__(self, status, message, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def validate_scale(scale):
+    """None or a non-empty list of MIDI notes"""
+    if scale is None:
+        return
+    if not isinstance(scale, list) or not 0 < len(scale) <= MAX_SCALE_NOTES or \
+            not all(_is_int(note) and 0 <= note <= 127 for note in scale):
+        raise Rejection(400, f'scale must be a list of 1 to {MAX_SCALE_NOTES} MIDI notes (0-127)')
+
+
+def validate_rhythm(rhythm):
+    """
+    None or a list of at least two tick values
+
+    Returns:
+        int: Number of notes the rhythm makes
+    """
+    if rhythm is None:
+        return DEFAULT_NOTES
+    if not isinstance(rhythm, list) or len(rhythm) < 2:
+        raise Rejection(400, 'rhythm must be a list of at least two tick values')
+    if 2 * (len(rhythm) - 1) > MAX_REQUEST_COST:
+        raise Rejection(413, f'rhythm is too long (cost limit {MAX_REQUEST_COST} events)')
+    if not all(_is_int(tick) and 0 <= tick <= MAX_TICK for tick in rhythm):
+        raise Rejection(400, f'rhythm values must be integer ticks between 0 and {MAX_TICK}')
+    return len(rhythm) - 1
+
+
+def validate_format(midi_format):
+    """0 or 1"""
+    if midi_format not in (0, 1) or isinstance(midi_format, bool):
+        raise Rejection(400, 'format must be 0 or 1')
+
+
+def validate_generation(data, job_type):
+    """
+    Check one generation payload (a generate request or one batch job)
+
+    Returns:
+        int: Estimated cost in MIDI events
+    """
+    if job_type not in STYLES:
+        raise Rejection(400, f'Unknown job type: {job_type}')
+    validate_scale(data.get('scale'))
+    num_notes = validate_rhythm(data.get('rhythm'))
+
+    seed = data.get('seed')
+    if seed is not None and not (_is_int(seed) or (isinstance(seed, str) and len(seed) <= 256)):
+        raise Rejection(400, 'seed must be an integer or a short string')
+
+    key = data.get('key')
+    if key is not None:
+        if not isinstance(key, str):
+            raise Rejection(400, 'key must be a key name such as A_MINOR')
+        try:
+            parse_key(key)
+        except ValueError as e:
+            raise Rejection(400, str(e))
+
+    validate_format(data.get('format', 0))
+
+    distribution = data.get('distribution')
+    if distribution is not None:
+        try:
+            parse_distribution(distribution, len(data.get('scale') or default_scale(key)))
+        except ValueError as e:
+            raise Rejection(400, str(e))
+
+    filename = data.get('filename')
+    if filename is not None:
+        if not isinstance(filename, str):
+            raise Rejection(400, 'filename must be a string')
+        try:
+            check_user_filename(filename)
+        except ValueError as e:
+            raise Rejection(400, str(e))
+
+    # Each voice a style writes turns every note on and off
+    cost = 2 * num_notes * len(STYLES[job_type].voices)
+    if cost > MAX_REQUEST_COST:
+        raise Rejection(413, f'Request is too large ({cost} events, limit {MAX_REQUEST_COST})')
+    return cost
+
+
+def _positive_number(value, name, limit):
+    """A finite number above 0 and at most limit"""
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or not math.isfinite(value) or \
+            not 0 < value <= limit:
+        raise Rejection(400, f'{name} must be a number above 0 and at most {limit}')
+    return value
+
+
+def validate_stream_length(data, rhythm):
+    """
+    Length of a streamed piece: "notes", or "seconds" at "bpm" over the looped rhythm
+
+    Returns:
+        int: Number of notes
+    """
+    if data.get('seconds') is not None:
+        seconds = _positive_number(data['seconds'], 'seconds', MAX_STREAM_SECONDS)
+        bpm = _positive_number(data.get('bpm') or DEFAULT_BPM, 'bpm', MAX_BPM)
+        num_notes = notes_in_duration(rhythm, seconds * bpm / 60 * RESOLUTION)
+    else:
+        num_notes = data.get('notes') or 0
+        if isinstance(num_notes, float) and num_notes.is_integer():
+            num_notes = int(num_notes)
+        if not _is_int(num_notes):
+            raise Rejection(400, 'notes must be a whole number')
+
+    if not 0 < num_notes <= STREAM_MAX_NOTES:
+        raise Rejection(400, f'Piece must have between 1 and {STREAM_MAX_NOTES} notes')
+    return num_notes
+
+
+def validate_jobs(jobs, max_jobs):
+    """
+    Check a list of batch job specs; unknown types are left for the per-job results
+
+    Returns:
+        int: Total estimated cost in MIDI events
+    """
+    if not isinstance(jobs, list) or not jobs:
+        raise Rejection(400, 'jobs must be a non-empty list')
+    if len(jobs) > max_jobs:
+        raise Rejection(400, f'Too many jobs (max {max_jobs})')
+
+    total = 0
+    for index, job in enumerate(jobs):
+        if not isinstance(job, dict):
+            raise Rejection(400, f'Job {index} must be an object')
+        if job.get('type') not in STYLES:
+            continue
+        try:
+            total += validate_generation(job, job['type'])
+        except Rejection as e:
+            raise Rejection(e.status, f'Job {index}: {e}')
+    return total
+
+
+def validate_transform(data, sizes, max_files):
+    """
+    Check a transform request: its pipeline, output format and file count
+
+    Cost is estimated from the size of each file (its most possible events,
+    times the voices a revoice writes for each), and capped per file like a
+    single generation.
+
+    Args:
+        data: Request payload with "operations" and optional "format"
+        sizes: Size in bytes of each file to transform
+        max_files: Most files one request may transform
+
+    Returns:
+        tuple: (parsed operations, estimated cost in MIDI events)
+    """
+    if not sizes:
+        raise Rejection(400, 'files must be a non-empty list')
+    if len(sizes) > max_files:
+        raise Rejection(400, f'Too many files (max {max_files})')
+    try:
+        operations = parse_operations(data.get('operations'))
+    except ValueError as e:
+        raise Rejection(400, str(e))
+    validate_format(data.get('format', 0))
+
+    voices = max((len(STYLES[arguments['style']].voices) for name, arguments in operations if name == 'revoice'),
+                 default=1)
+    largest = max(sizes) // MIN_EVENT_BYTES * voices
+    if largest > MAX_REQUEST_COST:
+        raise Rejection(413, f'File is too large ({largest} events, limit {MAX_REQUEST_COST})')
+    return operations, sum(sizes) // MIN_EVENT_BYTES * voices
+
+
+class CostLimiter:
+    """Bounds the total cost of requests in flight; callers wait briefly for capacity, then give up"""
+
+    def __init__(self, capacity=INFLIGHT_COST_LIMIT, wait=ADMISSION_WAIT):
+        self.capacity = capacity
+        self.wait = wait
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, cost):
+        """
+        Reserve capacity for a request (anything bigger than the capacity waits for all of it)
+
+        Returns:
+            int: The cost reserved (pass it to release), or None if there was no capacity in time
+        """
+        if self.capacity <= 0:
+            return 0
+        cost = min(cost, self.capacity)
+        deadline = time.monotonic() + self.wait
+        with self._condition:
+            while self.in_flight + cost > self.capacity:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            self.in_flight += cost
+        return cost
+
+    def release(self, cost):
+        if not cost:
+            return
+        with self._condition:
+            self.in_flight -= cost
+            self._condition.notify_all()
+
+
+class RateLimiter:
+    """Token bucket per client: rate tokens a second up to burst, one token per request"""
+
+    def __init__(self, rate=RATE_LIMIT_RATE, burst=RATE_LIMIT_BURST, max_clients=RATE_LIMIT_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, client):
+        """
+        Take a token for client
+
+        Returns:
+            float: 0 if the request may proceed, otherwise seconds until a token is available
+        """
+        if self.rate <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / self.rate
+            # Most recently seen clients last; the least recent are forgotten first
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
@@ -2,17 +2,484 @@
 Python MIDI Generation Service
 Flask API for generating MIDI files
 """
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file, g
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.wsgi import wrap_file
 from flask_cors import CORS
+from concurrent.futures import ThreadPoolExecutor
+import io
 import os
+import json
+import math
+import hashlib
 import time
+import threading
 import traceback
-from config import PORT, HOST, DEBUG, OUTPUT_DIR
-from generators import generate_bassline, generate_complex_chords, generate_simple_chords
+from config import PORT, HOST, DEBUG, OUTPUT_DIR, DEFAULT_SCALE, MAX_BATCH_JOBS, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES
+from config import MAX_EXPORT_FILES, MAX_TRANSFORM_FILES, MAX_REQUEST_BYTES, MAX_REQUEST_COST, CLIENT_ID_HEADER
+from config import PROFILE_HEADER, DOWNLOAD_MAX_AGE, DEFAULT_BPM, INDEX_ENABLED, PERSIST_QUEUE_SIZE
+from config import PREVIEW_DIR, PREVIEW_SECONDS, PREVIEW_MAX_SECONDS, PREVIEW_SAMPLE_RATE, PREVIEW_TTL, PREVIEW_MAX_BYTES
+from cache import MidiCache, cache_key
+from generators import STYLES, generate_complex_chords_batch, batch_to_midi
+from generators import stream_to_midi, render_preview, SYNTH_VERSION
+from generators.bass import RHYTHM_DATA
+from generators.smf import read_notes
+from workers import run_jobs, run_transforms, iter_rendered, get_note_index, index_written
+from export import COMPRESSION, iter_zip, stored_files
+from jobs import JobManager, QueueFullError
+from storage import OutputSweeper, new_filename, content_filename, is_content_addressed, path_for, write_atomic
+from storage import open_output, file_etag, shard_dir
+from pool import WarmPool
+from admission import Rejection, CostLimiter, RateLimiter, OVERLOAD_RETRY_AFTER
+from admission import validate_generation, validate_jobs, validate_transform, validate_stream_length
+from local_socket import LocalSocketServer, decode_request
+from generators.profiling import stage, start_collecting, stop_collecting
+import metrics
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for PHP frontend
 
+# Bodies over this size get a 413 before they are read
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+
+# Background writer for inline responses that also ask to be saved to disk,
+# and for note index updates after a file is written (at most
+# PERSIST_QUEUE_SIZE waiting, see submit_background)
+persist_executor = ThreadPoolExecutor(max_workers=1)
+persist_slots = threading.BoundedSemaphore(PERSIST_QUEUE_SIZE)
+
+# Encoded MIDI for seeded requests, so repeats skip generation
+midi_cache = MidiCache(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES)
+
+# Background jobs for long or large generations
+job_manager = JobManager()
+
+# Deletes expired generated files (started per worker process)
+output_sweeper = OutputSweeper()
+
+# Deletes cached audio previews (nothing in there is referenced by projects)
+preview_sweeper = OutputSweeper(root=PREVIEW_DIR, ttl=PREVIEW_TTL, max_bytes=PREVIEW_MAX_BYTES, manifest_path=None)
+
+# Admission control: total cost of requests in flight, and per-client request rates
+cost_limiter = CostLimiter()
+rate_limiter = RateLimiter()
+
+# Endpoints that do real work, and so are rate limited per client (plus /api/generate/<style>, see below)
+RATE_LIMITED_ENDPOINTS = {
+    'generate_stream', 'generate_batch', 'submit_job', 'export_archive', 'transform_files', 'preview_file',
+    'index_lookup'
+}
+
+# Pre-rendered variations for default-parameter requests (refilled per worker process)
+warm_pool = WarmPool(in_flight=metrics.requests_in_flight.total)
+
+# Readiness: set once warm_up has run, cleared when a worker starts draining
+service_state = {
+    'ready': False,
+    'draining': False
+}
+
+# Size of OUTPUT_DIR for /metrics (rescanned at most every 30 seconds)
+output_dir_size = metrics.DirectorySize(OUTPUT_DIR)
+
+
+def service_metrics():
+    """Values sampled on each /metrics scrape"""
+    total_bytes, total_files = output_dir_size.get()
+    cache = midi_cache.stats()
+    jobs = job_manager.stats()
+    swept = output_sweeper.stats()
+    pool = warm_pool.stats()
+    return [
+        ('midi_output_dir_bytes', 'gauge', 'Total size of generated files in OUTPUT_DIR', total_bytes),
+        ('midi_output_dir_files', 'gauge', 'Number of generated files in OUTPUT_DIR', total_files),
+        ('midi_cache_entries', 'gauge', 'Entries in the seeded result cache', cache['entries']),
+        ('midi_cache_bytes', 'gauge', 'Bytes held by the seeded result cache', cache['bytes']),
+        ('midi_cache_hits_total', 'counter', 'Seeded result cache hits', cache['hits']),
+        ('midi_cache_misses_total', 'counter', 'Seeded result cache misses', cache['misses']),
+        ('midi_jobs_queued', 'gauge', 'Jobs waiting in this process\'s queue', jobs['queued']),
+        ('midi_output_swept_files_total', 'counter', 'Expired or over-quota files deleted', swept['deleted_files']),
+        ('midi_output_swept_bytes_total', 'counter', 'Bytes freed by the output sweeper', swept['deleted_bytes']),
+        ('midi_pool_hits_total', 'counter', 'Requests served from the warm pool', pool['hits']),
+        ('midi_pool_misses_total', 'counter', 'Eligible requests the warm pool could not serve', pool['misses']),
+        ('midi_pool_hit_ratio', 'gauge', 'Warm pool hits over eligible requests', pool['hit_rate']),
+        ('midi_pool_refills_total', 'counter', 'Variations rendered in the background', pool['refills']),
+        ('midi_pool_ready', 'gauge', 'Pre-rendered variations ready in the warm pool', pool['ready']),
+        ('midi_inflight_cost', 'gauge', 'Estimated MIDI events of the requests running now', cost_limiter.in_flight),
+        ('midi_index_rows', 'gauge', 'Files in the note index (all processes)',
+         get_note_index().count() if INDEX_ENABLED else 0),
+    ]
+
+
+metrics.registry.add_collector(service_metrics)
+
+
+def endpoint_label():
+    """Route pattern of the current request (so /api/jobs/<job_id> is one series)"""
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+@app.before_request
+def start_request_timing():
+    """Start the request clock and stage collection (the body is parsed later, by request_payload)"""
+    g.request_start = time.perf_counter()
+    g.stage_timings, g.stage_token = start_collecting()
+    metrics.requests_in_flight.inc(endpoint_label())
+
+
+def client_id():
+    """Who a request counts against for rate limiting"""
+    return request.headers.get(CLIENT_ID_HEADER) or request.remote_addr or 'unknown'
+
+
+def rejection_response(rejection):
+    """JSON error for a rejected request, with Retry-After when trying again later can succeed"""
+    metrics.admission_rejections.inc(endpoint_label(), rejection.status)
+    response = jsonify({
+        'success': False,
+        'error': str(rejection)
+    })
+    response.status_code = rejection.status
+    if rejection.retry_after is not None:
+        response.headers['Retry-After'] = str(max(1, math.ceil(rejection.retry_after)))
+    return response
+
+
+@app.before_request
+def limit_request_rate():
+    """Turn away clients over their rate limit before any parsing or validation work"""
+    if request.endpoint in RATE_LIMITED_ENDPOINTS:
+        wait = rate_limiter.check(client_id())
+        if wait:
+            return rejection_response(Rejection(429, 'Too many requests', wait))
+
+
+def request_payload():
+    """
+    The request's JSON object ({} for an empty body); anything else is a Rejection.
+    Parsed on first use (timed as its own stage), so rate limited requests never are.
+    """
+    with stage('json_parse'):
+        data = request.get_json(silent=True)
+    if data is None and not request.get_data(cache=True):
+        return {}
+    if not isinstance(data, dict):
+        raise Rejection(400, 'Request body must be a JSON object')
+    return data
+
+
+def transform_sources():
+    """
+    The payload and files of a transform request: stored filenames from a JSON
+    body, or uploaded files from multipart/form-data ("operations" as a JSON field)
+    
+    Returns:
+        tuple: (payload, [(name, stored filename or uploaded bytes)], [size in bytes of each])
+    """
+    if request.files:
+        try:
+            operations = json.loads(request.form.get('operations', ''))
+        except ValueError:
+            raise Rejection(400, 'operations must be a JSON list')
+        try:
+            midi_format = int(request.form.get('format', 0))
+        except ValueError:
+            raise Rejection(400, 'format must be 0 or 1')
+        uploads = [(upload.filename or f'file_{index}.mid', upload.read())
+                   for index, upload in enumerate(request.files.getlist('files'))]
+        return {'operations': operations, 'format': midi_format}, uploads, [len(content) for _, content in uploads]
+    
+    data = request_payload()
+    files = data.get('files')
+    if not isinstance(files, list) or not all(isinstance(filename, str) for filename in files):
+        raise Rejection(400, 'files must be a list of filenames')
+    if len(files) > MAX_TRANSFORM_FILES:
+        raise Rejection(400, f'Too many files (max {MAX_TRANSFORM_FILES})')
+    
+    # Missing files cost nothing here; their own results report them
+    sizes = []
+    for filename in files:
+        output_file, stat = open_output(filename)
+        if output_file is None:
+            sizes.append(0)
+            continue
+        output_file.close()
+        sizes.append(stat.st_size)
+    return data, [(filename, filename) for filename in files], sizes
+
+
+def admit(cost):
+    """
+    Reserve capacity for the rest of this request (streamed responses hold it
+    until they have been sent)
+    """
+    reserved = cost_limiter.acquire(cost)
+    if reserved is None:
+        raise Rejection(503, 'Server is busy', OVERLOAD_RETRY_AFTER)
+    g.admitted_cost = reserved
+
+
+def admit_generation(job_type):
+    """
+    Parse, validate and admit a single generate request
+
+    Returns:
+        tuple: (request data, None), or (None, error response) if it was rejected
+    """
+    try:
+        data = request_payload()
+        admit(validate_generation(data, job_type))
+        return data, None
+    except Rejection as e:
+        return None, rejection_response(e)
+
+
+@app.after_request
+def record_request_timing(response):
+    """
+    Record latency per endpoint and per stage. Requests sent with the profiling
+    header (X-Profile: 1 by default) get their stage breakdown back as Server-Timing.
+    """
+    # Streamed bodies are generated after this request ends, so they keep their cost until
+    # closed. Everything else (including direct_passthrough files, which werkzeug never
+    # closes through the response) is released in teardown.
+    if response.is_streamed and not response.direct_passthrough and g.get('admitted_cost'):
+        admitted_cost = g.pop('admitted_cost')
+        response.call_on_close(lambda: cost_limiter.release(admitted_cost))
+    
+    if 'request_start' not in g:
+        return response
+    endpoint = endpoint_label()
+    elapsed = time.perf_counter() - g.request_start
+    
+    metrics.requests_total.inc(endpoint, response.status_code)
+    metrics.request_duration.observe(endpoint, value=elapsed)
+    for stage_name, seconds in g.stage_timings.items():
+        metrics.stage_duration.observe(endpoint, stage_name, value=seconds)
+    
+    if request.headers.get(PROFILE_HEADER) == '1':
+        timings = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in g.stage_timings.items()]
+        timings.append(f"total;dur={elapsed * 1000:.3f}")
+        response.headers['Server-Timing'] = ', '.join(timings)
+    return response
+
+
+@app.teardown_request
+def finish_request_timing(error=None):
+    """Runs even when a request fails, so the in-flight gauge and admitted cost never drift"""
+    cost_limiter.release(g.pop('admitted_cost', 0))
+    if 'stage_token' in g:
+        stop_collecting(g.pop('stage_token'))
+        metrics.requests_in_flight.dec(endpoint_label())
+
+
+def warm_up():
+    """
+    Run every generator and the encoders once so lazy imports, lookup tables
+    and NumPy code paths are loaded before the first real request
+    """
+    for style in STYLES.values():
+        style.generator(io.BytesIO(), seed=0)
+    batch_to_midi(generate_complex_chords_batch(2, seed=0), [0, 96, 192])
+    warm_pool.prime([style.generator for style in STYLES.values()], DEFAULT_SCALE)
+    service_state['ready'] = True
+
+
+def start_draining():
+    """Mark this worker as shutting down so /ready stops sending traffic to it"""
+    service_state['draining'] = True
+
+
+def report_stream_errors(chunks, name):
+    """
+    Pass a streamed body through, logging any error raised while it is sent
+    (the status line is gone by then, so the client only sees a short body)
+    """
+    try:
+        yield from chunks
+    except Exception as e:
+        print(f"Error streaming {name}: {str(e)}")
+        traceback.print_exc()
+        raise
+
+
+def render_midi(generator, output, data):
+    """
+    Run a generator into output (a path or a binary file object).
+    Seeded requests are deterministic, so they are served from midi_cache when possible;
+    requests with default parameters take a pre-rendered variation from warm_pool.
+    """
+    scale = data.get('scale')
+    rhythm = data.get('rhythm')
+    seed = data.get('seed')
+    key = data.get('key') or DEFAULT_SCALE
+    midi_format = data.get('format', 0)
+    distribution = data.get('distribution')
+    
+    if seed is None:
+        midi_bytes = None
+        if scale is None and rhythm is None and distribution is None:
+            with stage('pool'):
+                midi_bytes = warm_pool.take(generator, key, midi_format)
+        if midi_bytes is None:
+            if hasattr(output, 'write'):
+                return generator(output, scale=scale, rhythm=rhythm, key=key, midi_format=midi_format,
+                                 distribution=distribution)
+            buffer = io.BytesIO()
+            generator(buffer, scale=scale, rhythm=rhythm, key=key, midi_format=midi_format,
+                      distribution=distribution)
+            midi_bytes = buffer.getvalue()
+    else:
+        result_key = cache_key(generator.__name__, scale, rhythm, seed, key, midi_format, distribution)
+        midi_bytes = midi_cache.get(result_key)
+        if midi_bytes is None:
+            buffer = io.BytesIO()
+            generator(buffer, scale=scale, rhythm=rhythm, seed=seed, key=key, midi_format=midi_format,
+                      distribution=distribution)
+            midi_bytes = buffer.getvalue()
+            midi_cache.put(result_key, midi_bytes)
+    
+    # Files on disk are written to a temp file and renamed into place
+    with stage('write'):
+        if hasattr(output, 'write'):
+            output.write(midi_bytes)
+        else:
+            write_atomic(output, midi_bytes)
+            submit_background('index', index_written, output, midi_bytes)
+    return output
+
+
+def default_filename(prefix, generator, data):
+    """
+    Filename for a request that didn't name one. Seeded requests are deterministic,
+    so their name comes from the cache key and downloads of it can be cached forever.
+    """
+    seed = data.get('seed')
+    if seed is None:
+        return new_filename(prefix)
+    key = data.get('key') or DEFAULT_SCALE
+    result_key = cache_key(generator.__name__, data.get('scale'), data.get('rhythm'), seed, key, data.get('format', 0),
+                           data.get('distribution'))
+    return content_filename(prefix, result_key)
+
+
+def preview_filename(content_hash, seconds, bpm):
+    """Cache name of a rendered preview: a hash of the MIDI content and every render setting"""
+    payload = json.dumps([content_hash, seconds, bpm, PREVIEW_SAMPLE_RATE, SYNTH_VERSION], separators=(',', ':'))
+    return f"preview_{hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]}.wav"
+
+
+def wants_inline(data):
+    """
+    Inline mode returns the MIDI bytes in the generate response itself.
+    Opt in with "inline": true in the request JSON or an Accept: audio/midi header.
+    """
+    if data.get('inline'):
+        return True
+    return request.accept_mimetypes.best_match(['application/json', 'audio/midi']) == 'audio/midi'
+
+
+def output_exists(filename):
+    """True if a generated file is still in OUTPUT_DIR"""
+    output_file, _ = open_output(filename)
+    if output_file is None:
+        return False
+    output_file.close()
+    return True
+
+
+def submit_background(task, function, *args, required=False):
+    """
+    Run function(*args) on the background writer. When PERSIST_QUEUE_SIZE tasks
+    are already waiting, a required task runs here instead (slowing the request
+    down rather than losing the file) and any other is dropped and counted.
+    """
+    if not persist_slots.acquire(blocking=False):
+        if required:
+            function(*args)
+        else:
+            metrics.background_dropped.inc(task)
+        return
+    future = persist_executor.submit(function, *args)
+    future.add_done_callback(lambda _: persist_slots.release())
+
+
+def persist_file(filepath, midi_bytes):
+    """Write MIDI bytes to disk (runs on the background writer)"""
+    try:
+        write_atomic(filepath, midi_bytes)
+        index_written(filepath, midi_bytes)
+    except Exception as e:
+        print(f"Error saving inline MIDI file {filepath}: {str(e)}")
+        traceback.print_exc()
+
+
+def inline_midi_response(generator, filename, data):
+    """
+    Generate into an in-memory buffer and send the bytes straight back.
+    The file is only written to OUTPUT_DIR if "persist": true, and then in the background.
+    """
+    buffer = io.BytesIO()
+    render_midi(generator, buffer, data)
+    
+    if data.get('persist'):
+        submit_background('persist', persist_file, path_for(filename), buffer.getvalue(), required=True)
+    
+    buffer.seek(0)
+    with stage('send_file'):
+        return send_file(
+            buffer,
+            mimetype='audio/midi',
+            as_attachment=True,
+            download_name=filename
+        )
+
+
+# Endpoint label of local socket requests in the metrics
+SOCKET_ENDPOINT = 'unix:generate'
+
+
+def socket_generate(body):
+    """
+    Answer one request frame from the local socket (see local_socket.py) with the
+    same validation, cost limit, cache and warm pool as the generate endpoints.
+    The MIDI bytes go straight back and nothing is written to disk.
+    
+    Returns:
+        tuple: (status, MIDI bytes or UTF-8 error message, Retry-After seconds or None)
+    """
+    start = time.perf_counter()
+    metrics.requests_in_flight.inc(SOCKET_ENDPOINT)
+    reserved = 0
+    try:
+        job_type, data = decode_request(body)
+        reserved = cost_limiter.acquire(validate_generation(data, job_type))
+        if reserved is None:
+            raise Rejection(503, 'Server is busy', OVERLOAD_RETRY_AFTER)
+        buffer = io.BytesIO()
+        render_midi(STYLES[job_type].generator, buffer, data)
+        status, payload, retry_after = 200, buffer.getvalue(), None
+    except Rejection as e:
+        metrics.admission_rejections.inc(SOCKET_ENDPOINT, e.status)
+        status, payload, retry_after = e.status, str(e).encode('utf-8'), e.retry_after
+    except Exception as e:
+        print(f"Error generating over the local socket: {str(e)}")
+        traceback.print_exc()
+        status, payload, retry_after = 500, str(e).encode('utf-8'), None
+    finally:
+        cost_limiter.release(reserved or 0)
+        metrics.requests_in_flight.dec(SOCKET_ENDPOINT)
+    
+    metrics.requests_total.inc(SOCKET_ENDPOINT, status)
+    metrics.request_duration.observe(SOCKET_ENDPOINT, value=time.perf_counter() - start)
+    if retry_after is not None:
+        retry_after = max(1, math.ceil(retry_after))
+    return status, payload, retry_after
+
+
+# Binary transport on a Unix domain socket when SOCKET_PATH is set (bound before forking, served per worker)
+socket_server = LocalSocketServer(socket_generate)
+
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -24,16 +491,131 @@ def health_check():
     })
 
 
-@app.route('/api/generate/bass', methods=['POST'])
-def generate_bass():
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness endpoint: 200 once warmed up, 503 while starting or draining"""
+    if service_state['draining']:
+        return jsonify({'status': 'draining'}), 503
+    if not service_state['ready']:
+        return jsonify({'status': 'starting'}), 503
+    return jsonify({'status': 'ready'})
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text exposition of request, stage, cache and storage metrics (this worker only)"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/cache', methods=['GET'])
+def cache_stats():
+    """Size and hit/miss/eviction counters of the seeded result cache"""
+    return jsonify({
+        'success': True,
+        'cache': midi_cache.stats()
+    })
+
+
+@app.route('/api/pool', methods=['GET'])
+def pool_stats():
+    """Hit rate and ready variations of the warm pool (this worker only)"""
+    return jsonify({
+        'success': True,
+        'pool': warm_pool.stats()
+    })
+
+
+@app.route('/api/index', methods=['GET'])
+def index_stats():
+    """Size of the note index of generated files (shared by every worker)"""
+    return jsonify({
+        'success': True,
+        'enabled': INDEX_ENABLED,
+        'index': get_note_index().stats() if INDEX_ENABLED else None
+    })
+
+
+@app.route('/api/index/<filename>', methods=['GET'])
+def index_lookup(filename):
     """
-    Generate a bassline MIDI file
+    Find generated files that duplicate or resemble a stored file
+    
+    Query parameters:
+        k: number of similar files to return (1-100, default 10)
+    
+    Response JSON:
+    {
+        "success": true,
+        "filename": "bass_1712345678_3f9a0c1d2e4b.mid",
+        "duplicates": ["bass_1712345999_0a1b2c3d4e5f.mid"],  // identical content
+        "similar": [{"filename": "...", "score": 0.93, "same_rhythm": true}, ...]  // best first
+    }
+    
+    Scores are cosine similarities of pitch class n-gram counts (1 is the same
+    n-grams). The file itself needn't be indexed; files deleted since they
+    were indexed are left out.
+    """
+    try:
+        k = request.args.get('k', 10, type=int)
+        if k is None or not 1 <= k <= 100:
+            return jsonify({
+                'success': False,
+                'error': 'k must be between 1 and 100'
+            }), 400
+        
+        output_file, _ = open_output(filename)
+        if output_file is None:
+            return jsonify({
+                'success': False,
+                'error': 'File not found'
+            }), 404
+        with output_file:
+            midi_bytes = output_file.read()
+        
+        note_index = get_note_index()
+        with stage('index'):
+            duplicates = [name for name in note_index.duplicates(midi_bytes) if name != filename]
+            similar = note_index.similar(midi_bytes, k)
+        
+        return jsonify({
+            'success': True,
+            'filename': filename,
+            'duplicates': [name for name in duplicates if output_exists(name)],
+            'similar': [match for match in similar if output_exists(match['filename'])]
+        })
+    
+    except ValueError as e:
+        # The stored file isn't valid MIDI
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    except Exception as e:
+        print(f"Error looking up {filename} in the note index: {str(e)}")
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+def generate_endpoint(style):
+    """
+    Generate a MIDI file of a registered style (POST /api/generate/<style>,
+    e.g. bass, simple-chords or complex-chords; see generators/registry.py)
     
     Request JSON:
     {
         "filename": "optional_filename.mid",
         "scale": [40, 41, 43, 45, 47, 48, 50],  // optional
-        "rhythm": [0, 384, 768, ...]  // optional
+        "rhythm": [0, 384, 768, ...],  // optional
+        "seed": 42,  // optional, same seed + parameters = same file (served from cache)
+        "key": "A_MINOR",  // optional, key/mode for the default scale and harmonies (default C_MAJOR)
+        "format": 0,  // optional, 0 for one merged track (default) or 1 for one track per voice
+        "distribution": [4, 1, 2, 1, 3, 1, 1],  // optional, weight per scale note, "normal", or {"type": "markov", "matrix": [[...], ...]}
+        "inline": false,  // optional, return the .mid bytes instead of JSON
+        "persist": false  // optional, with inline also save the file in the background
     }
     
     Response JSON:
@@ -42,29 +624,32 @@ def generate_bass():
         "filepath": "path/to/file.mid",
         "filename": "filename.mid"
     }
+    
+    Inline mode ("inline": true or Accept: audio/midi) responds with the
+    audio/midi bytes directly and skips the disk write.
     """
     try:
-        data = request.get_json() or {}
+        data, rejected = admit_generation(style.name)
+        if rejected:
+            return rejected
         
         # Generate unique filename if not provided
         filename = data.get('filename')
         if not filename:
-            timestamp = int(time.time())
-            filename = f"bass_{timestamp}.mid"
+            filename = default_filename(style.prefix, style.generator, data)
         
         # Ensure .mid extension
         if not filename.endswith('.mid'):
             filename += '.mid'
         
-        # Full path for the file
-        filepath = os.path.join(OUTPUT_DIR, filename)
+        # Inline mode: send the bytes back without touching the disk
+        if wants_inline(data):
+            return inline_midi_response(style.generator, filename, data)
         
-        # Get optional parameters
-        scale = data.get('scale')
-        rhythm = data.get('rhythm')
+        # Full path for the file (in its shard directory)
+        filepath = path_for(filename)
         
-        # Generate the bassline
-        result_path = generate_bassline(filepath, scale=scale, rhythm=rhythm)
+        result_path = render_midi(style.generator, filepath, data)
         
         return jsonify({
             'success': True,
@@ -73,7 +658,7 @@ def generate_bass():
         })
     
     except Exception as e:
-        print(f"Error generating bassline: {str(e)}")
+        print(f"Error generating {style.name}: {str(e)}")
         traceback.print_exc()
         return jsonify({
             'success': False,
@@ -81,56 +666,135 @@ def generate_bass():
         }), 500
 
 
-@app.route('/api/generate/complex-chords', methods=['POST'])
-def generate_complex_chords_endpoint():
+def add_generate_endpoint(style):
+    """Route POST /api/generate/<style name> to generate_endpoint (endpoint generate_<prefix>, rate limited)"""
+    endpoint = f'generate_{style.prefix}'
+    app.add_url_rule(f'/api/generate/{style.name}', endpoint=endpoint, view_func=lambda: generate_endpoint(style),
+                     methods=['POST'])
+    RATE_LIMITED_ENDPOINTS.add(endpoint)
+
+
+# One generate endpoint per registered style
+for registered_style in STYLES.values():
+    add_generate_endpoint(registered_style)
+
+
+@app.route('/api/generate/stream', methods=['POST'])
+def generate_stream():
     """
-    Generate a complex chord progression MIDI file
+    Stream a long piece as MIDI bytes while it is being generated
+    
+    Notes are generated, encoded and sent a chunk at a time, so memory stays
+    constant however long the piece is. The rhythm repeats for as long as needed.
     
     Request JSON:
     {
-        "filename": "optional_filename.mid",
+        "type": "complex-chords",  // bass, simple-chords or complex-chords
+        "notes": 100000,  // number of notes, or:
+        "seconds": 3600,  // length in seconds at "bpm" (default DEFAULT_BPM)
         "scale": [40, 41, 43, 45, 47, 48, 50],  // optional
-        "rhythm": [0, 384, 768, ...]  // optional
+        "rhythm": [0, 384, 768, ...],  // optional, looped
+        "seed": 42,  // optional
+        "key": "A_MINOR",  // optional
+        "distribution": "normal",  // optional, note weighting (see generators/sampling.py)
+        "filename": "optional_filename.mid"  // optional, name for the download
     }
     
-    Response JSON:
-    {
-        "success": true,
-        "filepath": "path/to/file.mid",
-        "filename": "filename.mid"
-    }
+    Responds with audio/midi. The track length is measured from the rhythm
+    before generation starts, so Content-Length is known up front.
     """
     try:
-        data = request.get_json() or {}
+        data = request_payload()
         
-        # Generate unique filename if not provided
-        filename = data.get('filename')
-        if not filename:
-            timestamp = int(time.time())
-            filename = f"complex_chords_{timestamp}.mid"
+        job_type = data.get('type')
+        if job_type not in STYLES:
+            return jsonify({
+                'success': False,
+                'error': f'Unknown type: {job_type}'
+            }), 400
+        style = STYLES[job_type]
+        num_voices = len(style.voices)
         
-        # Ensure .mid extension
+        # Same checks as a single generation (the rhythm is one loop of the piece)
+        validate_generation(data, job_type)
+        rhythm = data.get('rhythm') or RHYTHM_DATA
+        scale = data.get('scale')
+        
+        num_notes = validate_stream_length(data, rhythm)
+        
+        filename = data.get('filename') or new_filename(style.prefix)
         if not filename.endswith('.mid'):
             filename += '.mid'
         
-        # Full path for the file
-        filepath = os.path.join(OUTPUT_DIR, filename)
+        # Held until the whole piece has been sent; a long stream counts as one maximum-size request
+        admit(min(2 * num_notes * num_voices, MAX_REQUEST_COST))
         
-        # Get optional parameters
-        scale = data.get('scale')
-        rhythm = data.get('rhythm')
+        pitch_chunks = style.stream(num_notes, scale=scale, seed=data.get('seed'),
+                                    key=data.get('key') or DEFAULT_SCALE, distribution=data.get('distribution'))
+        file_size, chunks = stream_to_midi(pitch_chunks, rhythm, num_notes, num_voices)
+        
+        response = Response(report_stream_errors(chunks, job_type), mimetype='audio/midi')
+        response.content_length = file_size
+        response.headers.set('Content-Disposition', 'attachment', filename=filename)
+        return response
+    
+    except Rejection as e:
+        return rejection_response(e)
+    
+    except (TypeError, ValueError, OverflowError) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    except Exception as e:
+        print(f"Error streaming piece: {str(e)}")
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/generate/batch', methods=['POST'])
+def generate_batch():
+    """
+    Generate several MIDI files in one request, spread across a process pool
+    
+    Request JSON:
+    {
+        "jobs": [
+            {"type": "bass", "filename": "optional.mid", "scale": [...], "rhythm": [...], "seed": 42, "key": "D_DORIAN", "format": 1},
+            {"type": "simple-chords"},
+            {"type": "complex-chords", "rhythm": [...]}
+        ]
+    }
+    
+    Response JSON (one result per job, in order; failed jobs don't fail the batch):
+    {
+        "success": true,
+        "results": [
+            {"success": true, "filepath": "path/to/file.mid", "filename": "file.mid"},
+            {"success": false, "error": "Unknown job type: drums"}
+        ]
+    }
+    """
+    try:
+        data = request_payload()
+        admit(validate_jobs(data.get('jobs'), MAX_BATCH_JOBS))
         
-        # Generate the complex chords
-        result_path = generate_complex_chords(filepath, scale=scale, rhythm=rhythm)
+        results = run_jobs(data['jobs'])
         
         return jsonify({
             'success': True,
-            'filepath': result_path,
-            'filename': filename
+            'results': results
         })
     
+    except Rejection as e:
+        return rejection_response(e)
+    
     except Exception as e:
-        print(f"Error generating complex chords: {str(e)}")
+        print(f"Error generating batch: {str(e)}")
         traceback.print_exc()
         return jsonify({
             'success': False,
@@ -138,56 +802,190 @@ def generate_complex_chords_endpoint():
         }), 500
 
 
-@app.route('/api/generate/simple-chords', methods=['POST'])
-def generate_simple_chords_endpoint():
+@app.route('/api/export', methods=['POST'])
+def export_archive():
     """
-    Generate a simple triad chord progression MIDI file
+    Stream a ZIP archive of generated files and/or freshly generated ones
     
     Request JSON:
     {
-        "filename": "optional_filename.mid",
-        "scale": [40, 41, 43, 45, 47, 48, 50],  // optional
-        "rhythm": [0, 384, 768, ...]  // optional
+        "files": ["bass_1712345678_3f9a0c1d2e4b.mid", ...],  // optional, files in OUTPUT_DIR
+        "jobs": [{"type": "bass", "seed": 42}, ...],  // optional, same format as /api/generate/batch
+        "filename": "project.zip",  // optional, name for the download
+        "compression": "stored"  // optional, "stored" (default) or "deflate"
     }
     
-    Response JSON:
+    Responds with application/zip, sent while it is being built. Generated
+    jobs are rendered on the process pool straight into the archive and never
+    written to disk. Missing files and failed jobs are listed in errors.txt
+    inside the archive.
+    """
+    try:
+        data = request_payload()
+        files = data.get('files') or []
+        jobs = data.get('jobs') or []
+        
+        if not isinstance(files, list) or not isinstance(jobs, list) or not (files or jobs):
+            return jsonify({
+                'success': False,
+                'error': 'files and/or jobs must be a non-empty list'
+            }), 400
+        
+        if not all(isinstance(filename, str) for filename in files):
+            return jsonify({
+                'success': False,
+                'error': 'files must be a list of filenames'
+            }), 400
+        
+        if len(jobs) > MAX_BATCH_JOBS or len(files) + len(jobs) > MAX_EXPORT_FILES:
+            return jsonify({
+                'success': False,
+                'error': f'Too many files (max {MAX_EXPORT_FILES}, of which {MAX_BATCH_JOBS} jobs)'
+            }), 400
+        
+        compression = data.get('compression', 'stored')
+        if compression not in COMPRESSION:
+            return jsonify({
+                'success': False,
+                'error': f'Unknown compression: {compression}'
+            }), 400
+        
+        filename = data.get('filename') or f"export_{int(time.time())}.zip"
+        if not filename.endswith('.zip'):
+            filename += '.zip'
+        
+        # Jobs are checked like a batch, and their cost is held until the archive has been sent
+        if jobs:
+            admit(validate_jobs(jobs, MAX_BATCH_JOBS))
+        
+        def entries():
+            yield from stored_files(files)
+            if jobs:
+                yield from iter_rendered(jobs)
+        
+        response = Response(iter_zip(entries(), compression), mimetype='application/zip')
+        response.headers.set('Content-Disposition', 'attachment', filename=filename)
+        return response
+    
+    except Rejection as e:
+        return rejection_response(e)
+    
+    except Exception as e:
+        print(f"Error exporting files: {str(e)}")
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/transform', methods=['POST'])
+def transform_files():
+    """
+    Run a pipeline of operations over existing MIDI files, spread across a process pool
+    
+    Request JSON:
+    {
+        "files": ["bass_1712345678_3f9a0c1d2e4b.mid", ...],  // files in OUTPUT_DIR
+        "operations": [  // applied in order
+            {"op": "transpose", "semitones": -3},
+            {"op": "quantize", "key": "A_MINOR", "policy": "nearest"},  // policy: nearest (default), up or down
+            {"op": "revoice", "style": "complex-chords", "key": "A_MINOR", "seed": 7},  // or simple-chords
+            {"op": "stretch", "factor": 1.5}  // scales every tick
+        ],
+        "format": 0  // optional, 0 for one merged track (default) or 1 for one track per voice
+    }
+    
+    Files can also be uploaded as multipart/form-data: any number of "files"
+    parts, with "operations" (JSON) and "format" as form fields.
+    
+    Response JSON (one result per file, in order; failed files don't fail the rest):
     {
         "success": true,
-        "filepath": "path/to/file.mid",
-        "filename": "filename.mid"
+        "results": [
+            {"success": true, "source": "bass_1712345678_3f9a0c1d2e4b.mid", "filepath": "path/to/file.mid", "filename": "file.mid"},
+            {"success": false, "source": "upload.mid", "error": "Bad header in MIDI file"}
+        ]
     }
     """
     try:
-        data = request.get_json() or {}
+        data, sources, sizes = transform_sources()
+        operations, cost = validate_transform(data, sizes, MAX_TRANSFORM_FILES)
+        admit(cost)
         
-        # Generate unique filename if not provided
-        filename = data.get('filename')
-        if not filename:
-            timestamp = int(time.time())
-            filename = f"simple_chords_{timestamp}.mid"
+        results = run_transforms(sources, operations, data.get('format', 0))
         
-        # Ensure .mid extension
-        if not filename.endswith('.mid'):
-            filename += '.mid'
-        
-        # Full path for the file
-        filepath = os.path.join(OUTPUT_DIR, filename)
+        return jsonify({
+            'success': True,
+            'results': results
+        })
+    
+    except Rejection as e:
+        return rejection_response(e)
+    
+    except Exception as e:
+        print(f"Error transforming files: {str(e)}")
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue generation work and return a job id immediately
+    
+    Request JSON (a list of jobs like /api/generate/batch, or a single job):
+    {
+        "jobs": [{"type": "bass", "rhythm": [...]}, {"type": "complex-chords"}],
+        "priority": "interactive"  // optional, "interactive" (default) or "bulk"
+    }
+    
+    Response JSON (HTTP 202):
+    {
+        "success": true,
+        "job": {"id": "...", "status": "queued", ...},
+        "status_url": "/api/jobs/<id>"
+    }
+    """
+    try:
+        data = request_payload()
+        jobs = data.get('jobs')
+        if jobs is None and 'type' in data:
+            jobs = [data]
         
-        # Get optional parameters
-        scale = data.get('scale')
-        rhythm = data.get('rhythm')
+        # Queued work is bounded by the job queue, so only the payload is checked here
+        validate_jobs(jobs, MAX_BATCH_JOBS)
         
-        # Generate the simple chords
-        result_path = generate_simple_chords(filepath, scale=scale, rhythm=rhythm)
+        job = job_manager.submit(jobs, priority=data.get('priority', 'interactive'))
         
         return jsonify({
             'success': True,
-            'filepath': result_path,
-            'filename': filename
+            'job': job,
+            'status_url': f"/api/jobs/{job['id']}"
+        }), 202
+    
+    except QueueFullError as e:
+        response = jsonify({
+            'success': False,
+            'error': str(e)
         })
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    
+    except Rejection as e:
+        return rejection_response(e)
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     
     except Exception as e:
-        print(f"Error generating simple chords: {str(e)}")
+        print(f"Error submitting job: {str(e)}")
         traceback.print_exc()
         return jsonify({
             'success': False,
@@ -195,28 +993,96 @@ def generate_simple_chords_endpoint():
         }), 500
 
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Job status; finished jobs include per-job "results" like /api/generate/batch
+    Status is one of queued, running, done, failed, cancelled.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'job': job
+    })
+
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a queued job (409 if it is already running or finished)"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+    
+    if job['status'] != 'cancelled':
+        return jsonify({
+            'success': False,
+            'error': f"Job is {job['status']}",
+            'job': job
+        }), 409
+    
+    return jsonify({
+        'success': True,
+        'job': job
+    })
+
+
 @app.route('/api/download/<filename>', methods=['GET'])
 def download_file(filename):
     """
     Download a generated MIDI file
+    
+    Responses carry a strong ETag and Last-Modified, so If-None-Match and
+    If-Modified-Since get a 304, and Range requests get a 206. Content-addressed
+    names (seeded requests without a filename) are cacheable forever; other
+    names are revalidated on every use. Full responses are handed to the
+    server's file wrapper, which gunicorn sends with sendfile().
     """
+    output_file = None
     try:
-        filepath = os.path.join(OUTPUT_DIR, filename)
+        output_file, stat = open_output(filename)
         
-        if not os.path.exists(filepath):
+        if output_file is None:
             return jsonify({
                 'success': False,
                 'error': 'File not found'
             }), 404
         
-        return send_file(
-            filepath,
-            mimetype='audio/midi',
-            as_attachment=True,
-            download_name=filename
-        )
+        with stage('send_file'):
+            response = Response(wrap_file(request.environ, output_file), mimetype='audio/midi',
+                                direct_passthrough=True)
+            response.content_length = stat.st_size
+            response.last_modified = stat.st_mtime
+            response.set_etag(file_etag(filename, output_file, stat))
+            response.accept_ranges = 'bytes'
+            response.headers.set('Content-Disposition', 'attachment', filename=filename)
+            
+            if is_content_addressed(filename):
+                response.cache_control.public = True
+                response.cache_control.max_age = DOWNLOAD_MAX_AGE
+                response.cache_control.immutable = True
+            else:
+                response.cache_control.no_cache = True
+            
+            output_file = None  # owned by the response from here on
+            return response.make_conditional(request, accept_ranges=True, complete_length=stat.st_size)
+    
+    except RequestedRangeNotSatisfiable:
+        # Answered by range_not_satisfiable; the response (and its file) is never sent
+        response.close()
+        raise
     
     except Exception as e:
+        if output_file is not None:
+            output_file.close()
         print(f"Error downloading file: {str(e)}")
         return jsonify({
             'success': False,
@@ -224,6 +1090,75 @@ def download_file(filename):
         }), 500
 
 
+@app.route('/api/preview/<filename>', methods=['GET'])
+def preview_file(filename):
+    """
+    Audio preview of a generated MIDI file, as a 16-bit mono WAV
+    
+    Query parameters:
+        seconds: optional preview length (default PREVIEW_SECONDS, up to PREVIEW_MAX_SECONDS)
+        bpm: optional tempo (default DEFAULT_BPM)
+    
+    Previews are rendered once (see generators/synth.py) and cached in
+    PREVIEW_DIR under a hash of the MIDI content and the render settings, so
+    repeat requests from any worker just send the file. The hash is also the
+    response's strong ETag.
+    """
+    output_file = None
+    try:
+        try:
+            seconds = float(request.args.get('seconds', PREVIEW_SECONDS))
+            bpm = float(request.args.get('bpm', DEFAULT_BPM))
+        except ValueError:
+            seconds = bpm = 0
+        if not (0 < seconds <= PREVIEW_MAX_SECONDS and 20 <= bpm <= 400):
+            return jsonify({
+                'success': False,
+                'error': f'seconds must be between 0 and {PREVIEW_MAX_SECONDS}, bpm between 20 and 400'
+            }), 400
+        
+        output_file, stat = open_output(filename)
+        if output_file is None:
+            return jsonify({
+                'success': False,
+                'error': 'File not found'
+            }), 404
+        
+        preview_name = preview_filename(file_etag(filename, output_file, stat), seconds, bpm)
+        preview_path = os.path.join(shard_dir(preview_name, PREVIEW_DIR), preview_name)
+        
+        if not os.path.exists(preview_path):
+            with stage('decode'):
+                notes = read_notes(output_file)
+            with stage('synth'):
+                wav_bytes = render_preview(notes, bpm=bpm, sample_rate=PREVIEW_SAMPLE_RATE, max_seconds=seconds)
+            with stage('write'):
+                write_atomic(path_for(preview_name, PREVIEW_DIR), wav_bytes)
+        
+        with stage('send_file'):
+            # Previews of content-addressed files never change; others follow their file
+            immutable = is_content_addressed(filename)
+            response = send_file(preview_path, mimetype='audio/wav', etag=preview_name[8:-4], conditional=True,
+                                 download_name=filename[:-4] + '.wav', max_age=DOWNLOAD_MAX_AGE if immutable else None)
+            response.cache_control.immutable = immutable or None
+            return response
+    
+    except RequestedRangeNotSatisfiable:
+        raise
+    
+    except Exception as e:
+        print(f"Error rendering preview: {str(e)}")
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    
+    finally:
+        if output_file is not None:
+            output_file.close()
+
+
 @app.errorhandler(404)
 def not_found(error):
     """404 error handler"""
@@ -233,6 +1168,28 @@ def not_found(error):
     }), 404
 
 
+@app.errorhandler(413)
+def payload_too_large(error):
+    """413 error handler (request body over MAX_REQUEST_BYTES)"""
+    return jsonify({
+        'success': False,
+        'error': f'Request body too large (max {MAX_REQUEST_BYTES} bytes)'
+    }), 413
+
+
+@app.errorhandler(416)
+def range_not_satisfiable(error):
+    """416 error handler (Range outside the file), keeping Content-Range: bytes */<length>"""
+    response = jsonify({
+        'success': False,
+        'error': 'Requested range not satisfiable'
+    })
+    response.status_code = 416
+    if getattr(error, 'length', None) is not None:
+        response.headers['Content-Range'] = f'{error.units} */{error.length}'
+    return response
+
+
 @app.errorhandler(500)
 def internal_error(error):
     """500 error handler"""
@@ -245,5 +1202,11 @@ def internal_error(error):
 if __name__ == '__main__':
     print(f"Starting Mess o Midi Python Service on {HOST}:{PORT}")
     print(f"Output directory: {OUTPUT_DIR}")
+    print("Development server - use serve.py in production")
+    warm_up()
+    output_sweeper.start()
+    preview_sweeper.start()
+    warm_pool.start()
+    socket_server.start()
     app.run(host=HOST, port=PORT, debug=DEBUG)
 
@@ -0,0 +1,84 @@
+"""
+Encoder Benchmark
+Compares the native SMF encoder against the original py_midicsv CSV path
+
+Usage (from python_service/):
+    python benchmarks/bench_encoder.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from generators.bass import C_MAJOR, RHYTHM_DATA  # noqa: E402
+from generators.midi_tools import data_to_midi, data_to_events, csv_to_bytes, rhythm_to_on_off  # noqa: E402
+from generators.events import interleave_voices  # noqa: E402
+from generators.smf import encode_file  # noqa: E402
+
+
+def make_voices(rhythm, num_voices):
+    """Build random pitch data for each voice over a shared rhythm"""
+    num_notes = len(rhythm) - 1
+    return [[random.choice(C_MAJOR) + 12 * v for _ in range(num_notes)] for v in range(num_voices)]
+
+
+def interleave(voices):
+    """Combine voices the same way the chord generators do"""
+    return [item for lst in zip(*voices) for item in lst]
+
+
+def csv_path(voices, rhythm):
+    note_on_timing, note_off_timing = rhythm_to_on_off(rhythm)
+    midi_notes = [data_to_midi(pitch, note_on_timing, note_off_timing) for pitch in voices]
+    return csv_to_bytes(interleave(midi_notes))
+
+
+def native_path(voices, rhythm):
+    note_on_timing, note_off_timing = rhythm_to_on_off(rhythm)
+    midi_events = [data_to_events(pitch, note_on_timing, note_off_timing) for pitch in voices]
+    return encode_file(interleave_voices(midi_events))
+
+
+def best_of(func, repeat, *args):
+    """Return (best seconds, result) over a number of runs"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def run_case(name, rhythm, num_voices, repeat):
+    voices = make_voices(rhythm, num_voices)
+    num_events = 2 * (len(rhythm) - 1) * num_voices
+
+    csv_time, csv_bytes = best_of(csv_path, repeat, voices, rhythm)
+    native_time, native_bytes = best_of(native_path, repeat, voices, rhythm)
+
+    identical = csv_bytes == native_bytes
+    print(f"{name:<28} {num_events:>9} events  csv {csv_time * 1000:>10.3f} ms  "
+          f"native {native_time * 1000:>9.3f} ms  speedup {csv_time / native_time:>6.1f}x  "
+          f"identical={identical}")
+    if not identical:
+        raise SystemExit(f"Output mismatch for {name}")
+
+
+def main():
+    random.seed(0)
+    long_rhythm = list(range(0, 96 * 60001, 96))
+
+    print("Native SMF encoder vs py_midicsv CSV round trip")
+    run_case("default rhythm, 1 voice", RHYTHM_DATA, 1, 200)
+    run_case("default rhythm, 5 voices", RHYTHM_DATA, 5, 200)
+    run_case("long rhythm, 1 voice", long_rhythm, 1, 3)
+    run_case("long rhythm, 4 voices", long_rhythm, 4, 1)
+
+
+if __name__ == '__main__':
+    main()
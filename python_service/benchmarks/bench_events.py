@@ -0,0 +1,55 @@
+"""
+Event Memory Benchmark
+Measures bytes per event for each note event representation
+
+Usage (from python_service/):
+    python benchmarks/bench_events.py
+"""
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from generators.midi_tools import data_to_midi, data_to_events, rhythm_to_on_off  # noqa: E402
+from generators.smf import NOTE_ON, NOTE_OFF  # noqa: E402
+
+NUM_NOTES = 100000
+
+
+def tuple_events(pitch_data, note_on_timing, note_off_timing):
+    """The (tick, status, pitch, velocity) tuple list used before the event array"""
+    midi_events = []
+    for pitch, on_tick, off_tick in zip(pitch_data, note_on_timing, note_off_timing):
+        midi_events.append((on_tick, NOTE_ON, pitch, 100))
+        midi_events.append((off_tick, NOTE_OFF, pitch, 64))
+    return midi_events
+
+
+def measure(name, func, *args):
+    """Print retained and peak bytes per event for one representation"""
+    tracemalloc.start()
+    result = func(*args)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    num_events = len(result)
+    print(f"{name:<28} {retained / num_events:>8.1f} bytes/event retained  "
+          f"{peak / num_events:>8.1f} bytes/event peak")
+    return result
+
+
+def main():
+    random.seed(0)
+    rhythm = list(range(0, 96 * (NUM_NOTES + 1), 96))
+    note_on_timing, note_off_timing = rhythm_to_on_off(rhythm)
+    pitch_data = [random.randint(40, 80) for _ in range(NUM_NOTES)]
+
+    print(f"Memory per event ({2 * NUM_NOTES} events)")
+    measure("event array (data_to_events)", data_to_events, pitch_data, note_on_timing, note_off_timing)
+    measure("tuple list", tuple_events, pitch_data, note_on_timing, note_off_timing)
+    measure("CSV strings (data_to_midi)", data_to_midi, pitch_data, note_on_timing, note_off_timing)
+
+
+if __name__ == '__main__':
+    main()
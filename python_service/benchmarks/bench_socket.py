@@ -0,0 +1,146 @@
+"""
+Local Socket Benchmark
+Compares request latency of the PHP frontend's HTTP path with the local
+Unix socket transport, on a real server in this process
+
+Cases, each a bass / complex-chords / simple-chords generation:
+- http+download: JSON request on a new TCP connection, then a second request
+  to download the file (what MidiGenerator.php does today)
+- http inline: JSON request on a new TCP connection, MIDI bytes in the response
+- unix socket: binary frame on one persistent connection
+
+Usage (from python_service/):
+    python benchmarks/bench_socket.py
+    python benchmarks/bench_socket.py --requests 2000 --unseeded
+"""
+import argparse
+import atexit
+import http.client
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Hundreds of requests from one client, and no index rows for the downloaded files
+os.environ.setdefault('RATE_LIMIT_RATE', '0')
+os.environ.setdefault('INDEX_ENABLED', 'False')
+
+# Files, job state and the socket go in a temporary directory, not uploads/
+DATA_DIR = tempfile.mkdtemp(prefix='midi-benchmarks-')
+atexit.register(shutil.rmtree, DATA_DIR, ignore_errors=True)
+for directory in ('OUTPUT_DIR', 'INDEX_DIR', 'JOBS_DIR', 'PREVIEW_DIR'):
+    os.environ[directory] = os.path.join(DATA_DIR, directory.split('_')[0].lower())
+
+import numpy as np  # noqa: E402
+from werkzeug.serving import make_server, WSGIRequestHandler  # noqa: E402
+import app as service  # noqa: E402
+from local_socket import LocalSocketServer, SocketClient, generator_ids  # noqa: E402
+
+BENCHMARK_FILENAME = 'benchmark_socket.mid'
+
+
+class QuietHandler(WSGIRequestHandler):
+    """No access log line per request"""
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def http_post(port, path, payload):
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    connection.request('POST', path, json.dumps(payload), {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    body = response.read()
+    connection.close()
+    if response.status != 200:
+        raise RuntimeError(f'{path} returned HTTP {response.status}: {body[:200]}')
+    return body
+
+
+def http_get(port, path):
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    connection.request('GET', path)
+    response = connection.getresponse()
+    body = response.read()
+    connection.close()
+    return body
+
+
+def http_download(port, generator, seed):
+    payload = {'filename': BENCHMARK_FILENAME}
+    if seed is not None:
+        payload['seed'] = seed
+    result = json.loads(http_post(port, f'/api/generate/{generator}', payload))
+    return http_get(port, f"/api/download/{result['filename']}")
+
+
+def http_inline(port, generator, seed):
+    payload = {'inline': True}
+    if seed is not None:
+        payload['seed'] = seed
+    return http_post(port, f'/api/generate/{generator}', payload)
+
+
+def timed(func, requests, seeded):
+    """Latency of each call in seconds, cycling through the generators"""
+    latencies = []
+    names = generator_ids()
+    for index in range(requests):
+        generator = names[index % len(names)]
+        start = time.perf_counter()
+        midi_bytes = func(generator, index % 16 if seeded else None)
+        latencies.append(time.perf_counter() - start)
+        assert midi_bytes[:4] == b'MThd'
+    return np.array(latencies)
+
+
+def report(name, latencies, baseline=None):
+    median = np.median(latencies) * 1e6
+    line = f"{name:<16} median {median:8.0f} us   p99 {np.percentile(latencies, 99) * 1e6:8.0f} us"
+    if baseline is not None:
+        line += f"   {np.median(baseline) / np.median(latencies):5.1f}x faster"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=600, help='requests per case')
+    parser.add_argument('--unseeded', action='store_true',
+                        help='generate every request fresh instead of from the result cache')
+    args = parser.parse_args()
+    seeded = not args.unseeded
+
+    service.warm_up()
+    http_server = make_server('127.0.0.1', 0, service.app, threaded=True, request_handler=QuietHandler)
+    port = http_server.server_port
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+
+    socket_server = LocalSocketServer(service.socket_generate, path=os.path.join(DATA_DIR, 'midi.sock'))
+    socket_server.start()
+    client = SocketClient(socket_server.path)
+
+    print(f"{args.requests} requests per case, {'seeded (cached)' if seeded else 'unseeded'} generations")
+    try:
+        cases = [
+            ('http+download', lambda generator, seed: http_download(port, generator, seed)),
+            ('http inline', lambda generator, seed: http_inline(port, generator, seed)),
+            ('unix socket', lambda generator, seed: client.generate(generator, seed=seed)),
+        ]
+        results = {}
+        for name, func in cases:
+            timed(func, 30, seeded)  # warm connections, caches and the pool
+            results[name] = timed(func, args.requests, seeded)
+        for name, latencies in results.items():
+            report(name, latencies, None if name == 'http+download' else results['http+download'])
+    finally:
+        client.close()
+        http_server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
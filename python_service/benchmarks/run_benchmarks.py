@@ -0,0 +1,258 @@
+"""
+Benchmark Suite
+Times the generators, the midi_tools primitives and the HTTP endpoints, and
+compares every case against a stored baseline so regressions fail loudly
+
+Each case reports best-of-N wall time, peak traced memory (tracemalloc, from
+a separate run so tracing doesn't skew the timings) and throughput in events
+per second. Inputs go from the default 24-point rhythm up to 10^6 events and
+16 voices.
+
+Usage (from python_service/):
+    python benchmarks/run_benchmarks.py                  # compare with baseline.json
+    python benchmarks/run_benchmarks.py --quick          # skip the 10^6 event cases
+    python benchmarks/run_benchmarks.py -k encode        # only cases whose name contains "encode"
+    python benchmarks/run_benchmarks.py --save-baseline  # record this machine's numbers
+
+Exits with status 1 if any case is slower (or uses more memory) than its
+baseline by more than the tolerance. Baselines are machine specific: save a
+new one when moving to different hardware.
+"""
+import argparse
+import atexit
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# The endpoint cases send hundreds of requests from one client
+os.environ.setdefault('RATE_LIMIT_RATE', '0')
+
+# ... and write files, index rows and job state: keep them out of uploads/
+DATA_DIR = tempfile.mkdtemp(prefix='midi-benchmarks-')
+atexit.register(shutil.rmtree, DATA_DIR, ignore_errors=True)
+for directory in ('OUTPUT_DIR', 'INDEX_DIR', 'JOBS_DIR', 'PREVIEW_DIR'):
+    os.environ[directory] = os.path.join(DATA_DIR, directory.split('_')[0].lower())
+
+from generators import generate_bassline, generate_simple_chords, generate_complex_chords  # noqa: E402
+from generators.bass import C_MAJOR, RHYTHM_DATA  # noqa: E402
+from generators.midi_tools import (data_to_midi, data_to_events, create_file, midi_to_data,  # noqa: E402
+                                   fit_to_c_major, normal_choice, rhythm_to_on_off)
+from generators.events import interleave_voices  # noqa: E402
+from generators.sampling import parse_distribution, choose_notes  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# Differences below these floors are treated as noise whatever the tolerance
+TIME_FLOOR = 0.001
+MEMORY_FLOOR = 64 * 1024
+
+
+def quarter_notes(num_notes):
+    """A rhythm of num_notes quarter notes (num_notes + 1 timing points)"""
+    return list(range(0, 96 * (num_notes + 1), 96))
+
+
+def make_events(num_notes, num_voices):
+    """Event array for num_voices random voices over a shared rhythm"""
+    note_on_timing, note_off_timing = rhythm_to_on_off(quarter_notes(num_notes))
+    voices = [data_to_events([random.choice(C_MAJOR) + 12 * (v % 6) for _ in range(num_notes)],
+                             note_on_timing, note_off_timing)
+              for v in range(num_voices)]
+    return interleave_voices(voices)
+
+
+def encode_bytes(num_notes, num_voices):
+    buffer = io.BytesIO()
+    create_file(make_events(num_notes, num_voices), buffer)
+    return buffer.getvalue()
+
+
+def generator_case(generator, num_notes):
+    rhythm = RHYTHM_DATA if num_notes is None else quarter_notes(num_notes)
+    return lambda: generator(io.BytesIO(), rhythm=rhythm, seed=1)
+
+
+def data_to_midi_case(num_notes):
+    note_on_timing, note_off_timing = rhythm_to_on_off(quarter_notes(num_notes))
+    pitch_data = [random.choice(C_MAJOR) for _ in range(num_notes)]
+    return lambda: data_to_midi(pitch_data, note_on_timing, note_off_timing)
+
+
+def create_file_case(num_notes, num_voices):
+    midi_events = make_events(num_notes, num_voices)
+    return lambda: create_file(midi_events, io.BytesIO())
+
+
+def midi_to_data_case(num_notes, num_voices):
+    midi_bytes = encode_bytes(num_notes, num_voices)
+    return lambda: midi_to_data(midi_bytes)
+
+
+def fit_to_c_major_case(num_notes):
+    notes = [random.randint(0, 127) for _ in range(num_notes)]
+    return lambda: fit_to_c_major(notes)
+
+
+def normal_choice_case(calls):
+    scale = list(range(128))
+    return lambda: [normal_choice(scale) for _ in range(calls)]
+
+
+def choose_notes_case(distribution, num_notes):
+    scale = list(range(40, 52))
+    parsed = parse_distribution(distribution, len(scale))
+    rng = np.random.default_rng(0)
+    return lambda: choose_notes(scale, parsed, rng, num_notes)
+
+
+def endpoint_case(path, payload, cleanup=None):
+    from app import app
+    from storage import path_for
+    client = app.test_client()
+
+    def run():
+        response = client.post(path, json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} returned {response.status_code}")
+        response.get_data()
+        if cleanup:
+            os.remove(path_for(cleanup))
+    return run
+
+
+def build_cases(quick):
+    """
+    Every case: (name, events processed per run, runs to time, setup)
+    setup() builds the inputs and returns the function to time
+    """
+    cases = [
+        ('generate_bassline default', 44, 200, lambda: generator_case(generate_bassline, None)),
+        ('generate_simple_chords default', 184, 200, lambda: generator_case(generate_simple_chords, None)),
+        ('generate_complex_chords default', 230, 200, lambda: generator_case(generate_complex_chords, None)),
+        ('generate_simple_chords 1e5 notes', 800000, 3, lambda: generator_case(generate_simple_chords, 100000)),
+        ('generate_complex_chords 1e5 notes', 1000000, 3, lambda: generator_case(generate_complex_chords, 100000)),
+        ('data_to_midi 1e5 notes', 200000, 3, lambda: data_to_midi_case(100000)),
+        ('create_file encode default', 46, 500, lambda: create_file_case(23, 1)),
+        ('create_file encode 1e5 events', 100000, 5, lambda: create_file_case(50000, 1)),
+        ('create_file encode 16 voices', 160000, 5, lambda: create_file_case(5000, 16)),
+        ('midi_to_data 1e5 events', 100000, 5, lambda: midi_to_data_case(50000, 1)),
+        ('midi_to_data 16 voices', 160000, 5, lambda: midi_to_data_case(5000, 16)),
+        ('fit_to_c_major 1e5 notes', 100000, 5, lambda: fit_to_c_major_case(100000)),
+        ('normal_choice 1e5 calls', 100000, 3, lambda: normal_choice_case(100000)),
+        ('choose_notes weights 1e6 notes', 1000000, 5,
+         lambda: choose_notes_case([12, 1, 2, 1, 6, 3, 1, 8, 1, 2, 1, 4], 1000000)),
+        ('choose_notes markov 1e5 notes', 100000, 3,
+         lambda: choose_notes_case({'type': 'markov', 'matrix': [[1 + (i * j) % 5 for j in range(12)] for i in range(12)]},
+                                   100000)),
+        ('POST /api/generate/bass inline', 44, 100,
+         lambda: endpoint_case('/api/generate/bass', {'inline': True})),
+        ('POST /api/generate/complex-chords inline', 230, 100,
+         lambda: endpoint_case('/api/generate/complex-chords', {'inline': True})),
+        ('POST /api/generate/simple-chords file', 184, 100,
+         lambda: endpoint_case('/api/generate/simple-chords', {'filename': 'benchmark.mid'}, 'benchmark.mid')),
+        ('POST /api/generate/complex-chords 1e4 notes', 100000, 3,
+         lambda: endpoint_case('/api/generate/complex-chords', {'inline': True, 'rhythm': quarter_notes(10000)})),
+    ]
+    if not quick:
+        cases += [
+            ('create_file encode 1e6 events', 1000000, 3, lambda: create_file_case(500000, 1)),
+            ('create_file encode 1e6 events 16 voices', 1000000, 3, lambda: create_file_case(31250, 16)),
+            ('midi_to_data 1e6 events', 1000000, 3, lambda: midi_to_data_case(500000, 1)),
+            ('fit_to_c_major 1e6 notes', 1000000, 3, lambda: fit_to_c_major_case(1000000)),
+        ]
+    return cases
+
+
+def measure(setup, runs):
+    """Return (best seconds, peak traced bytes) for the function built by setup"""
+    func = setup()
+    func()  # warm caches and lazy imports
+
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def compare(result, baseline, tolerance):
+    """Describe how a result moved against its baseline; second value is True for a regression"""
+    if baseline is None:
+        return 'new', False
+    problems = []
+    if result['seconds'] - baseline['seconds'] > max(TIME_FLOOR, baseline['seconds'] * tolerance):
+        problems.append(f"time {result['seconds'] / baseline['seconds']:.2f}x")
+    if result['peak_bytes'] - baseline['peak_bytes'] > max(MEMORY_FLOOR, baseline['peak_bytes'] * tolerance):
+        problems.append(f"memory {result['peak_bytes'] / max(baseline['peak_bytes'], 1):.2f}x")
+    if problems:
+        return 'REGRESSION ' + ', '.join(problems), True
+    return f"{result['seconds'] / baseline['seconds']:.2f}x time", False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-k', dest='pattern', default='', help='only run cases whose name contains this')
+    parser.add_argument('--quick', action='store_true', help='skip the 10^6 event cases')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed slowdown/growth before failing (default 0.5 = 50%%)')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline file to compare with')
+    parser.add_argument('--save-baseline', action='store_true', help='write results to the baseline file')
+    args = parser.parse_args()
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baselines = json.load(baseline_file)
+
+    random.seed(0)
+    results = {}
+    regressions = []
+    print(f"{'case':<44} {'events':>9} {'best ms':>11} {'peak KiB':>10} {'events/s':>12}  vs baseline")
+    for name, num_events, runs, setup in build_cases(args.quick):
+        if args.pattern not in name:
+            continue
+        seconds, peak = measure(setup, runs)
+        result = {'events': num_events, 'seconds': seconds, 'peak_bytes': peak}
+        results[name] = result
+
+        status, regressed = compare(result, baselines.get(name), args.tolerance)
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<44} {num_events:>9} {seconds * 1000:>11.3f} {peak / 1024:>10.1f} "
+              f"{num_events / seconds:>12.0f}  {status}")
+
+    if args.save_baseline:
+        baselines.update(results)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(baselines, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+        print(f"Saved {len(results)} results to {args.baseline}")
+        return
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for name in regressions:
+            print(f"  {name}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+MIDI Result Cache
+Content-addressed LRU cache of encoded MIDI bytes for seeded requests
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from generators import GENERATOR_VERSION
+
+
+def cache_key(generator_name, scale, rhythm, seed, key=None, midi_format=0, distribution=None):
+    """
+    Build a content-addressed key for one generation
+
+    Only seeded requests are deterministic, so only those should be cached.
+    The distribution is only part of the key when given, so keys for
+    uniform requests are the same as before it existed.
+    """
+    fields = [generator_name, scale, rhythm, seed, key, midi_format, GENERATOR_VERSION]
+    if distribution is not None:
+        fields.append(distribution)
+    payload = json.dumps(fields, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class MidiCache:
+    """LRU cache bounded by both entry count and total bytes"""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return cached bytes (marking them recently used) or None"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store bytes, evicting least recently used entries to stay within bounds"""
+        if len(value) > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = value
+            self._bytes += len(value)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Current size and hit/miss/eviction counters"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
@@ -8,13 +8,126 @@ PORT = int(os.getenv('PORT', 5001))
 HOST = os.getenv('HOST', '0.0.0.0')
 DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
 
+# Production server (serve.py): preforked gunicorn workers, each with a thread pool
+WORKERS = int(os.getenv('WORKERS', os.cpu_count() or 1))
+THREADS = int(os.getenv('THREADS', 4))
+REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT', 30))
+GRACEFUL_TIMEOUT = int(os.getenv('GRACEFUL_TIMEOUT', 30))
+KEEPALIVE = int(os.getenv('KEEPALIVE', 5))
+
+# Local socket transport (local_socket.py): a Unix domain socket for callers on
+# the same machine, with length-prefixed binary frames instead of HTTP + JSON
+# (empty disables). Each worker serves up to SOCKET_CONNECTIONS persistent
+# connections; idle ones are closed after SOCKET_IDLE_TIMEOUT seconds.
+SOCKET_PATH = os.getenv('SOCKET_PATH', '')
+SOCKET_MODE = int(os.getenv('SOCKET_MODE', '660'), 8)
+SOCKET_CONNECTIONS = int(os.getenv('SOCKET_CONNECTIONS', 64))
+SOCKET_IDLE_TIMEOUT = float(os.getenv('SOCKET_IDLE_TIMEOUT', 60))
+
 # Output directory for generated MIDI files
-OUTPUT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'uploads', 'midi'))
+OUTPUT_DIR = os.getenv('OUTPUT_DIR', os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'uploads', 'midi')))
 
 # Ensure output directory exists
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-# MIDI generation defaults
-DEFAULT_SCALE = 'C_MAJOR'
+# Output sweeper (storage.py): generated files older than OUTPUT_TTL seconds are
+# deleted, then the oldest until OUTPUT_DIR is under OUTPUT_MAX_BYTES (0 disables
+# either). Filenames listed in OUTPUT_MANIFEST belong to projects and are kept.
+OUTPUT_TTL = int(os.getenv('OUTPUT_TTL', 7 * 24 * 3600))
+OUTPUT_MAX_BYTES = int(os.getenv('OUTPUT_MAX_BYTES', 1024 * 1024 * 1024))
+OUTPUT_SWEEP_INTERVAL = int(os.getenv('OUTPUT_SWEEP_INTERVAL', 300))
+OUTPUT_MANIFEST = os.getenv('OUTPUT_MANIFEST', os.path.join(OUTPUT_DIR, 'referenced.txt'))
+
+# Audio previews (/api/preview): rendered WAV files are cached in PREVIEW_DIR,
+# named by a hash of the MIDI content and render settings, and swept like
+# OUTPUT_DIR (PREVIEW_TTL seconds, PREVIEW_MAX_BYTES in total)
+PREVIEW_DIR = os.getenv('PREVIEW_DIR', os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'uploads', 'previews')))
+os.makedirs(PREVIEW_DIR, exist_ok=True)
+PREVIEW_SECONDS = float(os.getenv('PREVIEW_SECONDS', 30))
+PREVIEW_MAX_SECONDS = float(os.getenv('PREVIEW_MAX_SECONDS', 120))
+PREVIEW_SAMPLE_RATE = int(os.getenv('PREVIEW_SAMPLE_RATE', 22050))
+PREVIEW_TTL = int(os.getenv('PREVIEW_TTL', 24 * 3600))
+PREVIEW_MAX_BYTES = int(os.getenv('PREVIEW_MAX_BYTES', 256 * 1024 * 1024))
+
+# Note index (note_index.py): an append-only columnar index of generated
+# files in INDEX_DIR for duplicate and similarity lookups. Rows hold pitch
+# class INDEX_NGRAM-gram vectors of INDEX_DIMS buckets; similarity queries
+# rerank the INDEX_CANDIDATES closest SimHash matches.
+INDEX_ENABLED = os.getenv('INDEX_ENABLED', 'True').lower() == 'true'
+INDEX_DIR = os.getenv('INDEX_DIR', os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'uploads', 'index')))
+INDEX_NGRAM = int(os.getenv('INDEX_NGRAM', 3))
+INDEX_DIMS = int(os.getenv('INDEX_DIMS', 64))
+INDEX_CANDIDATES = int(os.getenv('INDEX_CANDIDATES', 256))
+
+# Admission control (admission.py): largest request body, largest single
+# generation in MIDI events (notes x voices x 2), longest scale, total cost
+# of requests running at once per worker process, and how long a request
+# waits for that capacity before getting a 503
+MAX_REQUEST_BYTES = int(os.getenv('MAX_REQUEST_BYTES', 4 * 1024 * 1024))
+MAX_REQUEST_COST = int(os.getenv('MAX_REQUEST_COST', 1000000))
+MAX_SCALE_NOTES = int(os.getenv('MAX_SCALE_NOTES', 128))
+INFLIGHT_COST_LIMIT = int(os.getenv('INFLIGHT_COST_LIMIT', 2000000))
+ADMISSION_WAIT = float(os.getenv('ADMISSION_WAIT', 0.25))
+
+# Per-client rate limit on the generation endpoints: requests per second and
+# burst size (0 disables). Clients are told apart by CLIENT_ID_HEADER (set by
+# the PHP frontend), falling back to the remote address.
+RATE_LIMIT_RATE = float(os.getenv('RATE_LIMIT_RATE', 20))
+RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', 40))
+RATE_LIMIT_CLIENTS = int(os.getenv('RATE_LIMIT_CLIENTS', 10000))
+CLIENT_ID_HEADER = os.getenv('CLIENT_ID_HEADER', 'X-Client-Id')
+
+# Process pool for batch, job, export and transform work. Every gunicorn worker
+# has its own pool, so by default the WORKERS pools split the cores between
+# them (WORKERS x BATCH_WORKERS ~ cores) rather than each taking all of them.
+# The development server (python app.py) is one process: run it with
+# WORKERS=1 to give its pool every core.
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', max(1, (os.cpu_count() or 1) // WORKERS)))
+MAX_BATCH_JOBS = int(os.getenv('MAX_BATCH_JOBS', 100))
+
+# Most files (stored plus generated) one /api/export archive may contain
+MAX_EXPORT_FILES = int(os.getenv('MAX_EXPORT_FILES', 1000))
+
+# Most files (stored or uploaded) one /api/transform request may transform
+MAX_TRANSFORM_FILES = int(os.getenv('MAX_TRANSFORM_FILES', 500))
+
+# Asynchronous job API (/api/jobs): worker threads per process, queue bound,
+# and how long finished results are kept. Job state is shared through JOBS_DIR
+# so any gunicorn worker can answer a status request.
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', 100))
+JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', 3600))
+JOBS_DIR = os.getenv('JOBS_DIR', os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'uploads', 'jobs')))
+os.makedirs(JOBS_DIR, exist_ok=True)
+
+# Most saves and note index updates waiting on a worker's background writer.
+# Past it, index updates are dropped (and counted in /metrics) and saves are
+# written by the request itself.
+PERSIST_QUEUE_SIZE = int(os.getenv('PERSIST_QUEUE_SIZE', 256))
+
+# Cache of encoded MIDI for seeded requests
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 1024))
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', 16 * 1024 * 1024))
+
+# Warm pool (pool.py) of pre-rendered variations for requests with default
+# parameters: variations kept ready per generator/key/format (0 disables),
+# background renders per second, and refills pause while this many requests
+# are in flight in the worker
+WARM_POOL_DEPTH = int(os.getenv('WARM_POOL_DEPTH', 0))
+WARM_POOL_REFILL_RATE = float(os.getenv('WARM_POOL_REFILL_RATE', 20))
+WARM_POOL_BUSY_REQUESTS = int(os.getenv('WARM_POOL_BUSY_REQUESTS', 2))
+WARM_POOL_MAX_SETS = int(os.getenv('WARM_POOL_MAX_SETS', 16))
+
+# Cache lifetime (seconds) for downloads of content-addressed files, which never change
+DOWNLOAD_MAX_AGE = int(os.getenv('DOWNLOAD_MAX_AGE', 365 * 24 * 3600))
+
+# Requests carrying this header with value 1 get a Server-Timing stage breakdown
+PROFILE_HEADER = os.getenv('PROFILE_HEADER', 'X-Profile')
+
+# Longest piece /api/generate/stream will produce, in notes
+STREAM_MAX_NOTES = int(os.getenv('STREAM_MAX_NOTES', 5000000))
+
+# MIDI generation defaults (DEFAULT_SCALE is a key name such as 'C_MAJOR' or 'A_MINOR')
+DEFAULT_SCALE = os.getenv('DEFAULT_SCALE', 'C_MAJOR')
 DEFAULT_BPM = 120
 
@@ -0,0 +1,89 @@
+"""
+Project Export
+Streams a ZIP archive of MIDI files while it is being built
+
+The archive is written through zipfile into a sink that is emptied after
+every entry, so only one entry is ever held in memory (plus zipfile's
+central directory, a small record per entry) and nothing is written to a
+temp file. Because the output can't seek, zipfile puts each
+entry's CRC and sizes in a data descriptor after its data, which every
+common unzip tool reads. MIDI files are small, so entries are stored
+uncompressed by default (or deflated at level 1 on request).
+"""
+import io
+import zipfile
+from storage import open_output
+
+COMPRESSION = {
+    'stored': zipfile.ZIP_STORED,
+    'deflate': zipfile.ZIP_DEFLATED
+}
+
+# Name of the entry listing files that could not be added
+ERRORS_ENTRY = 'errors.txt'
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, unseekable file object that collects zipfile's output until drained"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def unique_name(filename, used):
+    """filename, or filename with a _2, _3 ... suffix if it is already in the archive"""
+    name = filename
+    stem, dot, extension = filename.rpartition('.')
+    if not dot:
+        stem, extension = filename, ''
+    count = 1
+    while name in used:
+        count += 1
+        name = f"{stem}_{count}{dot}{extension}"
+    used.add(name)
+    return name
+
+
+def stored_files(filenames):
+    """(filename, bytes, None) for each generated file, or (filename, None, error) if it is missing"""
+    for filename in filenames:
+        output_file, _ = open_output(filename)
+        if output_file is None:
+            yield filename, None, 'File not found'
+            continue
+        with output_file:
+            yield filename, output_file.read(), None
+
+
+def iter_zip(entries, compression='stored'):
+    """
+    Build a ZIP archive from (filename, bytes, error) entries, yielding it in pieces
+
+    Entries with an error are left out and listed in errors.txt at the end of
+    the archive instead of failing the whole export.
+    """
+    sink = _ZipSink()
+    used = set()
+    errors = []
+    with zipfile.ZipFile(sink, 'w', compression=COMPRESSION[compression], compresslevel=1) as archive:
+        for filename, data, error in entries:
+            if error is not None:
+                errors.append(f"{filename}: {error}")
+                continue
+            archive.writestr(unique_name(filename, used), data)
+            yield sink.drain()
+        if errors:
+            archive.writestr(unique_name(ERRORS_ENTRY, used), '\n'.join(errors) + '\n')
+    yield sink.drain()
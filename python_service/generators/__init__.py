@@ -1,25 +1,86 @@
 """
 MIDI Generators Package
 """
-from .bass import generate_bassline
-from .complex_chords import generate_complex_chords
-from .simple_chords import generate_simple_chords
+# Bump whenever generator output changes for the same inputs and seed,
+# so cached results from older code are not served
+GENERATOR_VERSION = 3
+
+from .bass import generate_bassline, generate_bassline_batch, generate_bassline_stream
+from .complex_chords import generate_complex_chords, generate_complex_chords_batch, generate_complex_chords_stream
+from .simple_chords import generate_simple_chords, generate_simple_chords_batch, generate_simple_chords_stream
+from .quantize import quantize, get_table, parse_key, scale_notes, MODES, DEFAULT_KEY
+from .events import EVENT_DTYPE, notes_to_events, interleave_voices, merge_voices
+from .synth import SYNTH_VERSION, render_notes, render_preview, encode_wav
+from .sampling import Distribution, AliasTable, MarkovTable, parse_distribution, choose_notes
+from .registry import STYLES, Style, Voice, register_style, shift, stack, random_stack, style_voices
+from .simple_chords import simple_chord_voices
+from .complex_chords import complex_chord_voices
+from .transform import parse_operations, apply_operations, transform_midi
 from .midi_tools import (
     data_to_midi,
+    data_to_events,
     create_file,
+    batch_to_midi,
+    stream_to_midi,
+    notes_in_duration,
     rhythm_to_on_off,
     fit_to_c_major,
+    fit_to_c_major_array,
     normal_choice
 )
 
 __all__ = [
+    'GENERATOR_VERSION',
     'generate_bassline',
     'generate_complex_chords',
     'generate_simple_chords',
+    'generate_bassline_batch',
+    'generate_complex_chords_batch',
+    'generate_simple_chords_batch',
+    'generate_bassline_stream',
+    'generate_complex_chords_stream',
+    'generate_simple_chords_stream',
+    'quantize',
+    'get_table',
+    'parse_key',
+    'scale_notes',
+    'MODES',
+    'DEFAULT_KEY',
+    'EVENT_DTYPE',
+    'notes_to_events',
+    'interleave_voices',
+    'merge_voices',
+    'SYNTH_VERSION',
+    'render_notes',
+    'render_preview',
+    'encode_wav',
+    'Distribution',
+    'AliasTable',
+    'MarkovTable',
+    'parse_distribution',
+    'choose_notes',
+    'STYLES',
+    'Style',
+    'Voice',
+    'register_style',
+    'shift',
+    'stack',
+    'random_stack',
+    'style_voices',
+    'simple_chord_voices',
+    'complex_chord_voices',
+    'parse_operations',
+    'apply_operations',
+    'transform_midi',
     'data_to_midi',
+    'data_to_events',
     'create_file',
+    'batch_to_midi',
+    'stream_to_midi',
+    'notes_in_duration',
     'rhythm_to_on_off',
     'fit_to_c_major',
+    'fit_to_c_major_array',
     'normal_choice'
 ]
 
@@ -1,43 +1,79 @@
 """
 Bassline Generator
-Generates random basslines in C major scale
+Generates random basslines in any key (C major by default)
 """
-import random
-from .midi_tools import data_to_midi, create_file, rhythm_to_on_off
+from .midi_tools import STREAM_CHUNK_NOTES
+from .registry import Style, Voice, register_style, generate_file, generate_batch, generate_stream
+from .registry import C_MAJOR, RHYTHM_DATA, BASS_LOW, BASS_HIGH, default_scale  # noqa: F401 (re-exported)
 
-# MIDI numbers of the possible bass notes (c major scale, E1-D2)
-C_MAJOR = [40, 41, 43, 45, 47, 48, 50]
+# Number of notes drawn for each bassline
+NUM_NOTES = 22
 
-# Timing of the notes on and off (12 whole notes, 6 half notes, 4 quarter notes)
-RHYTHM_DATA = [0, 384, 768, 1152, 1536, 1920, 2304, 2688, 3072, 3456, 3840, 4224, 4608, 4800, 4992, 5184, 5376, 5568, 5760, 5856, 5952, 6048, 6144, 6240]
 
-
-def generate_bassline(output_path, scale=None, rhythm=None):
+def generate_bassline(output_path, scale=None, rhythm=None, seed=None, key=None, midi_format=0, distribution=None):
     """
     Generate a random bassline MIDI file
     
     Args:
-        output_path (str): Full path where to save the MIDI file
-        scale (list, optional): List of MIDI note numbers to use. Defaults to C_MAJOR.
+        output_path (str): Full path where to save the MIDI file, or a binary file object
+        scale (list, optional): List of MIDI note numbers to use. Defaults to the key's bass notes.
         rhythm (list, optional): List of timing values. Defaults to RHYTHM_DATA.
+        seed (int, optional): Seed for reproducible output
+        key (str, optional): Key name such as 'A_MINOR' for the default scale. Defaults to C major.
+        midi_format (int, optional): 0 for a single-track file (default), 1 for multi-track
+        distribution (optional): Note weighting, see sampling.py. Defaults to uniform.
     
     Returns:
-        str: Path to the generated MIDI file
+        str: Path to the generated MIDI file (or the file object that was written to)
+    """
+    # The bassline itself is the only voice
+    return generate_file(BASS, output_path, scale, rhythm, seed, key, midi_format, distribution)
+
+
+def generate_bassline_batch(n, scale=None, rhythm=None, seed=None, key=None, distribution=None):
     """
-    if scale is None:
-        scale = C_MAJOR
-    if rhythm is None:
-        rhythm = RHYTHM_DATA
+    Generate many random basslines at once with NumPy
     
-    # Grab random notes from bass octave of c-major scale and arrange them randomly
-    pitch_data = random.choices(scale, k=22)
+    Args:
+        n (int): Number of variations
+        scale (list, optional): List of MIDI note numbers to use. Defaults to the key's bass notes.
+        rhythm (list, optional): List of timing values. Defaults to RHYTHM_DATA.
+        seed (int, optional): Seed for reproducible output
+        key (str, optional): Key name such as 'A_MINOR' for the default scale. Defaults to C major.
+        distribution (optional): Note weighting, see sampling.py. Defaults to uniform.
     
-    # Create note off data when one note starts signals the end of the previous note
-    note_on_timing, note_off_timing = rhythm_to_on_off(rhythm)
+    Returns:
+        numpy.ndarray: Pitch data shaped (variations, notes, 1), ready for batch_to_midi
+    """
+    # Same draw as generate_bassline (at most NUM_NOTES notes), for every variation in one call
+    return generate_batch(BASS, n, scale, rhythm, seed, key, distribution)
+
+
+def generate_bassline_stream(num_notes, scale=None, seed=None, key=None, chunk_notes=STREAM_CHUNK_NOTES,
+                             distribution=None):
+    """
+    Generate a random bassline of any length lazily, chunk_notes notes at a time
     
-    # Turn pitch and rhythm data to midi data
-    bass_midi_notes = data_to_midi(pitch_data, note_on_timing, note_off_timing)
+    Args:
+        num_notes (int): Total number of notes
+        scale (list, optional): List of MIDI note numbers to use. Defaults to the key's bass notes.
+        seed (int, optional): Seed for reproducible output
+        key (str, optional): Key name such as 'A_MINOR' for the default scale. Defaults to C major.
+        chunk_notes (int, optional): Notes per chunk
+        distribution (optional): Note weighting, see sampling.py. Defaults to uniform.
     
-    # Add meta midi data (beginning and ending data) and write a new file
-    return create_file(bass_midi_notes, output_path)
+    Yields:
+        numpy.ndarray: Pitch data shaped (notes, 1), ready for stream_to_midi
+    """
+    return generate_stream(BASS, num_notes, scale, seed, key, chunk_notes, distribution)
+
 
+BASS = register_style(Style(
+    name='bass',
+    prefix='bass',
+    voices=(Voice('bass', 'bass', None),),
+    notes=NUM_NOTES,
+    generator=generate_bassline,
+    batch=generate_bassline_batch,
+    stream=generate_bassline_stream
+))
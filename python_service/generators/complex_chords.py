@@ -1,70 +1,99 @@
 """
 Complex Chord Progression Generator
-Generates complex, randomized chord progressions in C major with jazz-like harmonies
+Generates complex, randomized chord progressions in any key (C major by default) with jazz-like harmonies
 """
-import random
-import copy
-from .midi_tools import data_to_midi, create_file, fit_to_c_major, rhythm_to_on_off
+from .midi_tools import STREAM_CHUNK_NOTES
+from .quantize import DEFAULT_KEY
+from .registry import Style, Voice, register_style, shift, random_stack, style_voices
+from .registry import generate_file, generate_batch, generate_stream
 
+# The bass, the root (bass up an octave) and three harmony layers, each a
+# random 2-4 semitones above the one below and fit to key
+COMPLEX_CHORD_VOICES = (
+    Voice('bass', 'bass', None),
+    Voice('root', 'bass', shift(12)),
+    Voice('harmony1', 'root', random_stack(2, 4)),
+    Voice('harmony2', 'harmony1', random_stack(2, 4)),
+    Voice('harmony3', 'harmony2', random_stack(2, 4)),
+)
 
-def generate_complex_chords(output_path, scale=None, rhythm=None):
+
+def generate_complex_chords(output_path, scale=None, rhythm=None, seed=None, key=None, midi_format=0, distribution=None):
     """
     Generate complex chord progression with experimental harmonies
     
     Args:
-        output_path: Full path where to save .mid file
-        scale: Optional list of MIDI note numbers for bass notes (defaults to C major)
+        output_path: Full path where to save .mid file, or a binary file object
+        scale: Optional list of MIDI note numbers for bass notes (defaults to the key's E1-D2 notes)
         rhythm: Optional list of timing values (defaults to varied rhythm pattern)
+        seed: Optional seed for reproducible output
+        key: Optional key name such as 'A_MINOR' to harmonize in (defaults to C major)
+        midi_format: Optional 0 for one merged track (default) or 1 for one track per voice
+        distribution: Optional weighting of the bass notes, see sampling.py (defaults to uniform)
     
     Returns:
-        str: Path to generated file
+        str: Path to generated file (or the file object that was written to)
     """
-    # Default to C major scale (E1-D2) if not provided
-    if scale is None:
-        scale = [40, 41, 43, 45, 47, 48, 50]
-    
-    # Default rhythm: 12 whole notes, 6 half notes, 4 quarter notes
-    if rhythm is None:
-        rhythm = [0, 384, 768, 1152, 1536, 1920, 2304, 2688, 3072, 3456, 3840, 4224, 
-                 4608, 4800, 4992, 5184, 5376, 5568, 5760, 5856, 5952, 6048, 6144, 6240]
-    
-    # Generate random bassline from scale
-    num_notes = len(rhythm) - 1  # One less than rhythm points
-    bass = random.choices(scale, k=num_notes)
-    
-    def random_harmony(pitch_data):
-        """
-        Create harmony by transposing up 2-4 semitones randomly and fitting to scale
-        """
-        harmony_raw = copy.deepcopy(pitch_data)
-        harmony_raw = [x + random.choice([2, 3, 4]) for x in harmony_raw]
-        harmony = fit_to_c_major(harmony_raw)
-        return harmony
-    
-    # Create root notes (bass transposed up an octave)
-    roots_raw = copy.deepcopy(bass)
-    roots = [x + 12 for x in roots_raw]
+    return generate_file(COMPLEX_CHORDS, output_path, scale, rhythm, seed, key, midi_format, distribution)
+
+
+def complex_chord_voices(bass, key=DEFAULT_KEY, rng=None):
+    """
+    Complex chord voices over bass notes (an array of any shape): the bass, the
+    root (bass up an octave) and three harmony layers, each a random 2-4
+    semitones above the one below and fitted to key, stacked on a new last axis
     
-    # Generate 3 harmony layers with random intervals
-    harmony1 = random_harmony(roots)
-    harmony2 = random_harmony(harmony1)
-    harmony3 = random_harmony(harmony2)
+    Args:
+        bass: Bass notes
+        key: Key name to fit the harmonies to
+        rng: Optional numpy.random.Generator for the intervals
+    """
+    return style_voices(COMPLEX_CHORDS, bass, key, rng)
+
+
+def generate_complex_chords_batch(n, scale=None, rhythm=None, seed=None, key=None, distribution=None):
+    """
+    Generate many complex chord progressions at once with NumPy
     
-    # Create note on/off timing
-    note_on_timing, note_off_timing = rhythm_to_on_off(rhythm)
+    Args:
+        n: Number of variations
+        scale: Optional list of MIDI note numbers for bass notes (defaults to the key's E1-D2 notes)
+        rhythm: Optional list of timing values (defaults to varied rhythm pattern)
+        seed: Optional seed for reproducible output
+        key: Optional key name such as 'A_MINOR' to harmonize in (defaults to C major)
+        distribution: Optional weighting of the bass notes, see sampling.py (defaults to uniform)
     
-    # Convert pitch and rhythm data to MIDI
-    bass_midi_notes = data_to_midi(bass, note_on_timing, note_off_timing)
-    roots_midi_notes = data_to_midi(roots, note_on_timing, note_off_timing)
-    harmony1_midi_notes = data_to_midi(harmony1, note_on_timing, note_off_timing)
-    harmony2_midi_notes = data_to_midi(harmony2, note_on_timing, note_off_timing)
-    harmony3_midi_notes = data_to_midi(harmony3, note_on_timing, note_off_timing)
+    Returns:
+        numpy.ndarray: Pitch data shaped (variations, notes, 5), ready for batch_to_midi
+    """
+    # Each harmony layer stacks a random 2-4 semitone interval on the one below
+    return generate_batch(COMPLEX_CHORDS, n, scale, rhythm, seed, key, distribution)
+
+
+def generate_complex_chords_stream(num_notes, scale=None, seed=None, key=None, chunk_notes=STREAM_CHUNK_NOTES,
+                                   distribution=None):
+    """
+    Generate a complex chord progression of any length lazily, chunk_notes notes at a time
     
-    # Combine all voices into one MIDI sequence
-    chords = map(list, zip(bass_midi_notes, roots_midi_notes, harmony1_midi_notes, 
-                          harmony2_midi_notes, harmony3_midi_notes))
-    chords = [item for lst in chords for item in lst]
+    Args:
+        num_notes: Total number of notes (chords)
+        scale: Optional list of MIDI note numbers for bass notes (defaults to the key's E1-D2 notes)
+        seed: Optional seed for reproducible output
+        key: Optional key name such as 'A_MINOR' to harmonize in (defaults to C major)
+        chunk_notes: Optional number of notes per chunk (part of the seed: other sizes draw differently)
+        distribution: Optional weighting of the bass notes, see sampling.py (defaults to uniform)
     
-    # Create MIDI file
-    return create_file(chords, output_path)
+    Yields:
+        numpy.ndarray: Pitch data shaped (notes, 5), ready for stream_to_midi
+    """
+    return generate_stream(COMPLEX_CHORDS, num_notes, scale, seed, key, chunk_notes, distribution)
+
 
+COMPLEX_CHORDS = register_style(Style(
+    name='complex-chords',
+    prefix='complex_chords',
+    voices=COMPLEX_CHORD_VOICES,
+    generator=generate_complex_chords,
+    batch=generate_complex_chords_batch,
+    stream=generate_complex_chords_stream
+))
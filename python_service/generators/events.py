@@ -0,0 +1,131 @@
+"""
+Note Events - Compact array-backed MIDI event container
+Every voice, merge and encode step works on one packed NumPy structured array
+
+Memory per event (measured with benchmarks/bench_events.py, 200k events):
+    EVENT_DTYPE array ............ 8 bytes retained, 16 bytes peak
+    (tick, status, pitch, vel) ... 80 bytes (tuple in a list)
+    CSV strings (data_to_midi) ... 85 bytes retained, 456 bytes peak from the copies
+"""
+import numpy as np
+from .smf import NOTE_ON, NOTE_OFF, NOTE_ON_VELOCITY, NOTE_OFF_VELOCITY
+
+# One MIDI channel event: absolute tick, event type (0x80/0x90), channel, pitch and velocity
+EVENT_DTYPE = np.dtype([
+    ('tick', '<i4'),
+    ('type', 'u1'),
+    ('channel', 'u1'),
+    ('pitch', 'u1'),
+    ('velocity', 'u1'),
+])
+
+
+def empty_events(size=0):
+    """Allocate an event array"""
+    return np.zeros(size, dtype=EVENT_DTYPE)
+
+
+def notes_to_events(pitch_data, note_on_timing, note_off_timing, channel=0,
+                    on_velocity=NOTE_ON_VELOCITY, off_velocity=NOTE_OFF_VELOCITY):
+    """
+    Build one voice's events: each note's on followed by its off
+
+    Notes are truncated to the shortest of the three inputs, like zip.
+
+    Args:
+        pitch_data: MIDI notes (list or array)
+        note_on_timing: Absolute tick of each note on
+        note_off_timing: Absolute tick of each note off
+        channel (int): MIDI channel 0-15
+
+    Returns:
+        numpy.ndarray: EVENT_DTYPE array of length 2 * notes
+    """
+    num_notes = min(len(pitch_data), len(note_on_timing), len(note_off_timing))
+    pitch = np.asarray(pitch_data[:num_notes])
+    if pitch.size and (pitch.min() < 0 or pitch.max() > 255):
+        raise ValueError('byte must be in range(0, 256)')
+
+    # View the flat array as (notes, 2) so on/off rows are filled in place
+    events = empty_events(2 * num_notes)
+    pairs = events.reshape(num_notes, 2)
+    pairs['tick'][:, 0] = note_on_timing[:num_notes]
+    pairs['tick'][:, 1] = note_off_timing[:num_notes]
+    pairs['type'][:, 0] = NOTE_ON
+    pairs['type'][:, 1] = NOTE_OFF
+    pairs['velocity'][:, 0] = on_velocity
+    pairs['velocity'][:, 1] = off_velocity
+    pairs['pitch'] = pitch[:, np.newaxis]
+    events['channel'] = channel
+    return events
+
+
+def fill_pitches(skeleton, pitch_data):
+    """
+    Copy of one voice's events (from notes_to_events) with new pitches, so voices
+    that share a rhythm build their ticks, types and velocities only once
+
+    Returns:
+        numpy.ndarray: EVENT_DTYPE array like skeleton
+    """
+    pitch = np.asarray(pitch_data)[:len(skeleton) // 2]
+    if pitch.size and (pitch.min() < 0 or pitch.max() > 255):
+        raise ValueError('byte must be in range(0, 256)')
+    events = skeleton.copy()
+    events.reshape(-1, 2)['pitch'] = pitch[:, np.newaxis]
+    return events
+
+
+def interleave_voices(voices):
+    """
+    Combine voices that share a rhythm: event i of every voice, then event i + 1 ...
+
+    Same order as zipping the voices and flattening, in one array copy.
+    Longer voices are truncated to the shortest, like zip.
+    """
+    if not voices:
+        return empty_events()
+    length = min(len(voice) for voice in voices)
+    return np.stack([voice[:length] for voice in voices], axis=1).reshape(-1)
+
+
+def merge_voices(voices):
+    """
+    Merge independently timed voices (any rhythms, offsets and lengths) into one tick-ordered array
+
+    Events are ordered by tick; at equal ticks note offs come before note ons,
+    then voices keep their order in the list, and each voice keeps its own
+    event order (so a zero-length note still turns on before it turns off).
+    A voice whose ticks go backwards is first sorted by tick (stably).
+
+    Each voice is already a sorted run, so the stable sort (timsort) only has
+    to merge k runs: O(n log k) for n events in k voices. For voices that share
+    a rhythm of non-zero-length notes the result is the same as interleave_voices.
+    """
+    voices = [voice for voice in voices if len(voice)]
+    if not voices:
+        return empty_events()
+
+    # Shared timing with strictly increasing (tick, off before on) keys: interleaving gives the same order
+    first = voices[0]
+    if all(len(voice) == len(first) and np.array_equal(voice['tick'], first['tick'])
+           and np.array_equal(voice['type'], first['type']) for voice in voices[1:]):
+        first_keys = 2 * first['tick'].astype(np.int64) + (first['type'] != NOTE_OFF)
+        if np.all(first_keys[1:] > first_keys[:-1]):
+            return interleave_voices(voices)
+
+    events = np.concatenate(voices)
+    ticks = events['tick'].astype(np.int64)
+    voice_ids = np.repeat(np.arange(len(voices), dtype=np.int64), [len(voice) for voice in voices])
+
+    # Ticks going backwards inside a voice (not just where one voice ends and the next begins)
+    backwards = (ticks[1:] < ticks[:-1]) & (voice_ids[1:] == voice_ids[:-1])
+    if backwards.any():
+        order = np.lexsort((ticks, voice_ids))
+        events, ticks = np.take(events, order), np.take(ticks, order)
+
+    # Offs sort before ons at the same tick. A running maximum per voice keeps each
+    # voice's own order (voice blocks are offset so the maximum can't cross them).
+    block = voice_ids << 34
+    keys = np.maximum.accumulate(2 * ticks + (events['type'] != NOTE_OFF) + block) - block
+    return np.take(events, np.argsort(keys, kind='stable'))
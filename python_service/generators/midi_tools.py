@@ -2,9 +2,15 @@
 MIDI Tools - Utilities for MIDI file generation
 Based on original midi_tools.py
 """
+import io
 import py_midicsv
 import copy
-from random import normalvariate, randrange
+import numpy as np
+from .quantize import quantize
+from .smf import encode_file, encode_multitrack_file, encode_batch, read_notes, measure_track, iter_file
+from .events import EVENT_DTYPE, notes_to_events, interleave_voices
+from .profiling import stage
+from .sampling import normal_table
 
 # These integers correspond to the black and white keys of the piano
 black_keys = [1, 3, 6, 8, 10, 13, 15, 18, 20, 22, 25, 27, 30, 32, 34, 37, 39, 42, 44, 46, 49, 51, 54, 56, 58, 61, 63, 66, 68, 70, 73, 75, 78, 80, 82, 85, 87, 90, 92, 94, 97, 99, 102, 104, 106, 109, 111, 114, 116, 118, 121, 123, 126]
@@ -13,6 +19,9 @@ white_keys = [0, 2, 4, 5, 7, 9, 11, 12, 14, 16, 17, 19, 21, 23, 24, 26, 28, 29,
 NOTE_ON_WRAPPER = ['1', 0, 'Note_on_c', '0', 60, '100'] 
 NOTE_OFF_WRAPPER = ['1', 96, 'Note_off_c', '0', 60, '64']
 
+# Notes generated per chunk by the streaming generators
+STREAM_CHUNK_NOTES = 4096
+
 
 def replace_value(replace_item, notes_list=None, timing_list=None):
     """Used for manipulating pitch and rhythm data"""
@@ -48,34 +57,27 @@ def switch_string(switch_index, switch_index_2, notes=None, str_int_switch=str):
 
 def fit_to_c_major(notes_list):
     """Used for fitting pitch data to correspond with c-major scale / white keys list"""
-    new_list = []
-    for i in notes_list:  # changes note data to the next highest number in scale
-        if i not in white_keys:
-            i = i + 1
-        new_list.append(i)
-    return new_list
-
-
-def midi_to_data(midi):
-    """Used for midi files into pitch and rhythm data"""
-    midicsv = py_midicsv.midi_to_csv(midi)
-    melody = midicsv[5:-2]
+    # changes note data to the next highest number in scale (one table lookup per note)
+    return quantize(notes_list, 'C_MAJOR', policy='up')
 
-    new_melody = [i.split(",") for i in melody]
 
-    for index, item in enumerate(new_melody):
-        item[1] = int(item[1])
-        item[4] = int(item[4])
+def fit_to_c_major_array(notes):
+    """Vectorized fit_to_c_major for NumPy arrays of any shape"""
+    return quantize(np.asarray(notes), 'C_MAJOR', policy='up')
 
-    all_melody = switch_string(1, 4, notes=new_melody, str_int_switch=int)
 
-    note_on = [i for i in all_melody if i[2] == ' Note_on_c']
-
-    note_off = [i for i in all_melody if i[2] == ' Note_off_c']
-
-    pitch_data = [i[4] for i in note_on]
-    note_on_timing = [i[1] for i in note_on]
-    note_off_timing = [i[1] for i in note_off]
+def midi_to_data(midi):
+    """
+    Used for midi files into pitch and rhythm data
+    
+    Reads the file directly with the SMF reader (see read_notes for the raw
+    arrays, including velocity, channel and track). note_off_timing[i] is
+    the end of the note that starts at note_on_timing[i].
+    """
+    notes = read_notes(midi)
+    pitch_data = notes.pitch.tolist()
+    note_on_timing = notes.on.tolist()
+    note_off_timing = notes.off.tolist()
     return pitch_data, note_on_timing, note_off_timing
 
 
@@ -92,6 +94,66 @@ def rhythm_to_on_off(rhythm_data):
     return note_on_timing, note_off_timing
 
 
+def loop_rhythm(rhythm_data, start, count):
+    """
+    Note on/off ticks for notes start .. start + count of a rhythm repeated
+    end to end (each repeat shifted by rhythm_data[-1] - rhythm_data[0])
+    """
+    rhythm = np.asarray(rhythm_data, dtype=np.int64)
+    if len(rhythm) < 2 or rhythm[-1] <= rhythm[0]:
+        raise ValueError('rhythm must have at least two points and end after it starts')
+    loops, positions = np.divmod(np.arange(start, start + count), len(rhythm) - 1)
+    offset = loops * (rhythm[-1] - rhythm[0])
+    return rhythm[:-1][positions] + offset, rhythm[1:][positions] + offset
+
+
+def notes_in_duration(rhythm_data, ticks):
+    """Number of notes of a looped rhythm that start before ticks"""
+    rhythm = np.asarray(rhythm_data, dtype=np.int64)
+    if len(rhythm) < 2 or rhythm[-1] <= rhythm[0]:
+        raise ValueError('rhythm must have at least two points and end after it starts')
+    loops, remainder = divmod(int(ticks), int(rhythm[-1] - rhythm[0]))
+    return loops * (len(rhythm) - 1) + int(np.count_nonzero(rhythm[:-1] - rhythm[0] < remainder))
+
+
+def chunk_sizes(num_notes, chunk_notes=STREAM_CHUNK_NOTES):
+    """Split num_notes into chunks of at most chunk_notes"""
+    for start in range(0, num_notes, chunk_notes):
+        yield min(chunk_notes, num_notes - start)
+
+
+def stream_to_events(pitch_chunks, rhythm_data):
+    """
+    Used for turning pitch chunks from a streaming generator (arrays shaped
+    notes x voices) into event arrays, with the rhythm repeated as long as needed
+    """
+    start = 0
+    for pitches in pitch_chunks:
+        pitches = np.asarray(pitches)
+        note_on_timing, note_off_timing = loop_rhythm(rhythm_data, start, len(pitches))
+        if len(pitches) and note_off_timing[-1] > np.iinfo(EVENT_DTYPE['tick']).max:
+            raise ValueError('Piece is too long for MIDI tick timing')
+        start += len(pitches)
+        yield interleave_voices([notes_to_events(pitches[:, voice], note_on_timing, note_off_timing)
+                                 for voice in range(pitches.shape[1])])
+
+
+def stream_to_midi(pitch_chunks, rhythm_data, num_notes, num_voices):
+    """
+    Used for encoding a streaming generator's output as MIDI file bytes, one
+    chunk at a time, so pieces of any length are sent in constant memory.
+    The track length is measured first from the rhythm alone (event sizes
+    don't depend on pitch), then the real pitch chunks are encoded.
+
+    Returns:
+        tuple: (total file size in bytes, iterator of bytes)
+    """
+    placeholder = (np.zeros((count, num_voices), dtype=np.int64) for count in chunk_sizes(num_notes))
+    track_length = measure_track(stream_to_events(placeholder, rhythm_data))
+    file_size = 22 + track_length  # MThd chunk (14) + MTrk chunk header (8)
+    return file_size, iter_file(stream_to_events(pitch_chunks, rhythm_data), track_length)
+
+
 def data_to_midi(pitch_data, note_on_timing, note_off_timing):
     """Used for pitch and note on off data into midi notes"""
     # This is how the midi data needs to be formatted for each note
@@ -122,26 +184,29 @@ def data_to_midi(pitch_data, note_on_timing, note_off_timing):
     return midi_notes_join
 
 
+def data_to_events(pitch_data, note_on_timing, note_off_timing):
+    """Used for pitch and note on off data into a compact note event array (see events.py)"""
+    # Same on/off ordering as data_to_midi, packed at 8 bytes per event for the SMF encoder
+    with stage('events'):
+        return notes_to_events(pitch_data, note_on_timing, note_off_timing)
+
+
 def normal_choice(lst, mean=None, stddev=None):
-    """Choose an item from a list using normal distribution"""
-    if mean is None:
-        # if mean is not specified, use center of list
-        mean = (len(lst) - 1) / 2
- 
-    if stddev is None:
-        # if stddev is not specified, let list be -3 .. +3 standard deviations
-        stddev = len(lst) / 6
- 
-    while True:
-        index = int(normalvariate(mean, stddev) + 0.5)
-        if 0 <= index < len(lst):
-            return lst[index]
-
-
-def create_file(midi_notes, filepath):
     """
-    Used for packaging up midi notes into actual midi files
-    Adding the proper midi meta data so that music software can read this file
+    Choose an item from a list using normal distribution
+    
+    mean defaults to the center of the list and stddev to len / 6 (the list
+    spans -3 .. +3 standard deviations). Draws come from a cached alias table
+    of the normal distribution clipped to the list (see sampling.py), so a
+    narrow or off-center distribution costs the same as any other.
+    """
+    return lst[normal_table(len(lst), mean, stddev).draw()]
+
+
+def csv_to_bytes(midi_notes):
+    """
+    Encode CSV midi notes from data_to_midi through py_midicsv
+    This is the original (slow) path, kept for legacy callers and for comparison
     """
     TOP_META = ['0, 0, Header, 0, 1, 96\n', '1, 0, Start_track\n', '1, 0, Title_t, "\\000"\n', '1, 0, Time_signature, 4, 2, 36, 8\n', '1, 0, Time_signature, 4, 2, 36, 8\n']
     END_META = ['1, 384, End_track\n', '0, 0, End_of_file']
@@ -150,9 +215,60 @@ def create_file(midi_notes, filepath):
     # Creating the actual midi file
     midi_object = py_midicsv.csv_to_midi(ready_for_midi)
 
-    with open(filepath, "wb") as output_file:
-        midi_writer = py_midicsv.FileWriter(output_file)
-        midi_writer.write(midi_object)
+    output_file = io.BytesIO()
+    midi_writer = py_midicsv.FileWriter(output_file)
+    midi_writer.write(midi_object)
+    return output_file.getvalue()
+
+
+def batch_to_midi(pitches, rhythm_data):
+    """
+    Used for turning a batch of pitch data (variations x notes x voices) that
+    shares one rhythm into a list of midi file contents
+    """
+    pitches = np.asarray(pitches)
+    num_variations, num_notes, num_voices = pitches.shape
+    note_on_timing, note_off_timing = rhythm_to_on_off(rhythm_data)
+    num_notes = min(num_notes, len(note_on_timing), len(note_off_timing))
+    pitches = pitches[:, :num_notes, :]
+
+    # One event layout for every variation; voices interleave like the chord generators
+    placeholder = [0] * num_notes
+    template = interleave_voices([notes_to_events(placeholder, note_on_timing, note_off_timing)] * num_voices)
+
+    # For each note, every voice turns on and then every voice turns off
+    pitch_bytes = np.concatenate([pitches, pitches], axis=2).reshape(num_variations, -1)
+    return encode_batch(template, pitch_bytes)
+
+
+def create_file(midi_notes, filepath, midi_format=0):
+    """
+    Used for packaging up midi notes into actual midi files
+    Adding the proper midi meta data so that music software can read this file
+
+    Accepts an event array from data_to_events (encoded directly by the SMF writer)
+    or CSV strings from data_to_midi (encoded through py_midicsv).
+    With midi_format=1, midi_notes is a list of event arrays, one track each.
+    filepath can also be a binary file object (e.g. io.BytesIO) to skip the disk.
+    """
+    if midi_format not in (0, 1):
+        raise ValueError(f"Unsupported MIDI format: {midi_format}")
+    
+    with stage('encode'):
+        if midi_format == 1:
+            # Format 1 is newer than the original template, so its tracks end after their notes
+            midi_bytes = encode_multitrack_file(midi_notes, legacy_end=False)
+        elif len(midi_notes) and isinstance(midi_notes[0], str):
+            midi_bytes = csv_to_bytes(midi_notes)
+        else:
+            midi_bytes = encode_file(midi_notes)
+
+    with stage('write'):
+        if hasattr(filepath, 'write'):
+            filepath.write(midi_bytes)
+            return filepath
+
+        with open(filepath, "wb") as output_file:
+            output_file.write(midi_bytes)
     
     return filepath
-
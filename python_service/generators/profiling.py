@@ -0,0 +1,40 @@
+"""
+Stage Profiling - Lightweight per-stage timers for the generation hot path
+Stages only cost a context-variable lookup unless a caller is collecting them
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+
+# Stage name -> seconds for the request currently being profiled (None when nobody is collecting)
+_stage_timings = contextvars.ContextVar('stage_timings', default=None)
+
+
+@contextmanager
+def stage(name):
+    """Time a block of work under a stage name (e.g. 'sampling', 'encode')"""
+    timings = _stage_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def start_collecting():
+    """
+    Start collecting stage timings in the current context
+
+    Returns:
+        tuple: (dict that stage() will fill in, token for stop_collecting)
+    """
+    timings = {}
+    return timings, _stage_timings.set(timings)
+
+
+def stop_collecting(token):
+    """Stop collecting stage timings started with start_collecting"""
+    _stage_timings.reset(token)
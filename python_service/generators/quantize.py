@@ -0,0 +1,121 @@
+"""
+Scale Quantizer
+Snaps MIDI notes to any key and mode using precomputed 128-entry lookup tables
+"""
+from functools import lru_cache
+import numpy as np
+
+DEFAULT_KEY = 'C_MAJOR'
+
+# Pitch class of each tonic name (sharps and flats)
+NOTE_NAMES = {
+    'C': 0, 'B#': 0, 'C#': 1, 'DB': 1, 'D': 2, 'D#': 3, 'EB': 3, 'E': 4, 'FB': 4,
+    'F': 5, 'E#': 5, 'F#': 6, 'GB': 6, 'G': 7, 'G#': 8, 'AB': 8, 'A': 9,
+    'A#': 10, 'BB': 10, 'B': 11, 'CB': 11
+}
+
+# Semitones above the tonic for each mode
+MODES = {
+    'major': (0, 2, 4, 5, 7, 9, 11),
+    'minor': (0, 2, 3, 5, 7, 8, 10),
+    'dorian': (0, 2, 3, 5, 7, 9, 10),
+    'phrygian': (0, 1, 3, 5, 7, 8, 10),
+    'lydian': (0, 2, 4, 6, 7, 9, 11),
+    'mixolydian': (0, 2, 4, 5, 7, 9, 10),
+    'locrian': (0, 1, 3, 5, 6, 8, 10),
+    'harmonic_minor': (0, 2, 3, 5, 7, 8, 11),
+    'melodic_minor': (0, 2, 3, 5, 7, 9, 11),
+    'major_pentatonic': (0, 2, 4, 7, 9),
+    'minor_pentatonic': (0, 3, 5, 7, 10),
+    'blues': (0, 3, 5, 6, 7, 10),
+    'chromatic': tuple(range(12)),
+}
+MODES['ionian'] = MODES['major']
+MODES['aeolian'] = MODES['minor']
+
+# Snapping policies: nearest scale note (ties go up), next one up, next one down
+POLICIES = ('nearest', 'up', 'down')
+
+
+def parse_key(key):
+    """
+    Split a key name like 'C_MAJOR', 'F# dorian' or 'Bb_harmonic_minor'
+
+    Returns:
+        tuple: (tonic pitch class, mode name)
+    """
+    parts = key.replace(' ', '_').split('_', 1)
+    tonic = parts[0].upper()
+    mode = parts[1].lower() if len(parts) > 1 else 'major'
+    if tonic not in NOTE_NAMES:
+        raise ValueError(f"Unknown key tonic: {parts[0]}")
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode: {mode}")
+    return NOTE_NAMES[tonic], mode
+
+
+@lru_cache(maxsize=None)
+def _build_table(tonic, mode, policy):
+    """Lookup table (and a tuple copy for plain Python access) for one key/mode/policy"""
+    pitches = np.arange(128)
+    members = pitches[np.isin((pitches - tonic) % 12, MODES[mode])]
+    last = len(members) - 1
+
+    above = np.searchsorted(members, pitches, side='left')
+    below = np.searchsorted(members, pitches, side='right') - 1
+
+    # Past either end of the keyboard, snap the other way instead
+    up = np.where(above <= last, members[np.minimum(above, last)], members[last])
+    down = np.where(below >= 0, members[np.maximum(below, 0)], members[0])
+
+    if policy == 'up':
+        table = up
+    elif policy == 'down':
+        table = down
+    else:
+        table = np.where(up - pitches <= pitches - down, up, down)
+
+    table = table.astype(np.int16)
+    table.setflags(write=False)
+    return table, tuple(table.tolist())
+
+
+def get_table(key=DEFAULT_KEY, policy='up'):
+    """Return the 128-entry NumPy lookup table for a key name and policy"""
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown quantize policy: {policy}")
+    tonic, mode = parse_key(key)
+    return _build_table(tonic, mode, policy)[0]
+
+
+def quantize(notes, key=DEFAULT_KEY, policy='up'):
+    """
+    Snap notes to a key
+
+    Notes outside the MIDI range (0-127) are clamped into it first.
+
+    Args:
+        notes: A single MIDI note, a list of notes, or a NumPy array of any shape
+        key (str): Key name such as 'C_MAJOR' or 'A_MINOR'
+        policy (str): 'nearest', 'up' or 'down'
+
+    Returns:
+        Quantized notes of the same kind (int, list or array)
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown quantize policy: {policy}")
+    tonic, mode = parse_key(key)
+    table, table_tuple = _build_table(tonic, mode, policy)
+
+    if isinstance(notes, np.ndarray):
+        return table[np.clip(notes, 0, 127)]
+    if isinstance(notes, (list, tuple)):
+        return [table_tuple[min(max(note, 0), 127)] for note in notes]
+    return table_tuple[min(max(notes, 0), 127)]
+
+
+def scale_notes(key=DEFAULT_KEY, low=0, high=127):
+    """List the MIDI notes of a key between low and high (inclusive)"""
+    tonic, mode = parse_key(key)
+    intervals = MODES[mode]
+    return [note for note in range(max(low, 0), min(high, 127) + 1) if (note - tonic) % 12 in intervals]
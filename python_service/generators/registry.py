@@ -0,0 +1,243 @@
+"""
+Generator Registry
+Every generation style as data: the voices it writes, each a transform of
+the bassline or of an earlier voice, run by one shared pipeline
+
+For each piece the pipeline draws one bassline, and turns the rhythm into
+note on/off timing and an event skeleton (ticks, event types, velocities)
+once. Each voice then only costs its pitch transform and a copy of the
+skeleton with its pitches filled in. The same voice specs drive the eager
+(one file), batch (many variations) and stream (chunked) generators, and
+the service builds its /api/generate/<name> endpoints, batch job types and
+stream types from STYLES.
+
+Adding a style is one register_style call, for example:
+    register_style(Style('power-chords', 'power_chords', (
+        Voice('root', 'bass', shift(12)),
+        Voice('fifth', 'root', shift(7)),
+    )))
+"""
+import random
+from collections import namedtuple
+import numpy as np
+from .midi_tools import create_file, rhythm_to_on_off, chunk_sizes, STREAM_CHUNK_NOTES
+from .events import notes_to_events, fill_pitches, merge_voices
+from .quantize import quantize, scale_notes, DEFAULT_KEY
+from .profiling import stage
+from .sampling import as_distribution, choices, choose_notes, numpy_rng
+
+# MIDI numbers of the possible bass notes (c major scale, E1-D2)
+C_MAJOR = [40, 41, 43, 45, 47, 48, 50]
+
+# Timing of the notes on and off (12 whole notes, 6 half notes, 4 quarter notes)
+RHYTHM_DATA = [0, 384, 768, 1152, 1536, 1920, 2304, 2688, 3072, 3456, 3840, 4224, 4608, 4800, 4992, 5184, 5376, 5568, 5760, 5856, 5952, 6048, 6144, 6240]
+
+# Bass range (E1-D2) used to build the default scale of other keys
+BASS_LOW = 40
+BASS_HIGH = 50
+
+# One voice of a style: its name, the voice it is built from ('bass' for the
+# bassline) and transform(pitches, key, intervals) giving its pitches (None
+# copies the source). intervals(low, high, shape) draws random semitone steps.
+Voice = namedtuple('Voice', ['name', 'source', 'transform'])
+
+# A generation style: its name (job type and /api/generate/<name>), default
+# filename prefix, voices (in the order they are written), the number of
+# notes drawn per piece (None for one per rhythm step) and its generator,
+# batch and stream functions (made by register_style when not given)
+Style = namedtuple('Style', ['name', 'prefix', 'voices', 'notes', 'generator', 'batch', 'stream'],
+                   defaults=(None, None, None, None))
+
+# Registered styles by name, in registration order
+STYLES = {}
+
+# Names of the service's own /api/generate/<name> routes, which no style may take
+RESERVED_NAMES = ('stream', 'batch')
+
+
+def default_scale(key=None):
+    """Bass notes (E1-D2) of a key such as 'A_MINOR', or C_MAJOR if no key is given"""
+    if key is None:
+        return C_MAJOR
+    return scale_notes(key, BASS_LOW, BASS_HIGH)
+
+
+def shift(semitones):
+    """Voice transform: the source moved by semitones"""
+    return lambda pitches, key, intervals: pitches + semitones
+
+
+def stack(semitones):
+    """Voice transform: the source plus semitones, fitted to the key"""
+    return lambda pitches, key, intervals: quantize(pitches + semitones, key)
+
+
+def random_stack(low, high):
+    """Voice transform: the source plus a random low-high semitones per note, fitted to the key"""
+    return lambda pitches, key, intervals: quantize(pitches + intervals(low, high, pitches.shape), key)
+
+
+def _python_intervals(rng):
+    """Interval draws from a random.Random, one rng.choice per note like the original generators"""
+    def intervals(low, high, shape):
+        steps = range(low, high + 1)
+        return np.array([rng.choice(steps) for _ in range(int(np.prod(shape)))], dtype=np.int64).reshape(shape)
+    return intervals
+
+
+def _numpy_intervals(rng):
+    """Interval draws from a numpy.random.Generator"""
+    return lambda low, high, shape: rng.integers(low, high + 1, size=shape)
+
+
+def voice_pitches(style, bass, key, intervals):
+    """Each voice's pitches (arrays shaped like bass), in the style's voice order"""
+    pitches = {'bass': np.asarray(bass, dtype=np.int64)}
+    for voice in style.voices:
+        source = pitches[voice.source]
+        pitches[voice.name] = source if voice.transform is None else voice.transform(source, key, intervals)
+    return [pitches[voice.name] for voice in style.voices]
+
+
+def style_voices(style, bass, key=DEFAULT_KEY, rng=None):
+    """
+    A style's voices over bass notes (an array of any shape), stacked on a new last axis
+
+    Args:
+        style: Registered Style
+        bass: Bass notes
+        key: Key name to fit harmonies to
+        rng: Optional numpy.random.Generator for random intervals
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    return np.stack(voice_pitches(style, bass, key, _numpy_intervals(rng)), axis=-1)
+
+
+def _defaults(scale, rhythm, key):
+    if key is None:
+        key = DEFAULT_KEY
+    if scale is None:
+        scale = default_scale(key)
+    if rhythm is None:
+        rhythm = RHYTHM_DATA
+    return scale, rhythm, key
+
+
+def generate_file(style, output_path, scale=None, rhythm=None, seed=None, key=None, midi_format=0,
+                  distribution=None):
+    """
+    Generate one MIDI file of a style (see the style's generator for the arguments)
+
+    Returns:
+        The path or file object that was written to
+    """
+    scale, rhythm, key = _defaults(scale, rhythm, key)
+    distribution = as_distribution(distribution, len(scale))
+    rng = random.Random(seed)
+
+    with stage('sampling'):
+        bass = choices(scale, distribution, rng, style.notes or len(rhythm) - 1)
+
+    with stage('harmony'):
+        voices = voice_pitches(style, bass, key, _python_intervals(rng))
+
+    # One timing and event skeleton for every voice
+    note_on_timing, note_off_timing = rhythm_to_on_off(rhythm)
+    with stage('events'):
+        skeleton = notes_to_events(np.zeros(len(bass), dtype=np.int64), note_on_timing, note_off_timing)
+        tracks = [fill_pitches(skeleton, pitches) for pitches in voices]
+
+    # Merge all voices into one MIDI sequence (or keep one track per voice for format 1)
+    if midi_format == 1:
+        return create_file(tracks, output_path, midi_format=1)
+    return create_file(merge_voices(tracks) if len(tracks) > 1 else tracks[0], output_path,
+                       midi_format=midi_format)
+
+
+def generate_batch(style, n, scale=None, rhythm=None, seed=None, key=None, distribution=None):
+    """
+    Generate many variations of a style at once with NumPy
+
+    Returns:
+        numpy.ndarray: Pitch data shaped (variations, notes, voices), ready for batch_to_midi
+    """
+    scale, rhythm, key = _defaults(scale, rhythm, key)
+    distribution = as_distribution(distribution, len(scale))
+    rng = numpy_rng(seed)
+    num_notes = len(rhythm) - 1 if style.notes is None else min(style.notes, len(rhythm) - 1)
+
+    bass, _ = choose_notes(scale, distribution, rng, (n, num_notes))
+    return style_voices(style, bass, key, rng)
+
+
+def generate_stream(style, num_notes, scale=None, seed=None, key=None, chunk_notes=STREAM_CHUNK_NOTES,
+                    distribution=None):
+    """
+    Generate a piece of a style of any length lazily, chunk_notes notes at a time
+
+    The arguments are checked and the generator seeded here, before the first
+    chunk is asked for, so bad input raises before a response starts streaming.
+
+    Returns:
+        iterator of numpy.ndarray: Pitch data shaped (notes, voices), ready for stream_to_midi
+    """
+    scale, _, key = _defaults(scale, None, key)
+    distribution = as_distribution(distribution, len(scale))
+    rng = numpy_rng(seed)
+    return _stream_chunks(style, num_notes, scale, key, chunk_notes, distribution, rng)
+
+
+def _stream_chunks(style, num_notes, scale, key, chunk_notes, distribution, rng):
+    # A Markov chain carries on from the last note of the previous chunk
+    state = None
+    for count in chunk_sizes(num_notes, chunk_notes):
+        bass, state = choose_notes(scale, distribution, rng, count, state)
+        yield style_voices(style, bass, key, rng)
+
+
+def register_style(style):
+    """
+    Add a style to STYLES
+
+    Missing generator, batch and stream functions are made from the voice
+    specs. A made generator is named generate_<prefix>, which is part of the
+    cache keys of its seeded results.
+
+    Returns:
+        Style: The registered style, with its functions
+
+    Raises:
+        ValueError: If the name is taken or reserved, or a voice is built from an unknown voice
+    """
+    if style.name in STYLES:
+        raise ValueError(f"Style already registered: {style.name}")
+    if style.name in RESERVED_NAMES:
+        raise ValueError(f"Style name is reserved: {style.name}")
+    if not style.voices:
+        raise ValueError(f"Style {style.name} has no voices")
+    known = {'bass'}
+    for voice in style.voices:
+        if voice.source not in known:
+            raise ValueError(f"Voice {voice.name} of {style.name} is built from unknown voice {voice.source}")
+        known.add(voice.name)
+
+    name = style.name
+    functions = {}
+    if style.generator is None:
+        def generator(output_path, scale=None, rhythm=None, seed=None, key=None, midi_format=0, distribution=None):
+            return generate_file(STYLES[name], output_path, scale, rhythm, seed, key, midi_format, distribution)
+        generator.__name__ = generator.__qualname__ = f'generate_{style.prefix}'
+        functions['generator'] = generator
+    if style.batch is None:
+        def batch(n, scale=None, rhythm=None, seed=None, key=None, distribution=None):
+            return generate_batch(STYLES[name], n, scale, rhythm, seed, key, distribution)
+        functions['batch'] = batch
+    if style.stream is None:
+        def stream(num_notes, scale=None, seed=None, key=None, chunk_notes=STREAM_CHUNK_NOTES, distribution=None):
+            return generate_stream(STYLES[name], num_notes, scale, seed, key, chunk_notes, distribution)
+        functions['stream'] = stream
+
+    style = style._replace(**functions)
+    STYLES[name] = style
+    return style
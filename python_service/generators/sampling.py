@@ -0,0 +1,271 @@
+"""
+Sampling - Weighted note choice with Walker alias tables
+Draws scale degrees from any discrete distribution in O(1) per note
+
+An alias table splits n weighted outcomes into n equal columns, each holding
+at most two outcomes: column i keeps outcome i with probability prob[i] and
+otherwise gives alias[i]. A draw is one uniform column and one uniform
+number, with no loop and no rejection. Tables are built once per
+distribution (Vose's method, O(n)) and cached, and draws for a whole piece
+are made in one NumPy call.
+
+Distributions come from requests in one of these forms:
+    [4, 1, 2, 1, 3, 1, 1]                      weight per scale degree
+    "uniform" or "normal"                      named, over the scale degrees
+    {"type": "normal", "mean": 2, "stddev": 1} normal with its centre and spread in degrees
+    {"type": "markov", "matrix": [[...], ...], "initial": [...]}
+                                               row i weights the degree after degree i
+"""
+import math
+import random
+import hashlib
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
+
+# Largest scale a distribution can be given for (a Markov matrix is size x size)
+MAX_DEGREES = 128
+
+# A parsed distribution: kind is 'weights' (weights is a tuple) or 'markov'
+# (weights is a tuple of row tuples, initial the starting weights)
+Distribution = namedtuple('Distribution', ['kind', 'weights', 'initial'])
+
+
+class AliasTable:
+    """Walker alias table for one discrete distribution over 0 .. n-1"""
+
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.ndim != 1 or not len(weights) or not np.all(np.isfinite(weights)) or \
+                np.any(weights < 0) or weights.sum() <= 0:
+            raise ValueError('weights must be non-negative numbers with a positive total')
+        n = len(weights)
+        scaled = weights * (n / weights.sum())
+        prob = np.ones(n)
+        alias = np.arange(n)
+
+        # Vose: pair each under-full column with an over-full outcome that tops it up
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            prob[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+
+        self.size = n
+        self.prob = prob
+        self.alias = alias
+        # Plain lists for single draws, which are faster than NumPy scalars
+        self._prob = prob.tolist()
+        self._alias = alias.tolist()
+
+    def sample(self, rng, size):
+        """Draw indices shaped size with a numpy.random.Generator"""
+        columns = rng.integers(0, self.size, size=size)
+        return np.where(rng.random(size) < self.prob[columns], columns, self.alias[columns])
+
+    def draw(self, rng=random):
+        """Draw a single index with a random.Random (or the random module)"""
+        position = rng.random() * self.size
+        column = int(position)
+        return column if position - column < self._prob[column] else self._alias[column]
+
+
+class MarkovTable:
+    """One alias table per row of a transition matrix, plus one for the first note"""
+
+    def __init__(self, matrix, initial=None):
+        self.rows = [AliasTable(row) for row in matrix]
+        self.size = len(self.rows)
+        self.prob = np.stack([row.prob for row in self.rows])
+        self.alias = np.stack([row.alias for row in self.rows])
+        self.initial = AliasTable(initial if initial is not None else [1.0] * self.size)
+
+    def sample(self, rng, size, state=None):
+        """
+        Draw a chain of indices shaped size (variations share nothing but the table)
+
+        Args:
+            rng: numpy.random.Generator
+            size: Number of notes, or (variations, notes)
+            state: Optional previous index (or one per variation) to continue from
+
+        Returns:
+            tuple: (indices, last index of each chain)
+        """
+        shape = (size,) if isinstance(size, int) else tuple(size)
+        columns = rng.integers(0, self.size, size=shape)
+        uniforms = rng.random(shape)
+        if state is None:
+            state = self.initial.sample(rng, shape[:-1])
+        out = np.empty(shape, dtype=np.int64)
+
+        # Each step depends on the last, so walk the notes; one step is two list lookups
+        if len(shape) == 1:
+            current = int(state)
+            probs, aliases = [row._prob for row in self.rows], [row._alias for row in self.rows]
+            for index, (column, uniform) in enumerate(zip(columns.tolist(), uniforms.tolist())):
+                current = column if uniform < probs[current][column] else aliases[current][column]
+                out[index] = current
+            return out, current
+
+        # Several variations: one vectorized step per note across all of them
+        current = np.asarray(state)
+        for index in range(shape[-1]):
+            column = columns[..., index]
+            current = np.where(uniforms[..., index] < self.prob[current, column], column, self.alias[current, column])
+            out[..., index] = current
+        return out, current
+
+
+def normal_weights(size, mean=None, stddev=None):
+    """
+    Probability of each index when a normal draw is rounded to the nearest
+    index and retried until it lands in range (what normal_choice does)
+    """
+    if mean is None:
+        mean = (size - 1) / 2
+    if stddev is None:
+        stddev = size / 6
+    if not stddev > 0:
+        raise ValueError('stddev must be positive')
+    # Draws round with int(x + 0.5), which truncates toward zero: index 0 also takes (-1.5, -0.5)
+    edges = np.arange(size + 1) - 0.5
+    edges[0] = -1.5
+    edges = (edges - mean) / (stddev * math.sqrt(2))
+    cdf = 0.5 * (1 + np.array([math.erf(edge) for edge in edges]))
+    weights = np.diff(cdf)
+    if weights.sum() <= 0:
+        raise ValueError('normal distribution has no weight inside the scale')
+    return weights
+
+
+def _weights(values, size, name):
+    """Check a list of weights is size long and return it as a tuple of floats"""
+    if not isinstance(values, list) or len(values) != size or \
+            not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+        raise ValueError(f'{name} must be a list of {size} numbers (one per scale degree)')
+    return tuple(float(value) for value in values)
+
+
+def parse_distribution(spec, size):
+    """
+    Turn a request's distribution (see the module docstring) into a hashable
+    Distribution for a scale of size notes
+
+    Raises:
+        ValueError: If the spec is malformed or doesn't fit the scale
+    """
+    if not 0 < size <= MAX_DEGREES:
+        raise ValueError(f'Distributions need a scale of 1 to {MAX_DEGREES} notes')
+    if isinstance(spec, list):
+        distribution = Distribution('weights', _weights(spec, size, 'distribution'), None)
+        get_table(distribution)  # weights must be non-negative with a positive total
+        return distribution
+    if isinstance(spec, str):
+        spec = {'type': spec}
+    if not isinstance(spec, dict):
+        raise ValueError('distribution must be a list of weights, a name or an object')
+
+    kind = spec.get('type')
+    if kind == 'uniform':
+        return Distribution('weights', (1.0,) * size, None)
+    if kind == 'normal':
+        mean, stddev = spec.get('mean'), spec.get('stddev')
+        for value in (mean, stddev):
+            if value is not None and (not isinstance(value, (int, float)) or isinstance(value, bool)):
+                raise ValueError('mean and stddev must be numbers')
+        return Distribution('weights', tuple(normal_weights(size, mean, stddev).tolist()), None)
+    if kind == 'markov':
+        matrix = spec.get('matrix')
+        if not isinstance(matrix, list) or len(matrix) != size:
+            raise ValueError(f'markov matrix must have {size} rows (one per scale degree)')
+        rows = tuple(_weights(row, size, 'Each markov matrix row') for row in matrix)
+        initial = spec.get('initial')
+        initial = _weights(initial, size, 'markov initial') if initial is not None else None
+        distribution = Distribution('markov', rows, initial)
+        get_table(distribution)  # every row needs a positive total
+        return distribution
+    raise ValueError(f'Unknown distribution: {kind}')
+
+
+@lru_cache(maxsize=256)
+def get_table(distribution):
+    """Alias table(s) for a parsed Distribution (built once, then cached)"""
+    if distribution.kind == 'markov':
+        return MarkovTable(distribution.weights, distribution.initial)
+    return AliasTable(distribution.weights)
+
+
+@lru_cache(maxsize=256)
+def normal_table(size, mean=None, stddev=None):
+    """Cached alias table for normal_weights"""
+    return AliasTable(normal_weights(size, mean, stddev))
+
+
+def sample_degrees(distribution, rng, size, state=None):
+    """
+    Draw scale degree indices for a parsed Distribution
+
+    Args:
+        distribution: Distribution from parse_distribution
+        rng: numpy.random.Generator
+        size: Number of notes, or (variations, notes)
+        state: Optional last degree of a Markov chain to continue from
+
+    Returns:
+        tuple: (indices, state to pass to the next call)
+    """
+    table = get_table(distribution)
+    if distribution.kind == 'markov':
+        return table.sample(rng, size, state)
+    return table.sample(rng, size), None
+
+
+def as_distribution(spec, size):
+    """None, a parsed Distribution, or parse_distribution(spec, size)"""
+    if spec is None or isinstance(spec, Distribution):
+        return spec
+    return parse_distribution(spec, size)
+
+
+def choose_notes(scale, distribution, rng, size, state=None):
+    """
+    Draw scale notes with a numpy.random.Generator
+
+    Without a distribution every note is equally likely (the generators'
+    original uniform draw, so their output is unchanged).
+
+    Returns:
+        tuple: (notes array shaped size, state to pass to the next call)
+    """
+    scale = np.asarray(scale)
+    if distribution is None:
+        return scale[rng.integers(0, len(scale), size=size)], None
+    indices, state = sample_degrees(distribution, rng, size, state)
+    return scale[indices], state
+
+
+def numpy_rng(seed=None):
+    """
+    NumPy generator for a request seed. Non-negative integers seed it directly
+    (as before); strings and negative integers, which random.Random accepts
+    but NumPy doesn't, seed it from a SHA-256 of str(seed).
+    """
+    if seed is not None and not (isinstance(seed, int) and not isinstance(seed, bool) and seed >= 0):
+        seed = int.from_bytes(hashlib.sha256(str(seed).encode('utf-8')).digest()[:8], 'big')
+    return np.random.default_rng(seed)
+
+
+def choices(scale, distribution, rng, k):
+    """
+    Like random.Random.choices(scale, k=k), but drawn from a Distribution.
+    The NumPy generator is seeded from rng, so seeded requests stay reproducible.
+    """
+    if distribution is None:
+        return rng.choices(scale, k=k)
+    generator = np.random.default_rng(rng.getrandbits(64))
+    notes, _ = choose_notes(scale, distribution, generator, k)
+    return notes.tolist()
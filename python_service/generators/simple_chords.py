@@ -1,13 +1,22 @@
 """
 Simple Chord Generator
-Generates traditional triad chord progressions in C major
+Generates traditional triad chord progressions in any key (C major by default)
 """
-import random
-import copy
-from .midi_tools import data_to_midi, create_file, fit_to_c_major, rhythm_to_on_off
+from .midi_tools import STREAM_CHUNK_NOTES
+from .quantize import DEFAULT_KEY
+from .registry import Style, Voice, register_style, shift, stack, style_voices
+from .registry import generate_file, generate_batch, generate_stream
 
+# Root (bass up an octave), third and fifth (each 3 semitones up, fit to key), and the root an octave up
+SIMPLE_CHORD_VOICES = (
+    Voice('root', 'bass', shift(12)),
+    Voice('third', 'root', stack(3)),
+    Voice('fifth', 'third', stack(3)),
+    Voice('octave', 'root', shift(12)),
+)
 
-def generate_simple_chords(output_path, scale=None, rhythm=None):
+
+def generate_simple_chords(output_path, scale=None, rhythm=None, seed=None, key=None, midi_format=0, distribution=None):
     """
     Generate simple triad chord progression
     
@@ -15,58 +24,72 @@ def generate_simple_chords(output_path, scale=None, rhythm=None):
     Perfect for clean, classic harmonies.
     
     Args:
-        output_path: Full path where to save .mid file
-        scale: Optional list of MIDI note numbers for bass notes (defaults to C major)
+        output_path: Full path where to save .mid file, or a binary file object
+        scale: Optional list of MIDI note numbers for bass notes (defaults to the key's E1-D2 notes)
         rhythm: Optional list of timing values (defaults to varied rhythm pattern)
+        seed: Optional seed for reproducible output
+        key: Optional key name such as 'A_MINOR' to harmonize in (defaults to C major)
+        midi_format: Optional 0 for one merged track (default) or 1 for one track per voice
+        distribution: Optional weighting of the bass notes, see sampling.py (defaults to uniform)
     
     Returns:
-        str: Path to generated file
+        str: Path to generated file (or the file object that was written to)
     """
-    # Default to C major scale (E1-D2) if not provided
-    if scale is None:
-        scale = [40, 41, 43, 45, 47, 48, 50]
-    
-    # Default rhythm: 12 whole notes, 6 half notes, 4 quarter notes
-    if rhythm is None:
-        rhythm = [0, 384, 768, 1152, 1536, 1920, 2304, 2688, 3072, 3456, 3840, 4224, 
-                 4608, 4800, 4992, 5184, 5376, 5568, 5760, 5856, 5952, 6048, 6144, 6240]
-    
-    # Generate random bassline from scale
-    num_notes = len(rhythm) - 1
-    bass = random.choices(scale, k=num_notes)
-    
-    # Create root notes (bass transposed up an octave)
-    roots_raw = copy.deepcopy(bass)
-    roots = [x + 12 for x in roots_raw]
-    
-    # Create thirds (root + 3 semitones, fit to C major)
-    harmony1_raw = copy.deepcopy(roots)
-    harmony1_raw = [x + 3 for x in harmony1_raw]
-    harmony1 = fit_to_c_major(harmony1_raw)
-    
-    # Create fifths (third + 3 semitones, fit to C major)
-    harmony2_raw = copy.deepcopy(harmony1)
-    harmony2_raw = [x + 3 for x in harmony2_raw]
-    harmony2 = fit_to_c_major(harmony2_raw)
-    
-    # Create octave (root + 12 semitones)
-    roots_octave_raw = copy.deepcopy(roots)
-    roots_octave = [x + 12 for x in roots_octave_raw]
+    return generate_file(SIMPLE_CHORDS, output_path, scale, rhythm, seed, key, midi_format, distribution)
+
+
+def simple_chord_voices(bass, key=DEFAULT_KEY):
+    """
+    Triad voices over bass notes (an array of any shape): the root (bass up an
+    octave), third and fifth fitted to key, and the root an octave up, stacked
+    on a new last axis
+    """
+    return style_voices(SIMPLE_CHORDS, bass, key)
+
+
+def generate_simple_chords_batch(n, scale=None, rhythm=None, seed=None, key=None, distribution=None):
+    """
+    Generate many simple triad chord progressions at once with NumPy
     
-    # Create note on/off timing
-    note_on_timing, note_off_timing = rhythm_to_on_off(rhythm)
+    Args:
+        n: Number of variations
+        scale: Optional list of MIDI note numbers for bass notes (defaults to the key's E1-D2 notes)
+        rhythm: Optional list of timing values (defaults to varied rhythm pattern)
+        seed: Optional seed for reproducible output
+        key: Optional key name such as 'A_MINOR' to harmonize in (defaults to C major)
+        distribution: Optional weighting of the bass notes, see sampling.py (defaults to uniform)
     
-    # Convert pitch and rhythm data to MIDI
-    roots_midi_notes = data_to_midi(roots, note_on_timing, note_off_timing)
-    harmony1_midi_notes = data_to_midi(harmony1, note_on_timing, note_off_timing)
-    harmony2_midi_notes = data_to_midi(harmony2, note_on_timing, note_off_timing)
-    roots_octave_midi_notes = data_to_midi(roots_octave, note_on_timing, note_off_timing)
+    Returns:
+        numpy.ndarray: Pitch data shaped (variations, notes, 4), ready for batch_to_midi
+    """
+    # Random basslines for every variation, then each voice as a whole-array op
+    return generate_batch(SIMPLE_CHORDS, n, scale, rhythm, seed, key, distribution)
+
+
+def generate_simple_chords_stream(num_notes, scale=None, seed=None, key=None, chunk_notes=STREAM_CHUNK_NOTES,
+                                  distribution=None):
+    """
+    Generate a simple triad chord progression of any length lazily, chunk_notes notes at a time
     
-    # Combine all voices into one MIDI sequence
-    chords = map(list, zip(roots_midi_notes, harmony1_midi_notes, 
-                          harmony2_midi_notes, roots_octave_midi_notes))
-    chords = [item for lst in chords for item in lst]
+    Args:
+        num_notes: Total number of notes (chords)
+        scale: Optional list of MIDI note numbers for bass notes (defaults to the key's E1-D2 notes)
+        seed: Optional seed for reproducible output
+        key: Optional key name such as 'A_MINOR' to harmonize in (defaults to C major)
+        chunk_notes: Optional number of notes per chunk
+        distribution: Optional weighting of the bass notes, see sampling.py (defaults to uniform)
     
-    # Create MIDI file
-    return create_file(chords, output_path)
+    Yields:
+        numpy.ndarray: Pitch data shaped (notes, 4), ready for stream_to_midi
+    """
+    return generate_stream(SIMPLE_CHORDS, num_notes, scale, seed, key, chunk_notes, distribution)
+
 
+SIMPLE_CHORDS = register_style(Style(
+    name='simple-chords',
+    prefix='simple_chords',
+    voices=SIMPLE_CHORD_VOICES,
+    generator=generate_simple_chords,
+    batch=generate_simple_chords_batch,
+    stream=generate_simple_chords_stream
+))
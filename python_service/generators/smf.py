@@ -0,0 +1,547 @@
+"""
+SMF - Standard MIDI File writer and reader
+Turns note events straight into the MThd/MTrk byte stream in one pass,
+without going through py_midicsv's CSV text and event objects.
+Output is byte-identical to the original create_file CSV path.
+The reader goes the other way, from MIDI bytes straight to note arrays.
+"""
+import mmap
+import os
+import struct
+from array import array
+from collections import namedtuple
+import numpy as np
+
+# Channel event status bytes (channel 0)
+NOTE_ON = 0x90
+NOTE_OFF = 0x80
+
+# Default velocities used by the original NOTE_ON_WRAPPER / NOTE_OFF_WRAPPER
+NOTE_ON_VELOCITY = 100
+NOTE_OFF_VELOCITY = 64
+
+# Ticks per quarter note written in the header
+RESOLUTION = 96
+
+# The original CSV template always places End_track at absolute tick 384,
+# even when the notes run past it (a negative delta, written as four bytes of
+# two's complement). Generator output keeps this to stay byte-identical;
+# other output ends the track at its last event or tick 384, whichever is later.
+END_TRACK_TICK = 384
+
+# Meta events from the original TOP_META template:
+# an empty title ("\000") followed by two 4/4 time signatures
+TRACK_PREAMBLE = (
+    b'\x00\xff\x03\x01\x00'
+    b'\x00\xff\x58\x04\x04\x02\x24\x08'
+    b'\x00\xff\x58\x04\x04\x02\x24\x08'
+)
+END_OF_TRACK = b'\xff\x2f\x00'
+
+# Event arrays up to this size are encoded with a plain loop rather than array ops
+SMALL_TRACK_EVENTS = 512
+
+
+def write_varlen(value):
+    """
+    Encode a delta-time as a MIDI variable-length quantity
+
+    Mirrors py_midicsv's write_varlen exactly, including its handling of
+    negative deltas (four bytes of two's complement), so files stay identical.
+    """
+    b1 = value & 0x7F
+    value >>= 7
+    if not value:
+        return bytes((b1,))
+    b2 = (value & 0x7F) | 0x80
+    value >>= 7
+    if not value:
+        return bytes((b2, b1))
+    b3 = (value & 0x7F) | 0x80
+    value >>= 7
+    if not value:
+        return bytes((b3, b2, b1))
+    b4 = (value & 0x7F) | 0x80
+    return bytes((b4, b3, b2, b1))
+
+
+# Precomputed encodings for the deltas we see almost all of the time
+_VARLEN_TABLE = [write_varlen(i) for i in range(0x4000)]
+
+
+def varlen(value):
+    """Table lookup for small deltas, falling back to write_varlen"""
+    if 0 <= value < 0x4000:
+        return _VARLEN_TABLE[value]
+    return write_varlen(value)
+
+
+def end_delta(last_tick, legacy_end=True):
+    """Delta from the last event to End_track (see END_TRACK_TICK)"""
+    if legacy_end:
+        return END_TRACK_TICK - last_tick
+    return max(END_TRACK_TICK - last_tick, 0)
+
+
+def encode_header(num_tracks=1, midi_format=0, resolution=RESOLUTION):
+    """Build the MThd chunk"""
+    return b'MThd' + struct.pack('>LHHH', 6, midi_format, num_tracks, resolution)
+
+
+def encode_track(midi_events, running_status=True, preamble=TRACK_PREAMBLE, legacy_end=True):
+    """
+    Build one MTrk chunk from note events
+
+    Args:
+        midi_events: EVENT_DTYPE array (see events.py), or an iterable of
+            (tick, status, pitch, velocity) tuples, in absolute ticks
+        running_status (bool): Omit repeated status bytes like py_midicsv does by default
+        preamble (bytes): Meta events at the start of the track
+        legacy_end (bool): End_track at tick 384 like the original template (see END_TRACK_TICK)
+
+    Returns:
+        bytes: The complete MTrk chunk including its length
+    """
+    if isinstance(midi_events, np.ndarray):
+        if len(midi_events) > SMALL_TRACK_EVENTS:
+            return encode_event_array(midi_events, running_status, preamble, legacy_end)[0].tobytes()
+        # For short tracks the per-call cost of the array ops outweighs a plain loop
+        midi_events = [(tick, kind | channel, pitch, velocity)
+                       for tick, kind, channel, pitch, velocity in midi_events.tolist()]
+
+    track = bytearray(preamble)
+    previous_status = None
+    last_tick = 0
+
+    for tick, status, pitch, velocity in midi_events:
+        track += varlen(tick - last_tick)
+        last_tick = tick
+        if status != previous_status or not running_status:
+            track.append(status)
+            previous_status = status
+        track.append(pitch)
+        track.append(velocity)
+
+    track += varlen(end_delta(last_tick, legacy_end))
+    track += END_OF_TRACK
+
+    return b'MTrk' + struct.pack('>L', len(track)) + bytes(track)
+
+
+def encode_event_array(events, running_status=True, preamble=TRACK_PREAMBLE, legacy_end=True):
+    """
+    Vectorized MTrk encoding of an EVENT_DTYPE array
+
+    Varint sizes, status bytes and offsets are computed for all events at
+    once and the bytes are scattered into one preallocated buffer.
+
+    Returns:
+        tuple: (uint8 array holding the complete MTrk chunk, position of each event's pitch byte)
+    """
+    layout = _event_layout(events, running_status=running_status)
+    body_start = 8 + len(preamble)
+    body_end = body_start + _layout_size(layout)
+
+    last_tick = int(events['tick'][-1]) if len(events) else 0
+    closing = varlen(end_delta(last_tick, legacy_end)) + END_OF_TRACK
+
+    track = np.empty(body_end + len(closing), dtype=np.uint8)
+    track[:8] = np.frombuffer(b'MTrk' + struct.pack('>L', len(track) - 8), dtype=np.uint8)
+    track[8:body_start] = np.frombuffer(preamble, dtype=np.uint8)
+    track[body_end:] = np.frombuffer(closing, dtype=np.uint8)
+
+    pitch_positions = _write_events(track, body_start, events, layout)
+    return track, pitch_positions
+
+
+def _event_layout(events, last_tick=0, previous_status=None, running_status=True):
+    """
+    Deltas, status bytes, which events need their status byte and varint sizes.
+    last_tick and previous_status carry on from earlier events of the same track.
+    """
+    ticks = events['tick'].astype(np.int64)
+    deltas = np.diff(ticks, prepend=last_tick)
+    status = events['type'] | events['channel']
+
+    needs_status = np.ones(len(events), dtype=bool)
+    if running_status and len(events):
+        needs_status[0] = previous_status is None or status[0] != previous_status
+        needs_status[1:] = status[1:] != status[:-1]
+
+    # write_varlen uses four bytes for negative deltas and anything >= 2**21
+    varlen_size = np.full(len(events), 4, dtype=np.int64)
+    varlen_size[(deltas >= 0) & (deltas < 0x200000)] = 3
+    varlen_size[(deltas >= 0) & (deltas < 0x4000)] = 2
+    varlen_size[(deltas >= 0) & (deltas < 0x80)] = 1
+
+    return deltas, status, needs_status, varlen_size
+
+
+def _layout_size(layout):
+    """Encoded size in bytes of the events in a layout"""
+    _, _, needs_status, varlen_size = layout
+    return int(varlen_size.sum() + needs_status.sum()) + 2 * len(varlen_size)
+
+
+def _write_events(buffer, offset, events, layout):
+    """Scatter encoded events into a uint8 buffer starting at offset; returns each event's pitch byte position"""
+    deltas, status, needs_status, varlen_size = layout
+    event_size = varlen_size + needs_status + 2
+    starts = np.cumsum(event_size) - event_size + offset
+
+    # Varint bytes, most significant first, continuation bit on all but the last
+    for shift in range(4):
+        has_byte = varlen_size > shift
+        value = (deltas[has_byte] >> (7 * shift)) & 0x7F
+        if shift:
+            value |= 0x80
+        buffer[starts[has_byte] + varlen_size[has_byte] - 1 - shift] = value
+
+    status_positions = starts + varlen_size
+    buffer[status_positions[needs_status]] = status[needs_status]
+    pitch_positions = status_positions + needs_status
+    buffer[pitch_positions] = events['pitch']
+    buffer[pitch_positions + 1] = events['velocity']
+    return pitch_positions
+
+
+def measure_track(event_chunks, running_status=True):
+    """
+    Length of the MTrk chunk data (what goes in its length field) for a track
+    given as consecutive EVENT_DTYPE arrays, without encoding it.
+
+    Sizes only depend on ticks, types and channels, so the pitches of the
+    chunks measured don't have to be the ones later streamed. Streamed
+    tracks end after their last event (legacy_end=False, see END_TRACK_TICK).
+    """
+    length = len(TRACK_PREAMBLE)
+    last_tick = 0
+    previous_status = None
+    for events in event_chunks:
+        if not len(events):
+            continue
+        layout = _event_layout(events, last_tick, previous_status, running_status)
+        length += _layout_size(layout)
+        last_tick = int(events['tick'][-1])
+        previous_status = int(layout[1][-1])
+    return length + len(varlen(end_delta(last_tick, legacy_end=False)) + END_OF_TRACK)
+
+
+def _iter_track_data(event_chunks, running_status=True):
+    """Encoded MTrk data (after the length field), one bytes object per chunk"""
+    yield TRACK_PREAMBLE
+    last_tick = 0
+    previous_status = None
+    for events in event_chunks:
+        if not len(events):
+            continue
+        layout = _event_layout(events, last_tick, previous_status, running_status)
+        piece = np.empty(_layout_size(layout), dtype=np.uint8)
+        _write_events(piece, 0, events, layout)
+        yield piece.tobytes()
+        last_tick = int(events['tick'][-1])
+        previous_status = int(layout[1][-1])
+    yield varlen(end_delta(last_tick, legacy_end=False)) + END_OF_TRACK
+
+
+def iter_file(event_chunks, track_length, running_status=True):
+    """
+    Encode a single-track MIDI file one chunk of events at a time
+
+    Memory stays bounded by the chunk size however long the track is. The
+    MTrk length field comes before the data, so it has to be known up front:
+    pass measure_track() of the same chunks (or ones with the same timing).
+
+    Yields:
+        bytes: The header, then the encoded events chunk by chunk
+
+    Raises:
+        ValueError: After the last chunk, if the data didn't match track_length
+            (the bytes already yielded are then not a valid file)
+    """
+    yield encode_header() + b'MTrk' + struct.pack('>L', track_length)
+    written = 0
+    for piece in _iter_track_data(event_chunks, running_status):
+        written += len(piece)
+        yield piece
+    if written != track_length:
+        raise ValueError(f'Track length was {written} bytes, expected {track_length}')
+
+
+def write_file(event_chunks, output_file, running_status=True):
+    """
+    Encode a single-track MIDI file chunk by chunk into a seekable binary
+    file, patching the MTrk length once the end is reached
+
+    Returns:
+        int: Number of bytes written
+    """
+    start = output_file.tell()
+    output_file.write(encode_header() + b'MTrk\x00\x00\x00\x00')
+    length_position = output_file.tell() - 4
+
+    track_length = 0
+    for piece in _iter_track_data(event_chunks, running_status):
+        output_file.write(piece)
+        track_length += len(piece)
+
+    end = output_file.tell()
+    output_file.seek(length_position)
+    output_file.write(struct.pack('>L', track_length))
+    output_file.seek(end)
+    return end - start
+
+
+def encode_file(midi_events, running_status=True, legacy_end=True):
+    """
+    Encode note events as a complete single-track (format 0) MIDI file
+
+    Args:
+        midi_events: EVENT_DTYPE array, or an iterable of (tick, status, pitch, velocity) tuples
+        running_status (bool): Omit repeated status bytes like py_midicsv does by default
+        legacy_end (bool): End_track at tick 384 like the original template (see END_TRACK_TICK)
+
+    Returns:
+        bytes: The MIDI file contents
+    """
+    return encode_header() + encode_track(midi_events, running_status=running_status, legacy_end=legacy_end)
+
+
+def encode_multitrack_file(tracks, running_status=True, legacy_end=True):
+    """
+    Encode one event array per track as a format 1 (multi-track) MIDI file
+
+    The first track carries the title and time signature meta events, the
+    others only their notes. legacy_end is as in encode_file, per track.
+
+    Returns:
+        bytes: The MIDI file contents
+    """
+    chunks = [encode_track(events, running_status=running_status,
+                           preamble=TRACK_PREAMBLE if index == 0 else b'', legacy_end=legacy_end)
+              for index, events in enumerate(tracks)]
+    return encode_header(num_tracks=len(chunks), midi_format=1) + b''.join(chunks)
+
+
+def encode_batch(template_events, pitch_bytes, running_status=True):
+    """
+    Encode many variations of one event layout as complete MIDI files
+
+    When variations share a rhythm and voicing, every file has the same
+    deltas, status bytes and velocities, so the track is encoded once and
+    each file only differs in its pitch bytes, which are filled in with one
+    array write.
+
+    Args:
+        template_events: EVENT_DTYPE array (its pitches are ignored)
+        pitch_bytes: Integer array shaped (variations, events) with each event's pitch
+        running_status (bool): Omit repeated status bytes like py_midicsv does by default
+
+    Returns:
+        list: One bytes object per variation
+    """
+    pitch_bytes = np.asarray(pitch_bytes)
+    if pitch_bytes.size and (pitch_bytes.min() < 0 or pitch_bytes.max() > 255):
+        raise ValueError('byte must be in range(0, 256)')
+
+    header = np.frombuffer(encode_header(), dtype=np.uint8)
+    track, pitch_positions = encode_event_array(template_events, running_status)
+    template = np.concatenate([header, track])
+
+    files = np.tile(template, (len(pitch_bytes), 1))
+    files[:, pitch_positions + len(header)] = pitch_bytes
+    return [row.tobytes() for row in files]
+
+
+# Notes parsed from a MIDI file: one entry per note in each array, ordered by note on
+MidiNotes = namedtuple('MidiNotes', ['pitch', 'on', 'off', 'velocity', 'channel', 'track', 'resolution'])
+
+
+def read_notes(source):
+    """
+    Parse a Standard MIDI File straight into note arrays
+    
+    Chunks and events are decoded in a single pass with no intermediate event
+    objects. Paths are memory-mapped and file objects are read one chunk at a
+    time, so only the output arrays grow with the file. Handles format 0 and 1
+    files, any number of tracks, running status, and note on with velocity 0
+    as note off. Each note on is paired with the next matching note off
+    (same track, channel and pitch); notes still sounding at the end of a
+    track end there.
+    
+    Args:
+        source: Path, bytes, or binary file object
+    
+    Returns:
+        MidiNotes: NumPy arrays pitch, on, off (ticks), velocity, channel, track and the resolution
+    """
+    buffers = {
+        'pitch': array('B'),
+        'on': array('q'),
+        'off': array('q'),
+        'velocity': array('B'),
+        'channel': array('B'),
+        'track': array('H'),
+    }
+    
+    if isinstance(source, (bytes, bytearray)):
+        resolution = _parse_buffer(source, buffers)
+    elif hasattr(source, 'read'):
+        resolution = _parse_stream(source, buffers)
+    else:
+        with open(source, 'rb') as midi_file:
+            if not os.fstat(midi_file.fileno()).st_size:
+                raise ValueError('Empty MIDI file')
+            with mmap.mmap(midi_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                resolution = _parse_buffer(data, buffers)
+    
+    dtypes = {'B': np.uint8, 'q': np.int64, 'H': np.uint16}
+    columns = {name: np.frombuffer(values, dtype=dtypes[values.typecode]) if len(values)
+               else np.zeros(0, dtype=dtypes[values.typecode])
+               for name, values in buffers.items()}
+    
+    # Tracks are parsed one after another, so interleave them by start time
+    if len(columns['track']) and columns['track'].max() != columns['track'].min():
+        order = np.argsort(columns['on'], kind='stable')
+        columns = {name: values[order] for name, values in columns.items()}
+    
+    return MidiNotes(resolution=resolution, **columns)
+
+
+def _parse_header(data, start, length):
+    """Return the resolution from an MThd chunk body"""
+    if length < 6:
+        raise ValueError('Bad header in MIDI file')
+    _, _, resolution = struct.unpack_from('>HHH', data, start)
+    return resolution
+
+
+def _parse_buffer(data, buffers):
+    """Walk the chunks of a complete file held in memory (bytes or mmap)"""
+    size = len(data)
+    if size < 14 or data[0:4] != b'MThd':
+        raise ValueError('Bad header in MIDI file')
+    
+    resolution = None
+    track_index = 0
+    pos = 0
+    while pos + 8 <= size:
+        chunk_type, length = struct.unpack_from('>4sL', data, pos)
+        pos += 8
+        end = min(pos + length, size)
+        if chunk_type == b'MThd':
+            resolution = _parse_header(data, pos, length)
+        elif chunk_type == b'MTrk':
+            _parse_track(data, pos, end, track_index, buffers)
+            track_index += 1
+        # Unknown chunk types are skipped, as the SMF spec requires
+        pos = end
+    return resolution
+
+
+def _parse_stream(midi_file, buffers):
+    """Walk the chunks of a file object, holding one chunk in memory at a time"""
+    chunk_header = midi_file.read(8)
+    if len(chunk_header) < 8 or chunk_header[0:4] != b'MThd':
+        raise ValueError('Bad header in MIDI file')
+    
+    resolution = None
+    track_index = 0
+    while len(chunk_header) == 8:
+        chunk_type, length = struct.unpack('>4sL', chunk_header)
+        data = midi_file.read(length)
+        if chunk_type == b'MThd':
+            resolution = _parse_header(data, 0, len(data))
+        elif chunk_type == b'MTrk':
+            _parse_track(data, 0, len(data), track_index, buffers)
+            track_index += 1
+        chunk_header = midi_file.read(8)
+    return resolution
+
+
+def _parse_track(data, pos, end, track_index, buffers):
+    """Decode one MTrk chunk body, appending its notes to buffers"""
+    pitches = buffers['pitch']
+    ons = buffers['on']
+    offs = buffers['off']
+    velocities = buffers['velocity']
+    channels = buffers['channel']
+    tracks = buffers['track']
+    
+    # Indexes of sounding notes for each (channel, pitch), oldest first
+    open_notes = {}
+    status = 0
+    tick = 0
+    
+    try:
+        while pos < end:
+            # Delta time
+            byte = data[pos]
+            pos += 1
+            delta = byte & 0x7F
+            while byte & 0x80:
+                byte = data[pos]
+                pos += 1
+                delta = (delta << 7) | (byte & 0x7F)
+            tick += delta
+            
+            byte = data[pos]
+            if byte & 0x80:
+                pos += 1
+                if byte >= 0xF0:
+                    # Meta (FF type len data) and sysex (F0/F7 len data) events carry no notes
+                    if byte == 0xFF:
+                        meta_type = data[pos]
+                        pos += 1
+                    elif byte in (0xF0, 0xF7):
+                        meta_type = None
+                    else:
+                        raise ValueError(f'Unexpected status byte 0x{byte:02X} in MIDI track')
+                    byte = data[pos]
+                    pos += 1
+                    length = byte & 0x7F
+                    while byte & 0x80:
+                        byte = data[pos]
+                        pos += 1
+                        length = (length << 7) | (byte & 0x7F)
+                    pos += length
+                    status = 0
+                    if meta_type == 0x2F:
+                        break
+                    continue
+                status = byte
+            elif not status:
+                raise ValueError(f'Data byte 0x{byte:02X} without running status in MIDI track')
+            
+            kind = status & 0xF0
+            if kind == 0xC0 or kind == 0xD0:
+                pos += 1
+                continue
+            
+            pitch = data[pos]
+            velocity = data[pos + 1]
+            pos += 2
+            
+            if kind == 0x90 and velocity:
+                key = (status & 0x0F) << 7 | pitch
+                sounding = open_notes.get(key)
+                if sounding is None:
+                    sounding = open_notes[key] = []
+                sounding.append(len(pitches))
+                pitches.append(pitch)
+                ons.append(tick)
+                offs.append(tick)
+                velocities.append(velocity)
+                channels.append(status & 0x0F)
+                tracks.append(track_index)
+            elif kind == 0x80 or kind == 0x90:
+                sounding = open_notes.get((status & 0x0F) << 7 | pitch)
+                if sounding:
+                    offs[sounding.pop(0)] = tick
+    except IndexError:
+        raise ValueError('Truncated MIDI track') from None
+    
+    # Anything still sounding ends with the track
+    for sounding in open_notes.values():
+        for index in sounding:
+            offs[index] = tick
@@ -0,0 +1,164 @@
+"""
+Synth - Audio previews of note arrays
+Renders notes to PCM with a small additive wavetable, using whole-array
+NumPy operations rather than per-sample loops.
+
+Notes are split into monophonic lanes (voices). Each lane is rendered in a
+handful of passes over flat arrays: the per-note phase increment is
+repeated out to one value per sample and summed into a wrapping 32-bit phase
+accumulator, which indexes the wavetable; the per-note level becomes a gate
+signal whose moving average (two cumsums apart) gives linear attack and
+release ramps. The lanes are then added together.
+"""
+import heapq
+import io
+import wave
+import numpy as np
+from .smf import RESOLUTION
+
+# Bump whenever rendering changes, so cached previews from older code are not served
+SYNTH_VERSION = 1
+
+SAMPLE_RATE = 22050
+DEFAULT_BPM = 120
+
+# One cycle of the tone: a fundamental plus quieter upper harmonics
+TABLE_BITS = 12
+HARMONICS = (1.0, 0.5, 0.25, 0.125, 0.06)
+_phase = np.arange(1 << TABLE_BITS) * (2 * np.pi / (1 << TABLE_BITS))
+WAVETABLE = sum(level * np.sin(_phase * (index + 1)) for index, level in enumerate(HARMONICS)).astype(np.float32)
+WAVETABLE /= np.abs(WAVETABLE).max()
+
+# Length in seconds of the attack and release ramps, so notes start and stop without clicks
+RAMP = 0.005
+
+# Peak level of the normalized mix
+HEADROOM = 0.9
+
+
+def note_frequencies(pitch):
+    """Frequency in Hz of MIDI note numbers (A4 = 69 = 440 Hz)"""
+    return 440.0 * 2.0 ** ((np.asarray(pitch, dtype=np.float64) - 69) / 12)
+
+
+def assign_lanes(start, end):
+    """
+    Lane number for each note such that notes in one lane never overlap
+    (greedy interval partitioning, notes taken in start order)
+    """
+    lanes = np.zeros(len(start), dtype=np.int64)
+    free = []  # (end of last note, lane) for every lane
+    for index in np.argsort(start, kind='stable').tolist():
+        if free and free[0][0] <= start[index]:
+            _, lane = heapq.heappop(free)
+        else:
+            lane = len(free)
+        lanes[index] = lane
+        heapq.heappush(free, (int(end[index]), lane))
+    return lanes
+
+
+def render_lane(start, end, step, level, ramp):
+    """
+    Render one lane of non-overlapping notes (sorted by start) as float32 samples
+
+    Args:
+        start, end: Note bounds in samples
+        step: Phase increment per sample (fraction of a cycle, scaled to 2**32)
+        level: Note amplitude
+        ramp: Attack/release length in samples
+    """
+    # Per note three segments: silence before it, the gated body, and the release tail
+    previous_end = np.concatenate(([0], end[:-1]))
+    length = end - start
+    body = np.maximum(length - ramp, 0)
+    segment_length = np.stack([start - previous_end, body, length - body], axis=1).ravel()
+    zeros = np.zeros(len(start), dtype=np.uint32)
+    segment_step = np.stack([zeros, step, step], axis=1).ravel()
+    segment_gate = np.stack([zeros.astype(np.float32), level / ramp, zeros.astype(np.float32)], axis=1).ravel()
+
+    # Wrapping phase accumulator; its top bits index the wavetable
+    phase = np.cumsum(np.repeat(segment_step, segment_length), dtype=np.uint32)
+    phase >>= 32 - TABLE_BITS
+    tone = np.take(WAVETABLE, phase)
+
+    # Moving sum of the gate over ramp samples: ramps up over ramp samples at a note's
+    # start and back down after its body, reaching zero at the note's end
+    envelope = np.cumsum(np.repeat(segment_gate, segment_length), dtype=np.float32)
+    envelope[ramp:] -= envelope[:-ramp].copy()
+    tone *= envelope
+    return tone
+
+
+def render_notes(pitch, on, off, velocity=None, resolution=RESOLUTION, bpm=DEFAULT_BPM,
+                 sample_rate=SAMPLE_RATE, max_seconds=None):
+    """
+    Render notes to mono PCM
+
+    Args:
+        pitch: MIDI note numbers
+        on: Note on ticks
+        off: Note off ticks (same length as on)
+        velocity: Optional velocities 1-127 (default 100 for every note)
+        resolution: Ticks per quarter note
+        bpm: Tempo used to turn ticks into seconds
+        sample_rate: Output sample rate in Hz
+        max_seconds: Optional length limit; later notes are dropped and long ones cut
+
+    Returns:
+        numpy.ndarray: int16 samples
+    """
+    samples_per_tick = sample_rate * 60.0 / (bpm * resolution)
+    start = np.round(np.asarray(on, dtype=np.float64) * samples_per_tick).astype(np.int64)
+    end = np.round(np.asarray(off, dtype=np.float64) * samples_per_tick).astype(np.int64)
+    pitch = np.asarray(pitch)
+    level = np.full(len(pitch), 100, dtype=np.float32) if velocity is None else np.asarray(velocity, dtype=np.float32)
+    level /= 127
+
+    # Shift so the piece starts at sample 0, then apply the length limit
+    if len(start):
+        origin = start.min()
+        start -= origin
+        end -= origin
+    total = int(end.max()) if len(end) else 0
+    if max_seconds is not None:
+        total = min(total, int(max_seconds * sample_rate))
+    end = np.minimum(end, total)
+    keep = end > start
+    start, end, pitch, level = start[keep], end[keep], pitch[keep], level[keep]
+
+    mix = np.zeros(total, dtype=np.float32)
+    if not len(start):
+        return mix.astype(np.int16)
+
+    step = np.round(note_frequencies(pitch) / sample_rate * 2.0 ** 32).astype(np.uint32)
+    ramp = max(int(RAMP * sample_rate), 1)
+    lanes = assign_lanes(start, end)
+    for lane in range(int(lanes.max()) + 1):
+        notes = np.flatnonzero(lanes == lane)
+        notes = notes[np.argsort(start[notes], kind='stable')]
+        tone = render_lane(start[notes], end[notes], step[notes], level[notes], ramp)
+        mix[:len(tone)] += tone
+
+    peak = np.abs(mix).max()
+    if peak > 0:
+        mix *= HEADROOM * 32767 / peak
+    return mix.astype(np.int16)
+
+
+def encode_wav(samples, sample_rate=SAMPLE_RATE):
+    """16-bit mono WAV file bytes"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(np.ascontiguousarray(samples, dtype='<i2').tobytes())
+    return buffer.getvalue()
+
+
+def render_preview(notes, bpm=DEFAULT_BPM, sample_rate=SAMPLE_RATE, max_seconds=None):
+    """WAV bytes for a MidiNotes from read_notes"""
+    samples = render_notes(notes.pitch, notes.on, notes.off, notes.velocity, notes.resolution,
+                           bpm=bpm, sample_rate=sample_rate, max_seconds=max_seconds)
+    return encode_wav(samples, sample_rate)
@@ -0,0 +1,209 @@
+"""
+Transform - Operation pipelines over existing MIDI files
+Transposes, fits to a key, re-voices as chords and time-stretches whole
+files, each operation one whole-array NumPy step over the file's notes
+
+A pipeline is a list of operations applied in order, for example:
+    [{"op": "transpose", "semitones": -3},
+     {"op": "quantize", "key": "A_MINOR", "policy": "nearest"},
+     {"op": "revoice", "style": "complex-chords", "key": "A_MINOR", "seed": 7},
+     {"op": "stretch", "factor": 1.5}]
+
+Notes keep their voice (the source track, or the chord voice after a
+revoice), so format 1 output has one track per voice. Velocities are kept;
+everything is written on channel 0 at RESOLUTION ticks per quarter note,
+like generated files.
+"""
+from collections import namedtuple
+import numpy as np
+from .smf import RESOLUTION, read_notes, encode_file, encode_multitrack_file
+from .events import notes_to_events, merge_voices, empty_events
+from .quantize import quantize, parse_key, POLICIES, DEFAULT_KEY
+from .registry import STYLES, style_voices
+
+# Longest pipeline a request may run
+MAX_OPERATIONS = 16
+
+# Largest time-stretch factor (and 1 / the smallest)
+MAX_STRETCH = 16
+
+# Largest tick a transformed file may use (MIDI event ticks are int32)
+MAX_TICK = 2 ** 31 - 1
+
+# The notes of one file as it moves through a pipeline, one entry per note
+NoteSet = namedtuple('NoteSet', ['pitch', 'on', 'off', 'velocity', 'voice'])
+
+
+def fold_pitch(pitch):
+    """Move notes outside the MIDI range (0-127) by whole octaves until they fit"""
+    pitch = np.asarray(pitch, dtype=np.int64)
+    return np.where(pitch < 0, pitch % 12, np.where(pitch > 127, pitch + 12 * ((127 - pitch) // 12), pitch))
+
+
+def load_notes(source):
+    """
+    Read a MIDI file (path, bytes or file object) into a NoteSet, rescaling
+    its ticks to RESOLUTION and numbering voices by track from 0
+    """
+    notes = read_notes(source)
+    on, off = notes.on, notes.off
+    # Time-code (SMPTE) divisions have the top bit set; those ticks are kept as they are
+    if notes.resolution and notes.resolution != RESOLUTION and not notes.resolution & 0x8000:
+        on = np.round(on * (RESOLUTION / notes.resolution)).astype(np.int64)
+        off = np.round(off * (RESOLUTION / notes.resolution)).astype(np.int64)
+    _, voice = np.unique(notes.track, return_inverse=True)
+    return NoteSet(notes.pitch.astype(np.int64), on, off, notes.velocity, voice.reshape(-1))
+
+
+def transpose(notes, semitones):
+    """Shift every note by semitones (folded back into range by octaves)"""
+    return notes._replace(pitch=fold_pitch(notes.pitch + semitones))
+
+
+def fit_to_key(notes, key=DEFAULT_KEY, policy='nearest'):
+    """Snap every note to key with the quantize policy"""
+    return notes._replace(pitch=quantize(notes.pitch, key, policy))
+
+
+def revoice(notes, style='simple-chords', key=DEFAULT_KEY, seed=None):
+    """
+    Replace the notes with the voices of a registered style (see registry.py)
+
+    The lowest note starting at each tick becomes the bass note (keeping its
+    length and velocity), and the style's voices are built on that bassline.
+    Every style generator can revoice, so this covers new styles too.
+    """
+    if not len(notes.pitch):
+        return notes
+    order = np.lexsort((notes.pitch, notes.on))
+    _, first = np.unique(notes.on[order], return_index=True)
+    lowest = order[first]
+    bass = notes.pitch[lowest]
+
+    voices = style_voices(STYLES[style], bass, key, np.random.default_rng(seed))
+
+    # Voice-major: every note of the first voice, then the second ...
+    num_voices = voices.shape[1]
+    return NoteSet(
+        pitch=fold_pitch(voices.T.reshape(-1)),
+        on=np.tile(notes.on[lowest], num_voices),
+        off=np.tile(notes.off[lowest], num_voices),
+        velocity=np.tile(notes.velocity[lowest], num_voices),
+        voice=np.repeat(np.arange(num_voices), len(bass))
+    )
+
+
+def stretch(notes, factor):
+    """Scale every tick by factor (every note stays at least one tick long)"""
+    on = np.round(notes.on * factor).astype(np.int64)
+    off = np.maximum(np.round(notes.off * factor).astype(np.int64), on + 1)
+    if len(off) and off.max() > MAX_TICK:
+        raise ValueError(f'Stretched file is too long (ticks over {MAX_TICK})')
+    return notes._replace(on=on, off=off)
+
+
+OPERATIONS = {
+    'transpose': transpose,
+    'quantize': fit_to_key,
+    'revoice': revoice,
+    'stretch': stretch,
+}
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _parse_operation(spec):
+    """One pipeline step as (name, keyword arguments), checked"""
+    if not isinstance(spec, dict):
+        raise ValueError('Each operation must be an object with an "op"')
+    name = spec.get('op')
+    if name == 'transpose':
+        semitones = spec.get('semitones')
+        if not isinstance(semitones, int) or isinstance(semitones, bool) or not -127 <= semitones <= 127:
+            raise ValueError('transpose needs "semitones" between -127 and 127')
+        return name, {'semitones': semitones}
+    if name in ('quantize', 'revoice'):
+        key = spec.get('key', DEFAULT_KEY)
+        if not isinstance(key, str):
+            raise ValueError('key must be a key name such as A_MINOR')
+        parse_key(key)
+        if name == 'quantize':
+            policy = spec.get('policy', 'nearest')
+            if policy not in POLICIES:
+                raise ValueError(f"policy must be one of {', '.join(POLICIES)}")
+            return name, {'key': key, 'policy': policy}
+        style = spec.get('style', 'simple-chords')
+        if style not in STYLES:
+            raise ValueError(f"style must be one of {', '.join(STYLES)}")
+        seed = spec.get('seed')
+        if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool) or seed < 0):
+            raise ValueError('revoice seed must be a non-negative integer')
+        return name, {'style': style, 'key': key, 'seed': seed}
+    if name == 'stretch':
+        factor = spec.get('factor')
+        if not _is_number(factor) or not 1 / MAX_STRETCH <= factor <= MAX_STRETCH:
+            raise ValueError(f'stretch needs a "factor" between 1/{MAX_STRETCH} and {MAX_STRETCH}')
+        return name, {'factor': float(factor)}
+    raise ValueError(f"Unknown operation: {name}")
+
+
+def parse_operations(spec):
+    """
+    Check a request's pipeline (see the module docstring)
+
+    Returns:
+        tuple: (name, keyword arguments) for each operation, in order
+
+    Raises:
+        ValueError: If the pipeline is empty, too long or has a bad operation
+    """
+    if not isinstance(spec, list) or not 0 < len(spec) <= MAX_OPERATIONS:
+        raise ValueError(f'operations must be a list of 1 to {MAX_OPERATIONS} operations')
+    operations = []
+    for index, operation in enumerate(spec):
+        try:
+            operations.append(_parse_operation(operation))
+        except ValueError as e:
+            raise ValueError(f'Operation {index}: {e}')
+    return tuple(operations)
+
+
+def apply_operations(notes, operations):
+    """Run parsed operations over a NoteSet in order"""
+    for name, arguments in operations:
+        notes = OPERATIONS[name](notes, **arguments)
+    return notes
+
+
+def notes_to_tracks(notes):
+    """One tick-ordered event array per voice"""
+    tracks = []
+    for voice in range(int(notes.voice.max()) + 1 if len(notes.voice) else 0):
+        mask = notes.voice == voice
+        order = np.argsort(notes.on[mask], kind='stable')
+        events = notes_to_events(notes.pitch[mask][order], notes.on[mask][order], notes.off[mask][order],
+                                 on_velocity=notes.velocity[mask][order])
+        tracks.append(merge_voices([events]))
+    return [track for track in tracks if len(track)] or [empty_events()]
+
+
+def transform_midi(source, operations, midi_format=0):
+    """
+    Run a parsed pipeline over one MIDI file
+
+    Args:
+        source: Path, bytes or binary file object
+        operations: Result of parse_operations
+        midi_format: 0 for one merged track, 1 for one track per voice
+
+    Returns:
+        bytes: The transformed MIDI file
+    """
+    notes = apply_operations(load_notes(source), operations)
+    tracks = notes_to_tracks(notes)
+    # New files, so End_track follows the notes (see smf.END_TRACK_TICK)
+    if midi_format == 1:
+        return encode_multitrack_file(tracks, legacy_end=False)
+    return encode_file(merge_voices(tracks), legacy_end=False)
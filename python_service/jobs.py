@@ -0,0 +1,220 @@
+"""
+Asynchronous Job Queue
+Long or large generations run in the background and are polled by id
+
+Jobs wait in a bounded priority queue (interactive before bulk) and are
+picked up by a few worker threads per process, which hand the CPU work to
+the shared process pool in workers.py. Job state is written to JOBS_DIR so
+every gunicorn worker can report on (and cancel) any job; finished jobs
+expire after JOB_RESULT_TTL seconds. Queued jobs live in the memory of the
+process that took them (its pid is the job's owner), so a job whose process
+died or was recycled would never finish: a sweep marks it failed, and it
+expires like any other. Everything runs locally, no broker.
+"""
+import os
+import json
+import time
+import uuid
+import queue
+import threading
+import traceback
+from config import JOB_WORKERS, JOB_QUEUE_SIZE, JOB_RESULT_TTL, JOBS_DIR
+from workers import run_jobs
+
+# Priority lanes: lower number is served first
+LANES = {
+    'interactive': 0,
+    'bulk': 1
+}
+
+FINISHED_STATES = ('done', 'failed', 'cancelled')
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at JOB_QUEUE_SIZE"""
+
+
+def _process_alive(pid):
+    """True if a process with this pid exists (on this machine)"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobManager:
+    """Bounded priority queue of generation jobs with file-backed state"""
+
+    def __init__(self, jobs_dir=JOBS_DIR, num_workers=JOB_WORKERS,
+                 max_queued=JOB_QUEUE_SIZE, result_ttl=JOB_RESULT_TTL):
+        self.jobs_dir = jobs_dir
+        self.num_workers = num_workers
+        self.result_ttl = result_ttl
+        self._queue = queue.PriorityQueue(maxsize=max_queued)
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._threads = []
+        self._last_sweep = 0
+
+    def _path(self, job_id, suffix='.json'):
+        return os.path.join(self.jobs_dir, job_id + suffix)
+
+    def _save(self, job):
+        """Write job state atomically so readers never see a partial file"""
+        # Per thread: a worker thread and a request thread may save the same job at once
+        temp_path = self._path(job['id'], f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(temp_path, 'w') as job_file:
+            json.dump(job, job_file)
+        os.replace(temp_path, self._path(job['id']))
+
+    def _start_workers(self):
+        """Start the worker threads on first use (after any fork)"""
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.num_workers):
+                thread = threading.Thread(target=self._work, name=f'job-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, specs, priority='interactive'):
+        """
+        Queue a list of job specs (same format as /api/generate/batch)
+
+        Returns:
+            dict: The new job's state
+        """
+        if priority not in LANES:
+            raise ValueError(f"Unknown priority: {priority}")
+
+        self._start_workers()
+        self.sweep()
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': 'queued',
+            'priority': priority,
+            'owner': os.getpid(),
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'results': None,
+            'error': None
+        }
+        self._save(job)
+
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+        try:
+            self._queue.put_nowait((LANES[priority], sequence, job['id'], specs))
+        except queue.Full:
+            os.remove(self._path(job['id']))
+            raise QueueFullError('Job queue is full')
+        return job
+
+    def get(self, job_id):
+        """Return a job's state, or None if it doesn't exist (or has expired)"""
+        if not job_id.isalnum():
+            return None
+        self.sweep()
+        try:
+            with open(self._path(job_id)) as job_file:
+                return json.load(job_file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def cancel(self, job_id):
+        """
+        Cancel a queued job. Running jobs can't be interrupted, and a job that
+        starts at the same moment it is cancelled may still run.
+
+        Returns:
+            dict: The job's state after the request, or None if it doesn't exist
+        """
+        job = self.get(job_id)
+        if job is None or job['status'] != 'queued':
+            return job
+        # The marker is honoured by whichever process owns the job when it is dequeued
+        open(self._path(job_id, '.cancel'), 'w').close()
+        job['status'] = 'cancelled'
+        job['finished_at'] = time.time()
+        self._save(job)
+        return job
+
+    def _work(self):
+        """Worker thread: run queued jobs in priority order"""
+        while True:
+            _, _, job_id, specs = self._queue.get()
+            try:
+                self._run(job_id, specs)
+            except Exception as e:
+                print(f"Error running job {job_id}: {str(e)}")
+                traceback.print_exc()
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id, specs):
+        job = self.get(job_id)
+        if job is None:
+            return
+        if os.path.exists(self._path(job_id, '.cancel')) or job['status'] != 'queued':
+            return
+
+        job['status'] = 'running'
+        job['started_at'] = time.time()
+        self._save(job)
+
+        try:
+            job['results'] = run_jobs(specs)
+            job['status'] = 'done'
+        except Exception as e:
+            print(f"Error running job {job_id}: {str(e)}")
+            traceback.print_exc()
+            job['status'] = 'failed'
+            job['error'] = str(e)
+
+        job['finished_at'] = time.time()
+        self._save(job)
+
+    def sweep(self, interval=60):
+        """
+        Delete finished jobs older than result_ttl, and fail queued or running
+        jobs whose owning process is gone (at most once per interval)
+        """
+        now = time.time()
+        if now - self._last_sweep < interval:
+            return
+        self._last_sweep = now
+
+        for name in os.listdir(self.jobs_dir):
+            path = os.path.join(self.jobs_dir, name)
+            try:
+                if name.endswith('.json'):
+                    with open(path) as job_file:
+                        job = json.load(job_file)
+                    if job['status'] in FINISHED_STATES:
+                        if now - job['finished_at'] > self.result_ttl:
+                            os.remove(path)
+                    elif job.get('owner') and not _process_alive(job['owner']):
+                        # Lost with its worker process; expires result_ttl from now
+                        job['status'] = 'failed'
+                        job['error'] = 'Job was lost: the worker process running it exited'
+                        job['finished_at'] = now
+                        self._save(job)
+                elif now - os.path.getmtime(path) > self.result_ttl:
+                    # Cancel markers and stale temp files
+                    os.remove(path)
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+
+    def stats(self):
+        """Queue depth and worker count for this process"""
+        return {
+            'queued': self._queue.qsize(),
+            'max_queued': self._queue.maxsize,
+            'workers': self.num_workers
+        }
@@ -0,0 +1,304 @@
+"""
+Local Socket Transport
+Length-prefixed binary requests over a Unix domain socket, for callers on
+the same machine (the PHP frontend) that want MIDI bytes without TCP, HTTP
+parsing or JSON
+
+Enabled by setting SOCKET_PATH. serve.py binds the socket in the master
+before forking and every gunicorn worker accepts on it, so the kernel
+spreads connections over the workers. Connections are persistent: a client
+sends any number of requests on one connection, one at a time, and each
+gets exactly one response.
+
+Every frame is a 4-byte big-endian length followed by that many bytes.
+
+Request (big-endian):
+    B  protocol version (1)
+    B  generator: the style's position in generators.STYLES (registration
+       order, so 0 bass, 1 complex-chords, 2 simple-chords, then any
+       styles registered later)
+    B  flags: 1 seeded, 2 format 1 (one track per voice)
+    B  key name length (0 for the default key)
+    q  seed (ignored unless seeded)
+    H  scale length in notes (0 for the default scale)
+    I  rhythm length in ticks (0 for the default rhythm)
+    then the key name (ASCII), the scale (1 byte per note) and the rhythm
+    (4 bytes per tick)
+
+Response:
+    H  status, as the HTTP endpoints would answer (200, 400, 413, 503, 500)
+    H  seconds to wait before retrying (0 if retrying won't help)
+    then the MIDI file for 200, otherwise a UTF-8 error message
+
+Requests go through the same validation, cost limit, result cache and warm
+pool as /api/generate/*, and nothing is written to OUTPUT_DIR. There is no
+per-client rate limit: only local users allowed by SOCKET_MODE can connect.
+"""
+import os
+import stat
+import time
+import socket
+import struct
+import threading
+import traceback
+import numpy as np
+from config import SOCKET_PATH, SOCKET_MODE, SOCKET_CONNECTIONS, SOCKET_IDLE_TIMEOUT, MAX_REQUEST_BYTES
+from admission import Rejection
+from generators import STYLES
+
+PROTOCOL_VERSION = 1
+
+FLAG_SEEDED = 1
+FLAG_FORMAT_1 = 2
+
+_LENGTH = struct.Struct('>I')
+_REQUEST = struct.Struct('>BBBBqHI')
+_RESPONSE = struct.Struct('>HH')
+
+
+def generator_ids():
+    """Style names by their generator id on the wire"""
+    return tuple(STYLES)
+
+
+class SocketError(Exception):
+    """A request the service answered with an error: status, message and Retry-After seconds"""
+
+    def __init__(self, status, message, retry_after=0):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def encode_request(generator, seed=None, scale=None, rhythm=None, key=None, midi_format=0):
+    """Request body for one generation (see the module docstring)"""
+    key_bytes = (key or '').encode('ascii')
+    scale = scale or []
+    rhythm = rhythm or []
+    flags = (FLAG_SEEDED if seed is not None else 0) | (FLAG_FORMAT_1 if midi_format == 1 else 0)
+    header = _REQUEST.pack(PROTOCOL_VERSION, generator_ids().index(generator), flags, len(key_bytes),
+                           seed or 0, len(scale), len(rhythm))
+    return header + key_bytes + bytes(scale) + np.asarray(rhythm, dtype='>u4').tobytes()
+
+
+def decode_request(body):
+    """
+    Parse a request body into the payload the generate endpoints take
+
+    Returns:
+        tuple: (job type, request data dict)
+
+    Raises:
+        Rejection: If the frame is malformed
+    """
+    if len(body) < _REQUEST.size:
+        raise Rejection(400, 'Request frame is too short')
+    version, generator, flags, key_length, seed, scale_length, rhythm_length = _REQUEST.unpack_from(body)
+    if version != PROTOCOL_VERSION:
+        raise Rejection(400, f'Unsupported protocol version: {version}')
+    names = generator_ids()
+    if generator >= len(names):
+        raise Rejection(400, f'Unknown generator id: {generator}')
+    if len(body) != _REQUEST.size + key_length + scale_length + 4 * rhythm_length:
+        raise Rejection(400, 'Request frame length does not match its header')
+
+    offset = _REQUEST.size
+    data = {'format': 1 if flags & FLAG_FORMAT_1 else 0}
+    if flags & FLAG_SEEDED:
+        data['seed'] = seed
+    if key_length:
+        try:
+            data['key'] = body[offset:offset + key_length].decode('ascii')
+        except UnicodeDecodeError:
+            raise Rejection(400, 'key must be a key name such as A_MINOR')
+        offset += key_length
+    if scale_length:
+        data['scale'] = list(body[offset:offset + scale_length])
+        offset += scale_length
+    if rhythm_length:
+        data['rhythm'] = np.frombuffer(body, dtype='>u4', count=rhythm_length, offset=offset).tolist()
+    return names[generator], data
+
+
+def _recv_exactly(connection, size):
+    """size bytes from the connection, or None if it closed first"""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = connection.recv_into(view[received:])
+        if not count:
+            return None
+        received += count
+    return bytes(buffer)
+
+
+def _send_frame(connection, body):
+    connection.sendall(_LENGTH.pack(len(body)) + body)
+
+
+class LocalSocketServer:
+    """Accepts connections on a Unix domain socket and answers each request frame with handler(body)"""
+
+    def __init__(self, handler, path=SOCKET_PATH, max_connections=SOCKET_CONNECTIONS,
+                 idle_timeout=SOCKET_IDLE_TIMEOUT):
+        """
+        Args:
+            handler: Called with each request body, returns (status, response bytes, retry seconds or None)
+            path: Socket file (empty disables the server)
+            max_connections: Connections served at once per process (more wait in the listen backlog)
+            idle_timeout: Seconds a connection may wait between requests
+        """
+        self.handler = handler
+        self.path = path
+        self.idle_timeout = idle_timeout
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._socket = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def bind(self):
+        """Create the listening socket (before forking, so every worker shares it)"""
+        with self._lock:
+            if not self.enabled or self._socket is not None:
+                return
+            # A socket file left by a previous run is replaced; anything else is an error
+            try:
+                if stat.S_ISSOCK(os.lstat(self.path).st_mode):
+                    os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(self.path)
+            os.chmod(self.path, SOCKET_MODE)
+            listener.listen(socket.SOMAXCONN)
+            self._socket = listener
+
+    def start(self):
+        """Start accepting connections (once per process, after any fork)"""
+        if not self.enabled:
+            return
+        self.bind()
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._accept, name='local-socket', daemon=True)
+            self._thread.start()
+
+    def _accept(self):
+        while True:
+            self._slots.acquire()
+            try:
+                connection, _ = self._socket.accept()
+            except OSError as e:
+                self._slots.release()
+                print(f"Error accepting on {self.path}: {str(e)}")
+                time.sleep(0.1)
+                continue
+            threading.Thread(target=self._serve, args=(connection,), name='local-socket-connection',
+                             daemon=True).start()
+
+    def _serve(self, connection):
+        """Answer requests on one connection until the client closes it or goes idle"""
+        try:
+            with connection:
+                connection.settimeout(self.idle_timeout)
+                while True:
+                    header = _recv_exactly(connection, _LENGTH.size)
+                    if header is None:
+                        return
+                    length = _LENGTH.unpack(header)[0]
+                    if length > MAX_REQUEST_BYTES:
+                        # The body is never read, so the connection can't be used again
+                        _send_frame(connection, _RESPONSE.pack(413, 0) + b'Request frame is too large')
+                        return
+                    body = _recv_exactly(connection, length)
+                    if body is None:
+                        return
+                    status, payload, retry_after = self.handler(body)
+                    _send_frame(connection, _RESPONSE.pack(status, int(retry_after or 0)) + payload)
+        except socket.timeout:
+            pass
+        except OSError:
+            pass
+        except Exception as e:
+            print(f"Error serving local socket connection: {str(e)}")
+            traceback.print_exc()
+        finally:
+            self._slots.release()
+
+
+class SocketClient:
+    """
+    Reference client: one persistent connection, one request at a time
+
+    Generation is idempotent and writes nothing, so a request on a connection
+    the server has since closed (idle timeout, restart) is retried once on a
+    new connection.
+    """
+
+    def __init__(self, path=SOCKET_PATH, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.settimeout(self.timeout)
+            connection.connect(self.path)
+            self._connection = connection
+        return self._connection
+
+    def _exchange(self, body):
+        connection = self._connect()
+        try:
+            _send_frame(connection, body)
+        except ConnectionError:
+            # The service may have answered (a 413 for a frame over its limit) and closed before reading it all
+            pass
+        header = _recv_exactly(connection, _LENGTH.size)
+        response = header and _recv_exactly(connection, _LENGTH.unpack(header)[0])
+        if response is None:
+            raise ConnectionError('Connection closed by the service')
+        return response
+
+    def generate(self, generator, seed=None, scale=None, rhythm=None, key=None, midi_format=0):
+        """
+        Generate one file
+
+        Args:
+            generator: A style name, such as 'bass', 'complex-chords' or 'simple-chords'
+            seed, scale, rhythm, key, midi_format: As in the generate endpoints
+
+        Returns:
+            bytes: The MIDI file
+
+        Raises:
+            SocketError: If the service rejected or failed the request
+        """
+        body = encode_request(generator, seed, scale, rhythm, key, midi_format)
+        try:
+            response = self._exchange(body)
+        except ConnectionError:
+            self.close()
+            response = self._exchange(body)
+        status, retry_after = _RESPONSE.unpack_from(response)
+        if status != 200:
+            raise SocketError(status, response[_RESPONSE.size:].decode('utf-8', 'replace'), retry_after)
+        return response[_RESPONSE.size:]
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,172 @@
+"""
+Service Metrics
+Counters, gauges and histograms rendered in the Prometheus text format
+
+Metrics are kept per process: under gunicorn each worker reports its own
+values, and the scraper sees whichever worker answers /metrics.
+"""
+import os
+import threading
+import time
+
+# Latency buckets in seconds (sub-millisecond encodes up to long batch jobs)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.label_names, labels)} {value}"
+                    for labels, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+    def total(self):
+        """Sum over every label combination"""
+        with self._lock:
+            return sum(self._values.values())
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for labels, (bucket_counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    bucket_labels = _format_labels(self.label_names + ('le',), labels + (repr(bound),))
+                    lines.append(f"{self.name}_bucket{bucket_labels} {bucket_count}")
+                inf_labels = _format_labels(self.label_names + ('le',), labels + ('+Inf',))
+                lines.append(f"{self.name}_bucket{inf_labels} {count}")
+                plain_labels = _format_labels(self.label_names, labels)
+                lines.append(f"{self.name}_sum{plain_labels} {total}")
+                lines.append(f"{self.name}_count{plain_labels} {count}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics plus callbacks for values computed at scrape time"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """collector() returns a list of (name, kind, help, value) sampled on each scrape"""
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, kind, help_text, value in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+class DirectorySize:
+    """Total size and file count of a directory, rescanned at most every max_age seconds"""
+
+    def __init__(self, path, max_age=30):
+        self.path = path
+        self.max_age = max_age
+        self._scanned_at = 0
+        self._value = (0, 0)
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if time.time() - self._scanned_at > self.max_age:
+                total_bytes = 0
+                total_files = 0
+                for root, _, files in os.walk(self.path):
+                    for name in files:
+                        try:
+                            total_bytes += os.path.getsize(os.path.join(root, name))
+                            total_files += 1
+                        except OSError:
+                            continue
+                self._value = (total_bytes, total_files)
+                self._scanned_at = time.time()
+            return self._value
+
+
+registry = Registry()
+
+requests_total = registry.register(Counter(
+    'midi_requests_total', 'HTTP requests by endpoint and status code', ('endpoint', 'status')))
+requests_in_flight = registry.register(Gauge(
+    'midi_requests_in_flight', 'Requests currently being handled', ('endpoint',)))
+request_duration = registry.register(Histogram(
+    'midi_request_duration_seconds', 'Total request latency', ('endpoint',)))
+stage_duration = registry.register(Histogram(
+    'midi_stage_duration_seconds', 'Latency of each generation stage', ('endpoint', 'stage')))
+admission_rejections = registry.register(Counter(
+    'midi_admission_rejections_total', 'Requests turned away by admission control', ('endpoint', 'status')))
+background_dropped = registry.register(Counter(
+    'midi_background_dropped_total', 'Background tasks dropped because the writer was backlogged', ('task',)))
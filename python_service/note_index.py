@@ -0,0 +1,386 @@
+"""
+Note Index
+An append-only, memory-mapped columnar index of generated files, for
+finding exact duplicates and similar pieces
+
+Every file written to OUTPUT_DIR gets one row:
+    name      the filename
+    digest    first 128 bits of the SHA-256 of the file (exact duplicates)
+    rhythm    64-bit hash of the gaps between note onsets
+    simhash   64-bit SimHash of the pitch n-gram counts (candidate search)
+    vector    the same counts hashed into INDEX_DIMS buckets, unit length, float16
+    pitch     the pitch sequence, in onset order
+Pitch n-grams are over pitch classes (so octave doublings match) in onset
+order, lowest note first at equal onsets.
+
+Each column is its own flat file of fixed-width rows. Names and pitch
+sequences are variable-length, so they live in a flat byte column with a
+second column of end offsets. Queries memory-map the columns, and only the
+scanned column pages are read, so nothing is loaded into RAM up front:
+- Duplicates: one vectorized comparison over the digest column.
+- Similar: Hamming distance to every simhash (8 bytes a row), then the
+  closest INDEX_CANDIDATES rows are reranked by cosine similarity of their
+  vectors. The candidate step is approximate in the usual SimHash way:
+  a near neighbour is almost always found, but not guaranteed.
+
+Appends can come from any thread or process (request threads, gunicorn
+workers, the process pool). They take a lock file, write the columns, and
+then bump the committed row count in the meta file last. Readers only look
+at committed rows, so they never see a half-written row. A writer that
+finds bytes past the committed rows (a crash mid-append) truncates them
+before writing. The index is a cache of what is in OUTPUT_DIR: delete
+INDEX_DIR and run this module (python note_index.py) to rebuild it.
+"""
+import os
+import mmap
+import fcntl
+import struct
+import hashlib
+import threading
+import traceback
+import numpy as np
+from config import INDEX_DIR, INDEX_NGRAM, INDEX_DIMS, INDEX_CANDIDATES
+from generators.smf import read_notes
+
+# Bump whenever the row layout or features change (a new index is started beside the old one)
+INDEX_VERSION = 1
+
+# Rows scanned per NumPy step, which bounds the temporary arrays of a query
+SCAN_ROWS = 1 << 20
+
+# Bits set in each 16-bit value, for Hamming distances
+_POPCOUNT16 = np.array([bin(value).count('1') for value in range(1 << 16)], dtype=np.uint8)
+
+# Committed row count, stored at the start of the meta file
+_COUNT = struct.Struct('<Q')
+
+
+def _mix64(values):
+    """splitmix64 finalizer: a well-spread 64-bit hash of each uint64"""
+    values = np.asarray(values, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def _ngram_tables(ngram, dims):
+    """Vector bucket and SimHash signs (+1/-1 for each of 64 bits) of every pitch class n-gram"""
+    hashes = _mix64(np.arange(12 ** ngram, dtype=np.uint64))
+    buckets = (hashes % np.uint64(dims)).astype(np.int64)
+    bits = (hashes[:, np.newaxis] >> np.arange(64, dtype=np.uint64)) & np.uint64(1)
+    signs = bits.astype(np.float32) * 2 - 1
+    return buckets, signs
+
+
+_BUCKETS, _SIGNS = _ngram_tables(INDEX_NGRAM, INDEX_DIMS)
+
+
+def file_features(midi_bytes):
+    """
+    Index row values for one MIDI file
+
+    Returns:
+        dict: digest (2 uint64), rhythm, simhash, vector (float16) and pitch (uint8 array)
+    """
+    digest = np.frombuffer(hashlib.sha256(midi_bytes).digest()[:16], dtype='<u8')
+    notes = read_notes(midi_bytes)
+    order = np.lexsort((notes.pitch, notes.on))
+    pitch = notes.pitch[order]
+
+    onsets = np.unique(notes.on)
+    rhythm = int.from_bytes(hashlib.blake2b(np.diff(onsets).astype('<i8').tobytes(), digest_size=8).digest(),
+                            'little')
+
+    # Each window of pitch classes as one base-12 number
+    classes = (pitch % 12).astype(np.int64)
+    count = len(classes) - INDEX_NGRAM + 1
+    codes = np.zeros(max(count, 0), dtype=np.int64)
+    for offset in range(INDEX_NGRAM):
+        codes = codes * 12 + classes[offset:offset + count]
+
+    vector = np.bincount(_BUCKETS[codes], minlength=INDEX_DIMS).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    codes, counts = np.unique(codes, return_counts=True)
+    weights = counts.astype(np.float32) @ _SIGNS[codes] if len(codes) else np.zeros(64, dtype=np.float32)
+    simhash = int(np.packbits(weights[::-1] > 0).view('>u8')[0])
+
+    return {
+        'digest': digest,
+        'rhythm': rhythm,
+        'simhash': simhash,
+        'vector': vector.astype(np.float16),
+        'pitch': pitch.astype(np.uint8)
+    }
+
+
+class _Column:
+    """One append-only column file of fixed-width rows, read through a memory map"""
+
+    def __init__(self, path, dtype, width=1):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.width = width
+        self.row_bytes = self.dtype.itemsize * width
+        self._map = None
+        self._mapped_rows = 0
+
+    def rows(self, count):
+        """The first count rows (read-only), remapping the file if it has grown"""
+        shape = (count, self.width) if self.width > 1 else (count,)
+        if count == 0:
+            return np.zeros(shape, dtype=self.dtype)
+        if count > self._mapped_rows:
+            with open(self.path, 'rb') as column_file:
+                self._map = mmap.mmap(column_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped_rows = len(self._map) // self.row_bytes
+        return np.frombuffer(self._map, dtype=self.dtype, count=count * self.width).reshape(shape)
+
+
+class NoteIndex:
+    """Append-only columnar index of generated files, shared by every process through INDEX_DIR"""
+
+    def __init__(self, root=INDEX_DIR):
+        self.root = os.path.join(root, f'v{INDEX_VERSION}_n{INDEX_NGRAM}_d{INDEX_DIMS}')
+        os.makedirs(self.root, exist_ok=True)
+        self.columns = {
+            'digest': _Column(self._path('digest'), '<u8', 2),
+            'rhythm': _Column(self._path('rhythm'), '<u8'),
+            'simhash': _Column(self._path('simhash'), '<u8'),
+            'vector': _Column(self._path('vector'), '<f2', INDEX_DIMS),
+            'pitch_end': _Column(self._path('pitch_end'), '<u8'),
+            'pitch': _Column(self._path('pitch'), 'u1'),
+            'name_end': _Column(self._path('name_end'), '<u8'),
+            'name': _Column(self._path('name'), 'u1'),
+        }
+        self._lock = threading.Lock()
+        self._files = None
+        self._pid = None
+        self.appended = 0
+
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    def _open(self):
+        """File descriptors for appending (reopened after a fork, so flock isn't shared with the parent)"""
+        if self._pid != os.getpid():
+            flags = os.O_RDWR | os.O_CREAT
+            self._files = {name: os.open(column.path, flags, 0o644) for name, column in self.columns.items()}
+            self._files['meta'] = os.open(self._path('meta'), flags, 0o644)
+            self._files['lock'] = os.open(self._path('.lock'), flags, 0o644)
+            self._pid = os.getpid()
+        return self._files
+
+    def count(self):
+        """Number of committed rows"""
+        try:
+            with open(self._path('meta'), 'rb') as meta_file:
+                data = meta_file.read(_COUNT.size)
+        except FileNotFoundError:
+            return 0
+        return _COUNT.unpack(data)[0] if len(data) == _COUNT.size else 0
+
+    def _last_end(self, files, name, count):
+        """End offset of the last committed row of a variable-length column"""
+        if not count:
+            return 0
+        data = os.pread(files[name + '_end'], 8, (count - 1) * 8)
+        return struct.unpack('<Q', data)[0]
+
+    def add_many(self, entries):
+        """
+        Append rows for (filename, MIDI bytes) pairs
+
+        Files with an identical name and content already in the index are
+        skipped, so rewriting a content-addressed file doesn't add a row.
+
+        Returns:
+            int: Rows appended
+        """
+        rows = []
+        for filename, midi_bytes in entries:
+            features = file_features(midi_bytes)
+            features['name'] = np.frombuffer(filename.encode('utf-8'), dtype=np.uint8)
+            rows.append(features)
+        if not rows:
+            return 0
+
+        with self._lock:
+            files = self._open()
+            fcntl.flock(files['lock'], fcntl.LOCK_EX)
+            try:
+                count = self.count()
+                rows = [row for row in rows if not self._contains(row['digest'], row['name'], count)]
+                if not rows:
+                    return 0
+                self._append(files, count, rows)
+            finally:
+                fcntl.flock(files['lock'], fcntl.LOCK_UN)
+            self.appended += len(rows)
+        return len(rows)
+
+    def add(self, filename, midi_bytes):
+        """Append one file's row (see add_many)"""
+        return self.add_many([(filename, midi_bytes)])
+
+    def _contains(self, digest, name, count):
+        return any(bytes(self._name_bytes(row, count)) == name.tobytes() for row in self.find_digest(digest, count))
+
+    def _append(self, files, count, rows):
+        """Write rows after the committed ones (caller holds the lock), then commit them"""
+        pitch_start = self._last_end(files, 'pitch', count)
+        name_start = self._last_end(files, 'name', count)
+        pitch_ends = pitch_start + np.cumsum([len(row['pitch']) for row in rows], dtype=np.uint64)
+        name_ends = name_start + np.cumsum([len(row['name']) for row in rows], dtype=np.uint64)
+
+        values = {
+            'digest': np.stack([row['digest'] for row in rows]).astype('<u8'),
+            'rhythm': np.array([row['rhythm'] for row in rows], dtype='<u8'),
+            'simhash': np.array([row['simhash'] for row in rows], dtype='<u8'),
+            'vector': np.stack([row['vector'] for row in rows]).astype('<f2'),
+            'pitch_end': pitch_ends.astype('<u8'),
+            'pitch': np.concatenate([row['pitch'] for row in rows]),
+            'name_end': name_ends.astype('<u8'),
+            'name': np.concatenate([row['name'] for row in rows]),
+        }
+        starts = {'pitch': pitch_start, 'name': name_start}
+
+        for name, column in self.columns.items():
+            # Anything past the committed rows is left over from an append that never committed
+            offset = starts[name] if name in starts else count * column.row_bytes
+            if os.fstat(files[name]).st_size != offset:
+                os.ftruncate(files[name], offset)
+            os.pwrite(files[name], values[name].tobytes(), offset)
+        os.pwrite(files['meta'], _COUNT.pack(count + len(rows)), 0)
+
+    def _name_bytes(self, row, count):
+        ends = self.columns['name_end'].rows(count)
+        start = int(ends[row - 1]) if row else 0
+        return self.columns['name'].rows(int(ends[count - 1]))[start:int(ends[row])]
+
+    def names(self, rows, count=None):
+        """Filenames of row numbers"""
+        if count is None:
+            count = self.count()
+        return [bytes(self._name_bytes(int(row), count)).decode('utf-8') for row in rows]
+
+    def pitches(self, row, count=None):
+        """Pitch sequence stored for a row"""
+        if count is None:
+            count = self.count()
+        ends = self.columns['pitch_end'].rows(count)
+        start = int(ends[row - 1]) if row else 0
+        return self.columns['pitch'].rows(int(ends[count - 1]))[start:int(ends[row])].copy()
+
+    def find_digest(self, digest, count=None):
+        """Row numbers of files with this content digest (2 uint64)"""
+        if count is None:
+            count = self.count()
+        digests = self.columns['digest'].rows(count)
+        matches = []
+        for start in range(0, count, SCAN_ROWS):
+            block = digests[start:start + SCAN_ROWS]
+            hits = np.flatnonzero(block[:, 0] == digest[0])
+            matches.extend((start + hits[block[hits, 1] == digest[1]]).tolist())
+        return matches
+
+    def duplicates(self, midi_bytes):
+        """Names of indexed files with exactly this content"""
+        count = self.count()
+        return self.names(self.find_digest(file_features(midi_bytes)['digest'], count), count)
+
+    def similar(self, midi_bytes, k=10, candidates=INDEX_CANDIDATES):
+        """
+        The k indexed files most similar to this MIDI content (exact duplicates excluded)
+
+        Returns:
+            list: {'filename', 'score' (cosine similarity, 1 = same n-grams), 'same_rhythm'} dicts, best first
+        """
+        count = self.count()
+        if not count:
+            return []
+        query = file_features(midi_bytes)
+        simhashes = self.columns['simhash'].rows(count)
+
+        # Hamming distance from the query's simhash to every row, a block at a time
+        distances = np.empty(count, dtype=np.uint8)
+        for start in range(0, count, SCAN_ROWS):
+            lanes = (simhashes[start:start + SCAN_ROWS] ^ np.uint64(query['simhash'])).view(np.uint16).reshape(-1, 4)
+            distances[start:start + len(lanes)] = (_POPCOUNT16[lanes[:, 0]] + _POPCOUNT16[lanes[:, 1]] +
+                                                   _POPCOUNT16[lanes[:, 2]] + _POPCOUNT16[lanes[:, 3]])
+        pool = min(max(candidates, k), count)
+        rows = np.argpartition(distances, pool - 1)[:pool] if pool < count else np.arange(count)
+
+        # Rerank the candidates by cosine similarity of their n-gram vectors
+        rows = np.sort(rows)
+        digests = self.columns['digest'].rows(count)[rows]
+        rows = rows[(digests[:, 0] != query['digest'][0]) | (digests[:, 1] != query['digest'][1])]
+        vectors = self.columns['vector'].rows(count)[rows].astype(np.float32)
+        scores = np.minimum(vectors @ query['vector'].astype(np.float32), 1.0)  # float16 rounding
+        best = np.argsort(-scores, kind='stable')[:k]
+        rhythms = self.columns['rhythm'].rows(count)[rows[best]]
+        return [
+            {'filename': name, 'score': round(float(score), 4), 'same_rhythm': bool(rhythm == query['rhythm'])}
+            for name, score, rhythm in zip(self.names(rows[best], count), scores[best], rhythms)
+        ]
+
+    def stats(self):
+        count = self.count()
+        size = 0
+        for name in list(self.columns) + ['meta']:
+            try:
+                size += os.path.getsize(self._path(name))
+            except OSError:
+                pass
+        return {
+            'rows': count,
+            'bytes': size,
+            'appended': self.appended
+        }
+
+
+def rebuild(index=None, output_dir=None):
+    """Index every .mid file under OUTPUT_DIR that isn't in the index yet"""
+    from config import OUTPUT_DIR
+    index = index or NoteIndex()
+    output_dir = output_dir or OUTPUT_DIR
+    batch = []
+    added = 0
+    for directory, _, filenames in os.walk(output_dir):
+        for filename in filenames:
+            if not filename.endswith('.mid'):
+                continue
+            try:
+                with open(os.path.join(directory, filename), 'rb') as midi_file:
+                    batch.append((filename, midi_file.read()))
+            except OSError:
+                continue
+            if len(batch) >= 1000:
+                added += _add_batch(index, batch)
+                batch = []
+    return added + _add_batch(index, batch)
+
+
+def _add_batch(index, batch):
+    try:
+        return index.add_many(batch)
+    except ValueError:
+        # One unreadable file: index the rest one at a time
+        added = 0
+        for filename, midi_bytes in batch:
+            try:
+                added += index.add(filename, midi_bytes)
+            except ValueError as e:
+                print(f"Skipping {filename}: {str(e)}")
+        return added
+    except Exception as e:
+        print(f"Error indexing files: {str(e)}")
+        traceback.print_exc()
+        return 0
+
+
+if __name__ == '__main__':
+    total = rebuild()
+    print(f"Indexed {total} file(s); {NoteIndex().count()} rows in {INDEX_DIR}")
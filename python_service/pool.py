@@ -0,0 +1,175 @@
+"""
+Warm Pool
+Pre-rendered MIDI for default-parameter requests, so an interactive click is
+served from memory instead of running the generator
+
+A background thread keeps up to WARM_POOL_DEPTH unseeded variations ready for
+each generator and parameter set (key and MIDI format). A request takes one
+(a deque pop) and the thread renders a replacement afterwards. Refills are
+limited to WARM_POOL_REFILL_RATE renders per second and pause while
+WARM_POOL_BUSY_REQUESTS or more requests are in flight, so the pool never
+competes with live traffic. Only requests without scale, rhythm or seed are
+eligible: for those any fresh random variation is as good as another.
+
+Sets for the default key are created at start; other keys and formats get a
+set the first time they are asked for, up to WARM_POOL_MAX_SETS.
+"""
+import io
+import time
+import threading
+import traceback
+from collections import OrderedDict, deque
+from generators import parse_key
+from config import WARM_POOL_DEPTH, WARM_POOL_REFILL_RATE, WARM_POOL_BUSY_REQUESTS, WARM_POOL_MAX_SETS
+
+# How long the refill thread waits before checking again while the worker is busy
+BUSY_BACKOFF = 0.05
+
+
+class WarmPool:
+    """Bounded per-parameter-set buffers of pre-rendered MIDI bytes, refilled in the background"""
+
+    def __init__(self, depth=WARM_POOL_DEPTH, refill_rate=WARM_POOL_REFILL_RATE,
+                 busy_requests=WARM_POOL_BUSY_REQUESTS, max_sets=WARM_POOL_MAX_SETS, in_flight=None):
+        self.depth = depth
+        self.refill_rate = refill_rate
+        self.busy_requests = busy_requests
+        self.max_sets = max_sets
+        self.in_flight = in_flight or (lambda: 0)
+        self._sets = OrderedDict()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+
+    @property
+    def enabled(self):
+        return self.depth > 0 and self.refill_rate > 0
+
+    def _add_set(self, generator, key, midi_format):
+        """Register a parameter set (caller holds the lock); returns its buffer or None if full"""
+        pool_key = (generator.__name__, key, midi_format)
+        entry = self._sets.get(pool_key)
+        if entry is None:
+            if len(self._sets) >= self.max_sets:
+                return None
+            entry = self._sets[pool_key] = {
+                'generator': generator,
+                'items': deque(),
+                'hits': 0,
+                'misses': 0
+            }
+        return entry
+
+    def prime(self, generators, key, midi_format=0):
+        """Create sets for these generators up front so they fill before the first request"""
+        if not self.enabled:
+            return
+        with self._lock:
+            for generator in generators:
+                self._add_set(generator, key, midi_format)
+        self._wake.set()
+
+    def start(self):
+        """Start the refill thread (once per process, after any fork)"""
+        with self._lock:
+            if self._thread is not None or not self.enabled:
+                return
+            self._thread = threading.Thread(target=self._run, name='warm-pool', daemon=True)
+            self._thread.start()
+
+    def take(self, generator, key, midi_format=0):
+        """
+        Pop a pre-rendered variation for this parameter set
+
+        Returns:
+            bytes: MIDI file contents, or None on a miss (the caller renders as usual)
+        """
+        if not self.enabled or not isinstance(key, str) or midi_format not in (0, 1):
+            return None
+        try:
+            parse_key(key)
+        except ValueError:
+            return None
+        with self._lock:
+            entry = self._add_set(generator, key, midi_format)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry['items']:
+                midi_bytes = entry['items'].popleft()
+                entry['hits'] += 1
+                self.hits += 1
+            else:
+                midi_bytes = None
+                entry['misses'] += 1
+                self.misses += 1
+        self._wake.set()
+        return midi_bytes
+
+    def _next_set(self):
+        """The set with the fewest ready items, if any is below depth"""
+        with self._lock:
+            pool_key, entry = min(self._sets.items(), key=lambda item: len(item[1]['items']),
+                                  default=(None, None))
+            if entry is None or len(entry['items']) >= self.depth:
+                return None, None
+            return pool_key, entry
+
+    def _render(self, pool_key, entry):
+        _, key, midi_format = pool_key
+        buffer = io.BytesIO()
+        try:
+            entry['generator'](buffer, key=key, midi_format=midi_format)
+        except Exception as e:
+            # A set that can't render is dropped instead of retried forever
+            print(f"Error refilling warm pool for {pool_key}: {str(e)}")
+            traceback.print_exc()
+            with self._lock:
+                self._sets.pop(pool_key, None)
+            return
+        with self._lock:
+            if self._sets.get(pool_key) is entry:
+                entry['items'].append(buffer.getvalue())
+                self.refills += 1
+
+    def _run(self):
+        interval = 1.0 / self.refill_rate
+        while True:
+            pool_key, entry = self._next_set()
+            if entry is None:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            if self.in_flight() >= self.busy_requests:
+                time.sleep(BUSY_BACKOFF)
+                continue
+            self._render(pool_key, entry)
+            time.sleep(interval)
+
+    def stats(self):
+        """Hit/miss/refill counters and ready items per parameter set (this process only)"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'depth': self.depth,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'refills': self.refills,
+                'ready': sum(len(entry['items']) for entry in self._sets.values()),
+                'sets': [
+                    {
+                        'generator': generator_name,
+                        'key': key,
+                        'format': midi_format,
+                        'ready': len(entry['items']),
+                        'hits': entry['hits'],
+                        'misses': entry['misses']
+                    }
+                    for (generator_name, key, midi_format), entry in self._sets.items()
+                ]
+            }
@@ -0,0 +1,78 @@
+"""
+Production Server
+Runs the Flask app under gunicorn: preforked workers with threads,
+warm-up before forking, and graceful drain on SIGTERM
+
+Usage:
+    python serve.py
+
+Settings come from config.py (HOST, PORT, WORKERS, THREADS,
+REQUEST_TIMEOUT, GRACEFUL_TIMEOUT, KEEPALIVE env vars,
+and SOCKET_PATH for the local socket transport).
+
+CPU sizing: each of the WORKERS processes starts its own process pool of
+BATCH_WORKERS for batch, job, export and transform work. BATCH_WORKERS
+defaults to cores // WORKERS, so all the pools together use about one
+process per core. With WORKERS=1 one pool gets every core. Raising either
+setting by hand oversubscribes the CPU.
+"""
+import signal
+from gunicorn.app.base import BaseApplication
+from config import HOST, PORT, WORKERS, THREADS, REQUEST_TIMEOUT, GRACEFUL_TIMEOUT, KEEPALIVE, OUTPUT_DIR
+import app as service
+
+
+def post_worker_init(worker):
+    """Start the sweepers, warm pool and local socket, and flip /ready to draining as soon as a worker is told to stop"""
+    service.output_sweeper.start()
+    service.preview_sweeper.start()
+    service.warm_pool.start()
+    service.socket_server.start()
+    
+    def handle_term(signum, frame):
+        service.start_draining()
+        worker.handle_exit(signum, frame)
+    
+    signal.signal(signal.SIGTERM, handle_term)
+
+
+class ProductionServer(BaseApplication):
+    """Gunicorn application serving the already imported (and warmed up) Flask app"""
+    
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+    
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+    
+    def load(self):
+        return service.app
+
+
+if __name__ == '__main__':
+    print(f"Starting Mess o Midi Python Service on {HOST}:{PORT} "
+          f"({WORKERS} workers x {THREADS} threads)")
+    print(f"Output directory: {OUTPUT_DIR}")
+    
+    # Warm up once in the master; forked workers inherit the loaded modules and tables
+    service.warm_up()
+    
+    # Every worker accepts on the one local socket (when SOCKET_PATH is set)
+    service.socket_server.bind()
+    if service.socket_server.enabled:
+        print(f"Local socket: {service.socket_server.path}")
+    
+    ProductionServer({
+        'bind': f'{HOST}:{PORT}',
+        'workers': WORKERS,
+        'threads': THREADS,
+        'worker_class': 'gthread',
+        'timeout': REQUEST_TIMEOUT,
+        'graceful_timeout': GRACEFUL_TIMEOUT,
+        'keepalive': KEEPALIVE,
+        'preload_app': True,
+        'post_worker_init': post_worker_init,
+        'accesslog': '-',
+    }).run()
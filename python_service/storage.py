@@ -0,0 +1,287 @@
+"""
+Output Storage
+Where generated MIDI files live on disk, and the sweeper that keeps the
+directory from growing forever
+
+Files go into hashed shard directories (OUTPUT_DIR/ab/cd/<filename>) so no
+single directory gets huge, and are written to a temp file and renamed so a
+reader never sees a half-written file. Default names carry a random suffix,
+so requests in the same second can't overwrite each other.
+
+The sweeper deletes sharded files older than OUTPUT_TTL and then the oldest
+ones until the total is under OUTPUT_MAX_BYTES. Files listed in the manifest
+(OUTPUT_MANIFEST, one filename per line, appended to by the PHP side when a
+file is added to a project) are never deleted. Files in the top level of
+OUTPUT_DIR (older flat layout, PHP uploads) are left alone.
+"""
+import os
+import re
+import time
+import fcntl
+import hashlib
+import secrets
+import threading
+import traceback
+from collections import OrderedDict
+from config import OUTPUT_DIR, OUTPUT_TTL, OUTPUT_MAX_BYTES, OUTPUT_SWEEP_INTERVAL, OUTPUT_MANIFEST
+
+# Two levels of 256 directories each
+SHARD_DEPTH = 2
+
+# Temp files older than this are leftovers from a crashed write
+STALE_TEMP_AGE = 3600
+
+# Content-addressed names end in 32 hex digits of the generation key (see content_filename)
+CONTENT_NAME_RE = re.compile(r'_([0-9a-f]{32})\.mid$')
+
+# Content hashes of recently served files, keyed by (path, inode, mtime, size)
+_etags = OrderedDict()
+_etags_lock = threading.Lock()
+ETAG_CACHE_ENTRIES = 4096
+
+
+def new_filename(prefix):
+    """Collision-free default filename such as bass_1712345678_3f9a0c1d2e4b.mid"""
+    return f"{prefix}_{int(time.time())}_{secrets.token_hex(6)}.mid"
+
+
+def content_filename(prefix, digest):
+    """
+    Name derived from a generation key (e.g. cache_key): the same request always
+    maps to the same name, and the file under that name never changes
+    """
+    return f"{prefix}_{digest[:32]}.mid"
+
+
+def is_content_addressed(filename):
+    """True for names made by content_filename"""
+    return CONTENT_NAME_RE.search(filename) is not None
+
+
+def check_filename(filename):
+    """Reject names that could escape the output directory"""
+    if not filename or filename != os.path.basename(filename) or filename.startswith('.'):
+        raise ValueError(f"Invalid filename: {filename}")
+    return filename
+
+
+def check_user_filename(filename):
+    """
+    check_filename for names chosen by clients, which also may not look
+    content-addressed: downloads of those are cached as immutable, so only
+    content_filename may make them (checked as it will be saved, with .mid)
+    """
+    check_filename(filename)
+    if is_content_addressed(filename if filename.endswith('.mid') else filename + '.mid'):
+        raise ValueError(f"Invalid filename: {filename} (names ending in _ and 32 hex digits are reserved)")
+    return filename
+
+
+def shard_dir(filename, root=OUTPUT_DIR):
+    """Shard directory for a filename (from the first bytes of its hash)"""
+    digest = hashlib.md5(filename.encode('utf-8')).hexdigest()
+    return os.path.join(root, *(digest[2 * level:2 * level + 2] for level in range(SHARD_DEPTH)))
+
+
+def path_for(filename, root=OUTPUT_DIR):
+    """Full path a new file should be written to (creates its shard directory)"""
+    directory = shard_dir(check_filename(filename), root)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, filename)
+
+
+def open_output(filename, root=OUTPUT_DIR):
+    """
+    Open an existing output file for reading (sharded, or the older flat layout)
+
+    Only string checks guard against path traversal, and the file is opened
+    directly instead of being checked for first, so a hit costs one open and
+    one fstat.
+
+    Returns:
+        tuple: (binary file object, os.stat_result), or (None, None) if it doesn't exist
+    """
+    try:
+        check_filename(filename)
+    except ValueError:
+        return None, None
+    for path in (os.path.join(shard_dir(filename, root), filename), os.path.join(root, filename)):
+        try:
+            output_file = open(path, 'rb')
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            continue
+        stat = os.fstat(output_file.fileno())
+        return output_file, stat
+    return None, None
+
+
+def file_etag(filename, output_file, stat):
+    """
+    Strong ETag for an open output file: the generation key for content-addressed
+    names, otherwise a SHA-256 of the bytes (memoized until the file changes)
+    """
+    match = CONTENT_NAME_RE.search(filename)
+    if match:
+        return match.group(1)
+
+    memo_key = (output_file.name, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _etags_lock:
+        etag = _etags.get(memo_key)
+        if etag is not None:
+            _etags.move_to_end(memo_key)
+            return etag
+
+    # pread leaves the file position at 0 for the response
+    digest = hashlib.sha256()
+    offset = 0
+    while offset < stat.st_size:
+        chunk = os.pread(output_file.fileno(), 1024 * 1024, offset)
+        if not chunk:
+            break
+        digest.update(chunk)
+        offset += len(chunk)
+    etag = digest.hexdigest()[:32]
+
+    with _etags_lock:
+        _etags[memo_key] = etag
+        if len(_etags) > ETAG_CACHE_ENTRIES:
+            _etags.popitem(last=False)
+    return etag
+
+
+def write_atomic(filepath, data):
+    """Write bytes to a temp file next to filepath, then rename it into place"""
+    temp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'wb') as output_file:
+            output_file.write(data)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return filepath
+
+
+class OutputSweeper:
+    """Background thread enforcing the age limit and byte quota on sharded output files"""
+
+    def __init__(self, root=OUTPUT_DIR, ttl=OUTPUT_TTL, max_bytes=OUTPUT_MAX_BYTES,
+                 manifest_path=OUTPUT_MANIFEST, interval=OUTPUT_SWEEP_INTERVAL):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.manifest_path = manifest_path
+        self.interval = interval
+        self._thread = None
+        self._lock = threading.Lock()
+        self._manifest_stamp = None
+        self._referenced = frozenset()
+        self.deleted_files = 0
+        self.deleted_bytes = 0
+
+    def start(self):
+        """Start the sweeper thread (once per process, after any fork)"""
+        with self._lock:
+            if self._thread is not None or self.interval <= 0 or (self.ttl <= 0 and self.max_bytes <= 0):
+                return
+            self._thread = threading.Thread(target=self._run, name='output-sweeper', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Error sweeping output files: {str(e)}")
+                traceback.print_exc()
+
+    def referenced(self):
+        """Filenames listed in the manifest (re-read only when it changes)"""
+        if not self.manifest_path:
+            return frozenset()
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return frozenset()
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp != self._manifest_stamp:
+            with open(self.manifest_path) as manifest:
+                self._referenced = frozenset(
+                    os.path.basename(line.strip()) for line in manifest
+                    if line.strip() and not line.startswith('#'))
+            self._manifest_stamp = stamp
+        return self._referenced
+
+    def _scan(self, now):
+        """(mtime, size, path, filename) of every sharded file; removes stale temp files on the way"""
+        files = []
+        for shard in os.scandir(self.root):
+            if not shard.is_dir() or len(shard.name) != 2:
+                continue
+            for directory, _, names in os.walk(shard.path):
+                for name in names:
+                    path = os.path.join(directory, name)
+                    try:
+                        stat = os.stat(path)
+                        if name.endswith('.tmp'):
+                            if now - stat.st_mtime > STALE_TEMP_AGE:
+                                os.remove(path)
+                            continue
+                    except FileNotFoundError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path, name))
+        return files
+
+    def _delete(self, path, size):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        self.deleted_files += 1
+        self.deleted_bytes += size
+
+    def sweep(self):
+        """
+        Run one sweep. Only one process sweeps at a time; the others skip.
+
+        Returns:
+            bool: True if this process did the sweep
+        """
+        with open(os.path.join(self.root, '.sweep.lock'), 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+
+            now = time.time()
+            referenced = self.referenced()
+            files = sorted(self._scan(now))
+            total_bytes = sum(size for _, size, _, _ in files)
+
+            # Oldest first, so the quota pass removes the least recent files
+            kept = []
+            for mtime, size, path, name in files:
+                if name in referenced:
+                    continue
+                if self.ttl > 0 and now - mtime > self.ttl:
+                    self._delete(path, size)
+                    total_bytes -= size
+                else:
+                    kept.append((size, path))
+
+            if self.max_bytes > 0:
+                for size, path in kept:
+                    if total_bytes <= self.max_bytes:
+                        break
+                    self._delete(path, size)
+                    total_bytes -= size
+            return True
+
+    def stats(self):
+        """Files and bytes deleted by this process"""
+        return {
+            'deleted_files': self.deleted_files,
+            'deleted_bytes': self.deleted_bytes
+        }
@@ -0,0 +1,28 @@
+"""
+Test setup: the service's data directories point at a temporary directory
+(set before config is first imported), so tests never touch uploads/
+"""
+import os
+import sys
+import shutil
+import tempfile
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+DATA_DIR = tempfile.mkdtemp(prefix='midi-service-tests-')
+for name in ('OUTPUT_DIR', 'INDEX_DIR', 'JOBS_DIR', 'PREVIEW_DIR'):
+    os.environ[name] = os.path.join(DATA_DIR, name.split('_')[0].lower())
+os.environ['RATE_LIMIT_RATE'] = '0'
+os.environ['WARM_POOL_DEPTH'] = '0'
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def client():
+    """Flask test client of the service"""
+    import app as service
+    return service.app.test_client()
@@ -0,0 +1,49 @@
+"""Shared test helpers"""
+import struct
+
+
+def track_ends(midi_bytes):
+    """
+    Walk every MTrk chunk of a MIDI file
+
+    Returns:
+        list: (tick of the last note event, tick of End_track, End_track delta) per track
+    """
+    tracks = []
+    position = 14
+    while position < len(midi_bytes):
+        chunk, length = struct.unpack_from('>4sL', midi_bytes, position)
+        position += 8
+        end = position + length
+        if chunk == b'MTrk':
+            tracks.append(_walk_track(midi_bytes, position, end))
+        position = end
+    return tracks
+
+
+def _walk_track(data, position, end):
+    tick = last_note_tick = 0
+    status = None
+    while position < end:
+        delta = 0
+        while True:
+            byte = data[position]
+            position += 1
+            delta = (delta << 7) | (byte & 0x7F)
+            if not byte & 0x80:
+                break
+        tick += delta
+        if data[position] == 0xFF:
+            kind, size = data[position + 1], data[position + 2]
+            position += 3 + size
+            if kind == 0x2F:
+                assert position == end, 'End_track is not the last event'
+                return last_note_tick, tick, delta
+            continue
+        if data[position] & 0x80:
+            status = data[position]
+            position += 1
+        assert status is not None and status & 0xF0 in (0x80, 0x90), f'Unexpected status {status}'
+        position += 2
+        last_note_tick = tick
+    raise AssertionError('Track has no End_track')
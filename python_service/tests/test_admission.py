@@ -0,0 +1,79 @@
+"""Request validation, cost limits and rate limits"""
+import threading
+import pytest
+from admission import Rejection, CostLimiter, RateLimiter, validate_generation, validate_jobs, validate_transform
+from config import MAX_REQUEST_COST
+
+
+@pytest.mark.parametrize('data', [
+    {'scale': []}, {'scale': [128]}, {'scale': 'C'},
+    {'rhythm': [0]}, {'rhythm': [0, -1]}, {'rhythm': [0, 1.5]},
+    {'seed': 1.5}, {'seed': True}, {'seed': 'x' * 257},
+    {'key': 'H_MAJOR'}, {'key': 3},
+    {'format': 2}, {'format': True},
+    {'distribution': [1, 2]}, {'distribution': 'lognormal'},
+    {'filename': '../escape.mid'}, {'filename': '.hidden'},
+    {'filename': 'x_' + 'a' * 32 + '.mid'}, {'filename': 'x_' + '0f' * 16},
+])
+def test_bad_generations_are_rejected(data):
+    with pytest.raises(Rejection) as rejection:
+        validate_generation(data, 'bass')
+    assert rejection.value.status == 400
+
+
+def test_generation_cost_is_events_per_voice():
+    assert validate_generation({}, 'bass') == 2 * 23
+    assert validate_generation({'rhythm': [0, 96, 192], 'seed': 'abc'}, 'complex-chords') == 2 * 2 * 5
+
+
+def test_unknown_types_and_oversized_generations():
+    with pytest.raises(Rejection):
+        validate_generation({}, 'polka')
+    rhythm = list(range(MAX_REQUEST_COST // 2))
+    with pytest.raises(Rejection) as rejection:
+        validate_generation({'rhythm': rhythm}, 'complex-chords')
+    assert rejection.value.status == 413
+
+
+def test_validate_jobs_sums_costs_and_names_the_bad_job():
+    assert validate_jobs([{'type': 'bass'}, {'type': 'simple-chords'}, {'type': 'unknown'}], 10) == 46 + 184
+    with pytest.raises(Rejection, match='Job 1'):
+        validate_jobs([{'type': 'bass'}, {'type': 'bass', 'format': 3}], 10)
+    with pytest.raises(Rejection):
+        validate_jobs([{}] * 11, 10)
+
+
+def test_validate_transform_scales_cost_by_revoice_voices():
+    data = {'operations': [{'op': 'revoice', 'style': 'complex-chords'}]}
+    operations, cost = validate_transform(data, [300, 600], 10)
+    assert operations[0][0] == 'revoice'
+    assert cost == 900 // 3 * 5
+    with pytest.raises(Rejection):
+        validate_transform({'operations': []}, [300], 10)
+
+
+def test_cost_limiter_waits_then_gives_up():
+    limiter = CostLimiter(capacity=100, wait=0.05)
+    assert limiter.acquire(80) == 80
+    assert limiter.acquire(30) is None
+    limiter.release(80)
+    assert limiter.in_flight == 0
+    # Bigger than the capacity: reserves all of it
+    assert limiter.acquire(500) == 100
+    assert limiter.acquire(1) is None
+
+
+def test_cost_limiter_wakes_waiters_on_release():
+    limiter = CostLimiter(capacity=10, wait=2)
+    limiter.acquire(10)
+    threading.Timer(0.02, limiter.release, (10,)).start()
+    assert limiter.acquire(5) == 5
+
+
+def test_rate_limiter_bucket():
+    limiter = RateLimiter(rate=1, burst=2, max_clients=10)
+    assert limiter.check('a') == 0
+    assert limiter.check('a') == 0
+    assert limiter.check('a') > 0
+    assert limiter.check('b') == 0
+    assert RateLimiter(rate=0).check('a') == 0
@@ -0,0 +1,41 @@
+"""Background writer backlog and the index metrics"""
+import threading
+import app as service
+import metrics
+
+
+def test_backlogged_writer_drops_index_updates_and_saves_inline(monkeypatch):
+    # No free slots: the writer already has PERSIST_QUEUE_SIZE tasks waiting
+    slots = threading.BoundedSemaphore(1)
+    slots.acquire()
+    monkeypatch.setattr(service, 'persist_slots', slots)
+    before = metrics.background_dropped._values.get(('index',), 0)
+    calls = []
+
+    service.submit_background('index', calls.append, 'index')
+    assert calls == []
+    assert metrics.background_dropped._values[('index',)] == before + 1
+
+    service.submit_background('persist', calls.append, 'persist', required=True)
+    assert calls == ['persist']
+
+
+def test_writer_frees_its_slot_when_a_task_finishes(monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(service, 'persist_slots', slots)
+    done = threading.Event()
+    service.submit_background('index', done.set)
+    assert done.wait(5)
+    service.persist_executor.submit(lambda: None).result()
+    assert slots.acquire(blocking=False)
+
+
+def test_index_gauge_does_not_open_a_disabled_index(client, monkeypatch):
+    def fail():
+        raise AssertionError('index opened while disabled')
+    monkeypatch.setattr(service, 'INDEX_ENABLED', False)
+    monkeypatch.setattr(service, 'get_note_index', fail)
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert b'midi_index_rows 0' in response.data
+    assert client.get('/api/index').get_json()['index'] is None
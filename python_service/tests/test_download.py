@@ -0,0 +1,52 @@
+"""Downloads and previews: conditional and Range requests"""
+import pytest
+
+
+@pytest.fixture(scope='module')
+def filename(client):
+    response = client.post('/api/generate/bass', json={'seed': 11})
+    assert response.status_code == 200
+    return response.json['filename']
+
+
+def test_full_and_conditional_downloads(client, filename):
+    response = client.get(f'/api/download/{filename}')
+    assert response.status_code == 200 and response.data[:4] == b'MThd'
+    assert 'immutable' in response.headers['Cache-Control']
+    again = client.get(f'/api/download/{filename}', headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_range_download(client, filename):
+    size = len(client.get(f'/api/download/{filename}').data)
+    response = client.get(f'/api/download/{filename}', headers={'Range': 'bytes=0-3'})
+    assert response.status_code == 206
+    assert response.data == b'MThd'
+    assert response.headers['Content-Range'] == f'bytes 0-3/{size}'
+
+
+def test_range_past_the_end_is_a_json_416(client, filename):
+    size = len(client.get(f'/api/download/{filename}').data)
+    response = client.get(f'/api/download/{filename}', headers={'Range': f'bytes={size + 10}-'})
+    assert response.status_code == 416
+    assert response.is_json and response.json['success'] is False
+    assert response.headers['Content-Range'] == f'bytes */{size}'
+
+
+def test_missing_file_is_a_json_404(client):
+    response = client.get('/api/download/missing.mid')
+    assert response.status_code == 404 and response.json['success'] is False
+
+
+def test_content_addressed_names_are_reserved(client):
+    response = client.post('/api/generate/bass', json={'filename': 'x_' + 'a' * 32 + '.mid'})
+    assert response.status_code == 400 and 'reserved' in response.json['error']
+
+
+def test_client_named_files_are_revalidated(client):
+    response = client.post('/api/generate/bass', json={'filename': 'my_bassline.mid', 'seed': 1})
+    assert response.status_code == 200
+    download = client.get('/api/download/my_bassline.mid')
+    assert download.status_code == 200
+    assert 'immutable' not in download.headers['Cache-Control']
+    assert 'no-cache' in download.headers['Cache-Control']
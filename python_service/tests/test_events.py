@@ -0,0 +1,56 @@
+"""Event arrays and voice merging"""
+import numpy as np
+import pytest
+from generators import notes_to_events, interleave_voices, merge_voices, EVENT_DTYPE
+from generators.smf import NOTE_OFF
+
+
+def reference_merge(voices):
+    """Tick order, offs before ons at a tick, then voice order, then each voice's own order"""
+    rows = [(int(event['tick']), int(event['type'] != NOTE_OFF), voice_index, event_index, event)
+            for voice_index, voice in enumerate(voices) for event_index, event in enumerate(voice)]
+    return np.array([row[-1] for row in sorted(rows, key=lambda row: row[:4])], dtype=EVENT_DTYPE)
+
+
+def random_voice(rng, num_notes, channel):
+    """Notes on a coarse grid, so voices share ticks; each ends by the time the next starts"""
+    starts = np.cumsum(rng.integers(2, 10, size=num_notes)) * 48
+    lengths = rng.integers(1, 3, size=num_notes) * 48
+    return notes_to_events(rng.integers(30, 90, size=num_notes), starts, starts + lengths, channel=channel)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_merge_voices_matches_a_plain_sort(seed):
+    rng = np.random.default_rng(seed)
+    voices = [random_voice(rng, int(rng.integers(0, 60)), channel) for channel in range(int(rng.integers(2, 6)))]
+    assert np.array_equal(merge_voices(voices), reference_merge([voice for voice in voices if len(voice)]))
+
+
+def test_merge_voices_shared_rhythm_is_interleave():
+    ticks = np.arange(0, 960, 96)
+    voices = [notes_to_events(np.full(10, pitch), ticks, ticks + 96) for pitch in (40, 52, 55)]
+    assert np.array_equal(merge_voices(voices), interleave_voices(voices))
+
+
+def test_merge_voices_keeps_zero_length_notes_in_order():
+    voice = notes_to_events([60, 62], [0, 96], [0, 96])
+    merged = merge_voices([voice, notes_to_events([48], [0], [96])])
+    assert [(int(event['tick']), int(event['type']), int(event['pitch'])) for event in merged] == [
+        (0, 0x90, 60), (0, 0x80, 60), (0, 0x90, 48), (96, 0x80, 48), (96, 0x90, 62), (96, 0x80, 62)]
+
+
+def test_merge_voices_sorts_a_voice_that_goes_backwards():
+    voice = notes_to_events([60, 62], [0, 50], [100, 150])  # overlapping notes: ticks 0 100 50 150
+    assert merge_voices([voice])['tick'].tolist() == [0, 50, 100, 150]
+
+
+def test_merge_voices_of_nothing():
+    assert len(merge_voices([])) == 0
+    assert len(merge_voices([notes_to_events([], [], [])])) == 0
+
+
+def test_notes_to_events_truncates_like_zip_and_checks_range():
+    events = notes_to_events([60, 61, 62], [0, 96], [96, 192, 288])
+    assert len(events) == 4
+    with pytest.raises(ValueError):
+        notes_to_events([256], [0], [96])
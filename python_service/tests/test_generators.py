@@ -0,0 +1,73 @@
+"""Seeded determinism of the generators and the result cache keys"""
+import io
+import numpy as np
+import pytest
+from generators import STYLES, generate_bassline, generate_simple_chords, generate_complex_chords
+from cache import cache_key
+
+OPTIONS = [
+    {},
+    {'key': 'A_MINOR', 'midi_format': 1},
+    {'distribution': [4, 1, 2, 1, 3, 1, 1], 'rhythm': [0, 96, 192, 288, 480]},
+    {'distribution': {'type': 'markov', 'matrix': [[1, 2, 0, 0, 0, 0, 1]] * 7}},
+]
+
+
+def render(generator, **options):
+    buffer = io.BytesIO()
+    generator(buffer, **options)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('style', list(STYLES))
+@pytest.mark.parametrize('options', OPTIONS)
+@pytest.mark.parametrize('seed', [1, 'abc'])
+def test_seeded_files_are_deterministic(style, options, seed):
+    generator = STYLES[style].generator
+    midi_bytes = render(generator, seed=seed, **options)
+    assert midi_bytes[:4] == b'MThd'
+    assert render(generator, seed=seed, **options) == midi_bytes
+
+
+@pytest.mark.parametrize('style', list(STYLES))
+def test_different_seeds_differ(style):
+    assert render(STYLES[style].generator, seed=1) != render(STYLES[style].generator, seed=2)
+
+
+@pytest.mark.parametrize('style', list(STYLES))
+def test_seeded_batch_and_stream_are_deterministic(style):
+    batch = STYLES[style].batch
+    first = batch(4, seed=9, distribution='normal')
+    assert first.shape == (4, min(STYLES[style].notes or 23, 23), len(STYLES[style].voices))
+    assert np.array_equal(batch(4, seed=9, distribution='normal'), first)
+
+    chunks = list(STYLES[style].stream(1000, seed=9, chunk_notes=300))
+    again = list(STYLES[style].stream(1000, seed=9, chunk_notes=300))
+    assert [len(chunk) for chunk in chunks] == [300, 300, 300, 100]
+    assert all(np.array_equal(a, b) for a, b in zip(chunks, again))
+
+
+def test_public_generators_are_the_registered_ones():
+    # Their names are part of the cache keys and content-addressed filenames
+    assert STYLES['bass'].generator is generate_bassline
+    assert STYLES['simple-chords'].generator is generate_simple_chords
+    assert STYLES['complex-chords'].generator is generate_complex_chords
+    assert [generator.__name__ for generator in (generate_bassline, generate_simple_chords,
+                                                 generate_complex_chords)] == \
+        ['generate_bassline', 'generate_simple_chords', 'generate_complex_chords']
+
+
+def test_cache_key_covers_every_parameter():
+    base = ('generate_bassline', None, None, 1)
+    keys = {
+        cache_key(*base),
+        cache_key('generate_simple_chords', None, None, 1),
+        cache_key('generate_bassline', [40, 43], None, 1),
+        cache_key('generate_bassline', None, [0, 96], 1),
+        cache_key('generate_bassline', None, None, 2),
+        cache_key(*base, key='A_MINOR'),
+        cache_key(*base, midi_format=1),
+        cache_key(*base, distribution='normal'),
+    }
+    assert len(keys) == 8
+    assert cache_key(*base) == cache_key(*base)
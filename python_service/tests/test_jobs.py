@@ -0,0 +1,93 @@
+"""Asynchronous job queue"""
+import json
+import os
+import subprocess
+import sys
+import time
+import pytest
+from jobs import JobManager, QueueFullError
+
+
+def wait_for(manager, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job['status'] in ('done', 'failed', 'cancelled'):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f'Job {job_id} did not finish')
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return JobManager(jobs_dir=str(tmp_path), num_workers=1, max_queued=4, result_ttl=60)
+
+
+def test_job_runs_to_done(manager):
+    job = manager.submit([{'type': 'bass', 'seed': 1}, {'type': 'polka'}])
+    assert job['status'] == 'queued'
+    job = wait_for(manager, job['id'])
+    assert job['status'] == 'done'
+    first, second = job['results']
+    assert first['success'] and first['filename'].endswith('.mid')
+    assert not second['success']
+
+
+def test_unknown_jobs_and_priorities(manager):
+    assert manager.get('missing') is None
+    assert manager.get('../etc') is None
+    with pytest.raises(ValueError):
+        manager.submit([], priority='urgent')
+
+
+def test_queue_is_bounded(tmp_path):
+    # No workers, so jobs stay queued
+    manager = JobManager(jobs_dir=str(tmp_path), num_workers=0, max_queued=2)
+    manager.submit([{'type': 'bass'}])
+    manager.submit([{'type': 'bass'}])
+    with pytest.raises(QueueFullError):
+        manager.submit([{'type': 'bass'}])
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_cancel_queued_job(tmp_path):
+    manager = JobManager(jobs_dir=str(tmp_path), num_workers=0)
+    job = manager.submit([{'type': 'bass'}])
+    assert manager.cancel(job['id'])['status'] == 'cancelled'
+    assert manager.get(job['id'])['status'] == 'cancelled'
+
+
+def test_sweep_expires_finished_jobs(manager, tmp_path):
+    job = wait_for(manager, manager.submit([{'type': 'bass'}])['id'])
+    path = tmp_path / f"{job['id']}.json"
+    job['finished_at'] -= 120
+    path.write_text(json.dumps(job))
+    manager.sweep(interval=0)
+    assert not path.exists()
+
+
+@pytest.mark.parametrize('status', ['queued', 'running'])
+def test_sweep_fails_lost_jobs_then_expires_them(tmp_path, status):
+    manager = JobManager(jobs_dir=str(tmp_path), num_workers=0, result_ttl=60)
+    job = manager.submit([{'type': 'bass'}])
+    path = tmp_path / f"{job['id']}.json"
+
+    # However long it has taken, a job whose process is alive is left alone
+    job.update(status=status, created_at=time.time() - 86400, started_at=time.time() - 86400)
+    path.write_text(json.dumps(job))
+    manager.sweep(interval=0)
+    assert manager.get(job['id'])['status'] == status
+
+    # Its process went away: it keeps its last status until a sweep fails it
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    job['owner'] = exited.pid
+    path.write_text(json.dumps(job))
+    manager.sweep(interval=0)
+    failed = manager.get(job['id'])
+    assert failed['status'] == 'failed' and 'lost' in failed['error']
+
+    failed['finished_at'] -= 120
+    path.write_text(json.dumps(failed))
+    manager.sweep(interval=0)
+    assert not path.exists()
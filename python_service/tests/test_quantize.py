@@ -0,0 +1,48 @@
+"""Key tables and quantizing"""
+import numpy as np
+import pytest
+from generators.quantize import quantize, get_table, parse_key, scale_notes, MODES, POLICIES
+
+
+@pytest.mark.parametrize('key', ['C_MAJOR', 'A_MINOR', 'F#_DORIAN', 'Bb_MIXOLYDIAN'])
+@pytest.mark.parametrize('policy', POLICIES)
+def test_tables_land_in_the_key(key, policy):
+    tonic, mode = parse_key(key)
+    table = get_table(key, policy)
+    assert table.shape == (128,)
+    assert all((note - tonic) % 12 in MODES[mode] for note in table.tolist())
+    # Notes already in the key are left alone
+    in_key = scale_notes(key)
+    assert table[in_key].tolist() == in_key
+
+
+def test_policies_move_the_right_way():
+    notes = np.arange(128)
+    assert (get_table('C_MAJOR', 'up') >= np.minimum(notes, 127 - 1)).all()
+    assert (get_table('C_MAJOR', 'down')[1:] <= notes[1:]).all()
+    assert (abs(get_table('C_MAJOR', 'nearest').astype(int) - notes) <= 1).all()
+    assert quantize(61, 'C_MAJOR', 'up') == 62
+    assert quantize(61, 'C_MAJOR', 'down') == 60
+
+
+def test_quantize_keeps_the_input_kind_and_clamps():
+    assert quantize([61, -5, 300]) == [quantize(61), quantize(0), quantize(127)]
+    array = quantize(np.array([[61, 66], [68, 70]]), 'A_MINOR')
+    assert isinstance(array, np.ndarray) and array.shape == (2, 2)
+    assert array.tolist() == [quantize([61, 66], 'A_MINOR'), quantize([68, 70], 'A_MINOR')]
+
+
+def test_key_names():
+    assert parse_key('C') == parse_key('c_major') == (0, 'major')
+    assert parse_key('F# dorian') == (6, 'dorian')
+
+
+@pytest.mark.parametrize('key', ['H_MAJOR', 'C_LOCRIANISH', ''])
+def test_bad_keys_are_rejected(key):
+    with pytest.raises(ValueError):
+        parse_key(key)
+
+
+def test_scale_notes():
+    assert scale_notes('C_MAJOR', 40, 50) == [40, 41, 43, 45, 47, 48, 50]
+    assert scale_notes('A_MINOR', 57, 69) == [57, 59, 60, 62, 64, 65, 67, 69]
@@ -0,0 +1,24 @@
+"""Per-client rate limiting of the generation endpoints"""
+import app as service
+from admission import RateLimiter
+
+
+def test_rate_limited_request_is_refused_before_its_body_is_parsed(client, monkeypatch):
+    monkeypatch.setattr(service, 'rate_limiter', RateLimiter(rate=0.001, burst=1))
+    parsed = []
+    loads = service.app.json.loads
+
+    def counting_loads(*args, **kwargs):
+        parsed.append(True)
+        return loads(*args, **kwargs)
+    monkeypatch.setattr(service.app.json, 'loads', counting_loads)
+
+    headers = {'X-Client-Id': 'rate-limit-test'}
+    assert client.post('/api/generate/bass', json={'seed': 1, 'inline': True}, headers=headers).status_code == 200
+    assert len(parsed) == 1
+
+    response = client.post('/api/generate/bass', json={'seed': 2, 'inline': True}, headers=headers)
+    assert response.status_code == 429
+    assert len(parsed) == 1
+    assert int(response.headers['Retry-After']) >= 1
+    assert b'Too many requests' in response.data
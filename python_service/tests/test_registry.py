@@ -0,0 +1,69 @@
+"""Style registry and the local socket's generator ids"""
+import io
+import pytest
+from generators import STYLES, Style, Voice, register_style, shift, stack
+from generators.registry import RESERVED_NAMES
+from generators.smf import read_notes
+from local_socket import LocalSocketServer, SocketClient, encode_request, decode_request, generator_ids
+
+
+@pytest.fixture
+def power_chords():
+    style = register_style(Style('power-chords', 'power_chords', (
+        Voice('root', 'bass', shift(12)),
+        Voice('fifth', 'root', shift(7)),
+    )))
+    yield style
+    del STYLES[style.name]
+
+
+@pytest.mark.parametrize('name', RESERVED_NAMES)
+def test_reserved_names_are_rejected(name):
+    with pytest.raises(ValueError, match='reserved'):
+        register_style(Style(name, name, (Voice('bass', 'bass', None),)))
+    assert name not in STYLES
+
+
+@pytest.mark.parametrize('voices', [(), (Voice('third', 'root', stack(3)),)])
+def test_bad_voices_are_rejected(voices):
+    with pytest.raises(ValueError):
+        register_style(Style('broken', 'broken', voices))
+    assert 'broken' not in STYLES
+
+
+def test_duplicate_names_are_rejected():
+    with pytest.raises(ValueError, match='already registered'):
+        register_style(Style('bass', 'bass', (Voice('bass', 'bass', None),)))
+
+
+def test_registered_style_gets_its_generators(power_chords):
+    assert power_chords.generator.__name__ == 'generate_power_chords'
+    buffer = io.BytesIO()
+    power_chords.generator(buffer, seed=1)
+    notes = read_notes(buffer.getvalue())
+    roots, fifths = notes.pitch[0::2], notes.pitch[1::2]
+    assert ((fifths - roots) == 7).all()
+    assert power_chords.batch(3, seed=1).shape[2] == 2
+    assert next(power_chords.stream(10, seed=1)).shape == (10, 2)
+
+
+def test_existing_generator_ids_are_stable():
+    assert generator_ids()[:3] == ('bass', 'complex-chords', 'simple-chords')
+
+
+def test_socket_requests_round_trip(power_chords):
+    body = encode_request('power-chords', seed=-3, scale=[40, 45], rhythm=[0, 96, 192], key='A_MINOR', midi_format=1)
+    assert decode_request(body) == ('power-chords', {
+        'format': 1, 'seed': -3, 'key': 'A_MINOR', 'scale': [40, 45], 'rhythm': [0, 96, 192]})
+    assert decode_request(encode_request('bass')) == ('bass', {'format': 0})
+
+
+def test_new_style_over_the_socket(power_chords, tmp_path):
+    import app as service
+    server = LocalSocketServer(service.socket_generate, path=str(tmp_path / 'midi.sock'))
+    server.start()
+    with SocketClient(server.path) as client:
+        midi_bytes = client.generate('power-chords', seed=4)
+    buffer = io.BytesIO()
+    power_chords.generator(buffer, seed=4)
+    assert midi_bytes == buffer.getvalue()
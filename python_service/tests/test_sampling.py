@@ -0,0 +1,97 @@
+"""Alias tables, Markov chains and distribution parsing"""
+import random
+import numpy as np
+import pytest
+from generators.sampling import (AliasTable, MarkovTable, parse_distribution, normal_weights,
+                                 sample_degrees, choose_notes, choices, numpy_rng)
+
+DRAWS = 200000
+
+
+def test_alias_table_matches_its_weights():
+    weights = np.array([4, 1, 2, 0, 3, 1, 1], dtype=float)
+    counts = np.bincount(AliasTable(weights).sample(np.random.default_rng(0), DRAWS), minlength=7)
+    assert counts[3] == 0
+    assert np.allclose(counts / DRAWS, weights / weights.sum(), atol=0.005)
+
+
+def test_alias_table_single_draws_match_its_weights():
+    weights = [1, 0, 3]
+    table = AliasTable(weights)
+    rng = random.Random(0)
+    counts = np.bincount([table.draw(rng) for _ in range(50000)], minlength=3)
+    assert counts[1] == 0
+    assert abs(counts[2] / counts[0] - 3) < 0.15
+
+
+@pytest.mark.parametrize('weights', [[], [0, 0], [1, -1], [1, float('nan')]])
+def test_alias_table_rejects_bad_weights(weights):
+    with pytest.raises(ValueError):
+        AliasTable(weights)
+
+
+def test_markov_chain_follows_its_matrix():
+    # 0 -> 1 -> 2 -> 0 only
+    matrix = [[0, 1, 0], [0, 0, 1], [1, 0, 0]]
+    chain, last = MarkovTable(matrix, initial=[1, 0, 0]).sample(np.random.default_rng(0), 9)
+    assert chain.tolist() == [1, 2, 0, 1, 2, 0, 1, 2, 0]
+    assert last == 0
+
+    chains, last = MarkovTable(matrix).sample(np.random.default_rng(0), (5, 6))
+    assert ((chains[:, 1:] - chains[:, :-1]) % 3 == 1).all()
+    assert np.array_equal(last, chains[:, -1])
+
+
+def test_markov_chunks_continue_the_chain():
+    distribution = parse_distribution({'type': 'markov', 'matrix': [[0, 1], [1, 0]]}, 2)
+    rng = np.random.default_rng(1)
+    first, state = sample_degrees(distribution, rng, 5)
+    second, _ = sample_degrees(distribution, rng, 5, state)
+    chain = np.concatenate([first, second])
+    assert (chain[1:] != chain[:-1]).all()
+
+
+def test_markov_transition_frequencies():
+    matrix = np.array([[1, 3], [2, 2]], dtype=float)
+    chain, _ = MarkovTable(matrix).sample(np.random.default_rng(2), DRAWS)
+    after_zero = chain[1:][chain[:-1] == 0]
+    assert abs(after_zero.mean() - 0.75) < 0.01
+
+
+def test_normal_weights_sum_to_one_and_peak_in_the_middle():
+    weights = normal_weights(7)
+    assert abs(weights.sum() - 1) < 0.01
+    assert weights.argmax() == 3
+
+
+@pytest.mark.parametrize('spec', [
+    [1, 2], 'lognormal', {'type': 'markov', 'matrix': [[1] * 7] * 6},
+    {'type': 'markov', 'matrix': [[0] * 7] * 7}, {'type': 'normal', 'stddev': 0}, 42,
+])
+def test_parse_distribution_rejects_bad_specs(spec):
+    with pytest.raises(ValueError):
+        parse_distribution(spec, 7)
+
+
+def test_parsed_distributions_are_hashable():
+    assert parse_distribution('normal', 7) == parse_distribution({'type': 'normal'}, 7)
+    assert hash(parse_distribution([1] * 7, 7)) == hash(parse_distribution([1] * 7, 7))
+
+
+def test_choose_notes_without_distribution_is_uniform_over_the_scale():
+    notes, state = choose_notes([40, 43, 47], None, np.random.default_rng(0), 30000)
+    assert state is None
+    counts = np.unique(notes, return_counts=True)
+    assert counts[0].tolist() == [40, 43, 47]
+    assert (abs(counts[1] / 30000 - 1 / 3) < 0.02).all()
+
+
+def test_choices_is_seeded_by_its_random():
+    distribution = parse_distribution([1, 2, 3], 3)
+    assert choices([1, 2, 3], distribution, random.Random(4), 50) == \
+        choices([1, 2, 3], distribution, random.Random(4), 50)
+    assert choices([1, 2, 3], None, random.Random(4), 50) == random.Random(4).choices([1, 2, 3], k=50)
+
+
+def test_numpy_rng_hashes_other_seeds():
+    assert numpy_rng('a').integers(1 << 62) != numpy_rng('b').integers(1 << 62)
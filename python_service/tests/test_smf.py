@@ -0,0 +1,76 @@
+"""SMF writer and reader"""
+import io
+import numpy as np
+import pytest
+from generators import STYLES, notes_to_events, merge_voices
+from generators.midi_tools import stream_to_midi, data_to_midi, csv_to_bytes, rhythm_to_on_off
+from generators.registry import RHYTHM_DATA
+from generators.smf import END_TRACK_TICK, encode_file, read_notes
+from helpers import track_ends
+
+
+def test_format_0_matches_the_original_csv_path():
+    note_on, note_off = rhythm_to_on_off(RHYTHM_DATA)
+    pitches = [[40, 43, 45, 47, 48, 50][index % 6] for index in range(len(note_on))]
+    assert encode_file(notes_to_events(pitches, note_on, note_off)) == \
+        csv_to_bytes(data_to_midi(pitches, note_on, note_off))
+
+
+def test_format_0_keeps_the_legacy_end_track():
+    buffer = io.BytesIO()
+    STYLES['bass'].generator(buffer, seed=1)
+    ((last_note, end, _),) = track_ends(buffer.getvalue())
+    assert last_note > END_TRACK_TICK and end % (1 << 28) == END_TRACK_TICK
+
+
+@pytest.mark.parametrize('style', list(STYLES))
+def test_format_1_tracks_end_after_their_notes(style):
+    buffer = io.BytesIO()
+    STYLES[style].generator(buffer, seed=1, midi_format=1)
+    ends = track_ends(buffer.getvalue())
+    assert len(ends) == len(STYLES[style].voices)
+    for last_note, end, _ in ends:
+        assert end == max(last_note, END_TRACK_TICK)
+
+
+def test_streamed_track_ends_after_its_notes():
+    style = STYLES['complex-chords']
+    num_notes = 5000
+    size, chunks = stream_to_midi(style.stream(num_notes, seed=1, chunk_notes=1024), RHYTHM_DATA, num_notes,
+                                  len(style.voices))
+    midi_bytes = b''.join(chunks)
+    assert len(midi_bytes) == size
+    ((last_note, end, delta),) = track_ends(midi_bytes)
+    assert last_note > END_TRACK_TICK and end == last_note and delta == 0
+    assert len(read_notes(midi_bytes).pitch) == num_notes * len(style.voices)
+
+
+@pytest.mark.parametrize('style', list(STYLES))
+@pytest.mark.parametrize('midi_format', [0, 1])
+def test_generated_files_round_trip(style, midi_format):
+    buffer = io.BytesIO()
+    STYLES[style].generator(buffer, seed=5, midi_format=midi_format)
+    notes = read_notes(buffer.getvalue())
+    num_voices = len(STYLES[style].voices)
+    note_on, note_off = rhythm_to_on_off(RHYTHM_DATA)
+    num_notes = len(notes.pitch) // num_voices
+    assert sorted(set(notes.on.tolist())) == note_on[:num_notes]
+    assert sorted(set(notes.off.tolist())) == note_off[:num_notes]
+    assert set(notes.velocity.tolist()) == {100}
+    assert len(set(notes.track.tolist())) == (num_voices if midi_format == 1 else 1)
+    assert notes.resolution == 96
+
+
+def test_encode_read_round_trip():
+    rng = np.random.default_rng(0)
+    ticks = np.cumsum(rng.integers(1, 500, size=300))
+    pitches = rng.integers(0, 128, size=300)
+    # Notes overlap, so the events are put in tick order first
+    events = merge_voices([notes_to_events(pitches, ticks, ticks + rng.integers(1, 50, size=300))])
+    notes = read_notes(encode_file(events))
+    assert notes.pitch.tolist() == pitches.tolist()
+    assert notes.on.tolist() == ticks.tolist()
+    assert (notes.off > notes.on).all()
+    # Same bytes from a file object as from bytes
+    from_stream = read_notes(io.BytesIO(encode_file(events)))
+    assert from_stream.pitch.tolist() == notes.pitch.tolist()
@@ -0,0 +1,58 @@
+"""Sharded output files and the sweeper"""
+import os
+import time
+import pytest
+from storage import OutputSweeper, path_for, open_output, check_filename, content_filename, is_content_addressed
+
+
+def write(root, name, size, age):
+    path = path_for(name, str(root))
+    with open(path, 'wb') as output_file:
+        output_file.write(b'x' * size)
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+    return path
+
+
+def test_paths_are_sharded_and_checked(tmp_path):
+    path = path_for('bass_1.mid', str(tmp_path))
+    assert os.path.relpath(path, tmp_path).count(os.sep) == 2
+    for name in ('../x.mid', '.hidden', ''):
+        with pytest.raises(ValueError):
+            check_filename(name)
+    assert open_output('missing.mid', str(tmp_path)) == (None, None)
+    assert is_content_addressed(content_filename('bass', 'ab' * 32))
+    assert not is_content_addressed('bass_1712345678_3f9a0c1d2e4b.mid')
+
+
+def test_open_output_finds_sharded_and_flat_files(tmp_path):
+    write(tmp_path, 'sharded.mid', 10, 0)
+    (tmp_path / 'flat.mid').write_bytes(b'abc')
+    for name, size in (('sharded.mid', 10), ('flat.mid', 3)):
+        output_file, stat = open_output(name, str(tmp_path))
+        output_file.close()
+        assert stat.st_size == size
+
+
+def test_sweeper_expires_old_files_and_keeps_referenced_ones(tmp_path):
+    manifest = tmp_path / 'referenced.txt'
+    manifest.write_text('# project files\nkept.mid\n')
+    old = write(tmp_path, 'old.mid', 10, 200)
+    kept = write(tmp_path, 'kept.mid', 10, 200)
+    new = write(tmp_path, 'new.mid', 10, 0)
+    flat = tmp_path / 'flat.mid'
+    flat.write_bytes(b'x')
+    os.utime(flat, (0, 0))
+
+    sweeper = OutputSweeper(root=str(tmp_path), ttl=100, max_bytes=0, manifest_path=str(manifest))
+    assert sweeper.sweep()
+    assert not os.path.exists(old)
+    assert os.path.exists(kept) and os.path.exists(new) and flat.exists()
+    assert sweeper.stats() == {'deleted_files': 1, 'deleted_bytes': 10}
+
+
+def test_sweeper_quota_removes_oldest_first(tmp_path):
+    paths = [write(tmp_path, f'file_{index}.mid', 100, 50 - index) for index in range(5)]
+    sweeper = OutputSweeper(root=str(tmp_path), ttl=0, max_bytes=250, manifest_path='')
+    sweeper.sweep()
+    assert [os.path.exists(path) for path in paths] == [False, False, False, True, True]
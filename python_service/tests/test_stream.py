@@ -0,0 +1,57 @@
+"""Streaming generation: /api/generate/stream and the registry stream generators"""
+import pytest
+import numpy as np
+from generators import STYLES
+from generators.sampling import numpy_rng
+
+
+def test_numpy_rng_keeps_integer_seeds():
+    assert numpy_rng(42).integers(0, 1 << 30) == np.random.default_rng(42).integers(0, 1 << 30)
+
+
+@pytest.mark.parametrize('seed', ['abc', -5])
+def test_numpy_rng_accepts_string_and_negative_seeds(seed):
+    assert numpy_rng(seed).integers(0, 1 << 30) == numpy_rng(seed).integers(0, 1 << 30)
+
+
+@pytest.mark.parametrize('style', list(STYLES))
+def test_stream_string_seed_is_deterministic(style):
+    first = [chunk.tolist() for chunk in STYLES[style].stream(300, seed='abc', chunk_notes=128)]
+    second = [chunk.tolist() for chunk in STYLES[style].stream(300, seed='abc', chunk_notes=128)]
+    assert first == second
+    assert sum(len(chunk) for chunk in first) == 300
+
+
+def test_stream_rejects_bad_arguments_before_streaming():
+    # Raised by the call itself, not by the first next()
+    with pytest.raises(ValueError):
+        STYLES['bass'].stream(10, distribution=[1, 2])
+
+
+def test_stream_endpoint_string_seed(client):
+    payload = {'type': 'complex-chords', 'seconds': 60, 'seed': 'abc'}
+    first = client.post('/api/generate/stream', json=payload)
+    second = client.post('/api/generate/stream', json=payload)
+    assert first.status_code == 200
+    assert first.mimetype == 'audio/midi'
+    assert len(first.data) == first.content_length
+    assert first.data == second.data
+
+
+@pytest.mark.parametrize('payload', [
+    {'seconds': 1e308}, {'notes': 1e400}, {'seconds': float('inf')}, {'seconds': float('nan')},
+    {'seconds': 10, 'bpm': 1e308}, {'seconds': -1}, {'seconds': '60'}, {'seconds': True},
+    {'notes': 10.5}, {'notes': '100'}, {'notes': 10 ** 30}, {'notes': -5}, {},
+])
+def test_stream_length_must_be_a_sane_number(client, payload):
+    response = client.post('/api/generate/stream', json={'type': 'bass', **payload})
+    assert response.status_code == 400
+    assert response.json['success'] is False
+
+
+def test_stream_length_in_notes_or_seconds(client):
+    by_notes = client.post('/api/generate/stream', json={'type': 'bass', 'notes': 46.0, 'seed': 1})
+    # The default rhythm loops every 6240 ticks (23 notes): two loops at 120 bpm are 65 seconds
+    by_seconds = client.post('/api/generate/stream', json={'type': 'bass', 'seconds': 65, 'seed': 1})
+    assert by_notes.status_code == by_seconds.status_code == 200
+    assert by_notes.data == by_seconds.data
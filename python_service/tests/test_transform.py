@@ -0,0 +1,39 @@
+"""Transform pipelines over existing MIDI files"""
+import io
+import pytest
+from generators import STYLES
+from generators.smf import END_TRACK_TICK
+from generators.transform import transform_midi, parse_operations
+from helpers import track_ends
+
+PIPELINE = parse_operations([
+    {'op': 'transpose', 'semitones': -3},
+    {'op': 'revoice', 'style': 'complex-chords', 'key': 'A_MINOR', 'seed': 7},
+    {'op': 'stretch', 'factor': 1.5},
+])
+
+
+def generated(style='bass', seed=1, rhythm=None):
+    buffer = io.BytesIO()
+    STYLES[style].generator(buffer, seed=seed, rhythm=rhythm)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('midi_format', [0, 1])
+def test_transformed_tracks_end_after_their_notes(midi_format):
+    output = transform_midi(generated(), PIPELINE, midi_format=midi_format)
+    for last_note, end, delta in track_ends(output):
+        assert delta < 0x4000
+        assert end == max(last_note, END_TRACK_TICK)
+
+
+def test_short_transformed_track_ends_at_end_track_tick():
+    source = generated(rhythm=[0, 96, 192, 288])
+    output = transform_midi(source, parse_operations([{'op': 'transpose', 'semitones': 2}]))
+    ((last_note, end, _),) = track_ends(output)
+    assert last_note < END_TRACK_TICK == end
+
+
+def test_transform_is_deterministic():
+    source = generated('simple-chords', seed=3)
+    assert transform_midi(source, PIPELINE) == transform_midi(source, PIPELINE)
@@ -0,0 +1,266 @@
+"""
+Worker Pool for MIDI Generation
+Runs generation jobs on a process pool so batches use every core
+"""
+import io
+import os
+import atexit
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from config import BATCH_WORKERS, DEFAULT_SCALE, INDEX_ENABLED
+from generators import STYLES, transform_midi
+from storage import new_filename, path_for, open_output, write_atomic
+from note_index import NoteIndex
+
+_process_pool = None
+_note_index = None
+
+
+def get_process_pool():
+    """Create the shared process pool on first use"""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=BATCH_WORKERS)
+        atexit.register(_process_pool.shutdown, wait=False, cancel_futures=True)
+    return _process_pool
+
+
+def get_note_index():
+    """Open the note index on first use (one per process; appends are safe across processes)"""
+    global _note_index
+    if _note_index is None:
+        _note_index = NoteIndex()
+    return _note_index
+
+
+def index_written(filepath, midi_bytes):
+    """Add a file just written to OUTPUT_DIR to the note index (failures are logged, never raised)"""
+    if not INDEX_ENABLED:
+        return
+    try:
+        get_note_index().add(os.path.basename(filepath), midi_bytes)
+    except Exception as e:
+        print(f"Error indexing {filepath}: {str(e)}")
+        traceback.print_exc()
+
+
+def run_generation(job_type, filepath, scale=None, rhythm=None, seed=None, key=None, midi_format=0,
+                   distribution=None):
+    """
+    Run one generation job (executed inside a pool worker)
+    
+    Errors are caught here and returned so one bad job doesn't fail the batch.
+    
+    Returns:
+        dict: {'success': True, 'filepath': ..., 'filename': ...} or {'success': False, 'error': ...}
+    """
+    try:
+        buffer = io.BytesIO()
+        STYLES[job_type].generator(buffer, scale=scale, rhythm=rhythm, seed=seed, key=key,
+                                   midi_format=midi_format, distribution=distribution)
+        write_atomic(filepath, buffer.getvalue())
+        index_written(filepath, buffer.getvalue())
+        return {
+            'success': True,
+            'filepath': filepath,
+            'filename': os.path.basename(filepath)
+        }
+    except Exception as e:
+        print(f"Error generating {job_type} in worker: {str(e)}")
+        traceback.print_exc()
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
+def run_jobs(jobs):
+    """
+    Fan a list of job specs out across the process pool and wait for all of them
+    
+    Each job is a dict with "type" (a registered style, see generators/registry.py) and optional
+    "filename", "scale", "rhythm", "seed", "key" and "format".
+    
+    Returns:
+        list: One result dict per job, in order (failed jobs get an error instead)
+    """
+    pool = get_process_pool()
+    results = [None] * len(jobs)
+    futures = {}
+    
+    for index, job in enumerate(jobs):
+        if not isinstance(job, dict) or job.get('type') not in STYLES:
+            job_type = job.get('type') if isinstance(job, dict) else None
+            results[index] = {
+                'success': False,
+                'error': f'Unknown job type: {job_type}'
+            }
+            continue
+        
+        # Generate unique filename if not provided
+        filename = job.get('filename')
+        if not filename:
+            filename = new_filename(STYLES[job['type']].prefix)
+        
+        # Ensure .mid extension
+        if not filename.endswith('.mid'):
+            filename += '.mid'
+        
+        try:
+            filepath = path_for(filename)
+        except ValueError as e:
+            results[index] = {
+                'success': False,
+                'error': str(e)
+            }
+            continue
+        
+        futures[index] = pool.submit(run_generation, job['type'], filepath,
+                                     job.get('scale'), job.get('rhythm'), job.get('seed'),
+                                     job.get('key') or DEFAULT_SCALE, job.get('format', 0),
+                                     job.get('distribution'))
+    
+    for index, future in futures.items():
+        try:
+            results[index] = future.result()
+        except Exception as e:
+            print(f"Error running batch job {index}: {str(e)}")
+            results[index] = {
+                'success': False,
+                'error': str(e)
+            }
+    
+    return results
+
+
+def render_job(job_type, scale=None, rhythm=None, seed=None, key=None, midi_format=0, distribution=None):
+    """Run one generation job into memory (executed inside a pool worker) and return the MIDI bytes"""
+    buffer = io.BytesIO()
+    STYLES[job_type].generator(buffer, scale=scale, rhythm=rhythm, seed=seed, key=key, midi_format=midi_format,
+                               distribution=distribution)
+    return buffer.getvalue()
+
+
+def run_transform(source, filepath, operations, midi_format=0):
+    """
+    Run one pipeline over one file (executed inside a pool worker)
+    
+    Args:
+        source: Stored filename, or the bytes of an uploaded file
+        filepath: Where to write the result
+        operations: Result of parse_operations
+        midi_format: 0 for one merged track, 1 for one track per voice
+    
+    Returns:
+        dict: {'success': True, 'filepath': ..., 'filename': ...} or {'success': False, 'error': ...}
+    """
+    try:
+        if isinstance(source, str):
+            midi_file, _ = open_output(source)
+            if midi_file is None:
+                raise FileNotFoundError('File not found')
+            with midi_file:
+                midi_bytes = transform_midi(midi_file, operations, midi_format)
+        else:
+            midi_bytes = transform_midi(source, operations, midi_format)
+        write_atomic(filepath, midi_bytes)
+        index_written(filepath, midi_bytes)
+        return {
+            'success': True,
+            'filepath': filepath,
+            'filename': os.path.basename(filepath)
+        }
+    except (ValueError, FileNotFoundError) as e:
+        # Unreadable or missing input: the file's own result says so
+        return {
+            'success': False,
+            'error': str(e)
+        }
+    except Exception as e:
+        print(f"Error transforming file in worker: {str(e)}")
+        traceback.print_exc()
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
+def run_transforms(sources, operations, midi_format=0):
+    """
+    Fan one pipeline out across the process pool, a file per task, and wait for all of them
+    
+    Args:
+        sources: (name, source) pairs; source is a stored filename or uploaded bytes
+        operations: Result of parse_operations
+        midi_format: 0 for one merged track, 1 for one track per voice
+    
+    Returns:
+        list: One result dict per file, in order, each with the "source" name it came from
+    """
+    pool = get_process_pool()
+    futures = [(name, pool.submit(run_transform, source, path_for(new_filename('transformed')),
+                                  operations, midi_format))
+               for name, source in sources]
+    
+    results = []
+    for name, future in futures:
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Error running transform of {name}: {str(e)}")
+            result = {
+                'success': False,
+                'error': str(e)
+            }
+        results.append({'source': name, **result})
+    return results
+
+
+def iter_rendered(jobs, window=BATCH_WORKERS):
+    """
+    Render job specs (same format as run_jobs) on the process pool without
+    touching the disk, yielding results in order as they finish
+    
+    At most window jobs are in flight at once, so memory stays bounded
+    however many jobs there are.
+    
+    Yields:
+        tuple: (filename, MIDI bytes, None), or (filename, None, error message) for a failed job
+    """
+    pool = get_process_pool()
+    pending = deque()
+    
+    def submit(index, job):
+        if not isinstance(job, dict) or job.get('type') not in STYLES:
+            job_type = job.get('type') if isinstance(job, dict) else None
+            return f'job_{index}.mid', f'Unknown job type: {job_type}'
+        filename = job.get('filename') or new_filename(STYLES[job['type']].prefix)
+        if not filename.endswith('.mid'):
+            filename += '.mid'
+        return filename, pool.submit(render_job, job['type'], job.get('scale'), job.get('rhythm'), job.get('seed'),
+                                     job.get('key') or DEFAULT_SCALE, job.get('format', 0),
+                                     job.get('distribution'))
+    
+    jobs = enumerate(jobs)
+    for index, job in jobs:
+        pending.append(submit(index, job))
+        if len(pending) >= window:
+            break
+    
+    while pending:
+        filename, future = pending.popleft()
+        # Keep the window full while this result is consumed
+        for index, job in jobs:
+            pending.append(submit(index, job))
+            break
+        if isinstance(future, str):
+            yield filename, None, future
+            continue
+        try:
+            midi_bytes = future.result()
+        except Exception as e:
+            print(f"Error rendering export job {filename}: {str(e)}")
+            yield filename, None, str(e)
+            continue
+        yield filename, midi_bytes, None
@@ -15,16 +15,25 @@ php database/migrate_display_name.php
 PHP_PORT=${PORT:-8080}
 
 # Start Python MIDI service in the background on FIXED port 5001
+# (gunicorn workers/threads/timeouts come from python_service/config.py env vars)
 echo "Starting Python MIDI service on port 5001..."
 cd python_service
 # Unset PORT so Python uses its default (5001) instead of Railway's PORT
 unset PORT
-./venv/bin/python app.py &
+./venv/bin/python serve.py &
 PYTHON_PID=$!
-cd ..
 
-# Give Python service time to start
-sleep 2
+# Wait until the service reports ready (warmed up), up to 30 seconds
+for i in $(seq 1 60); do
+    if ! kill -0 $PYTHON_PID 2>/dev/null; then
+        break
+    fi
+    if ./venv/bin/python -c "import urllib.request; urllib.request.urlopen('http://127.0.0.1:5001/ready', timeout=1)" 2>/dev/null; then
+        break
+    fi
+    sleep 0.5
+done
+cd ..
 
 # Check if Python service started successfully
 if ! kill -0 $PYTHON_PID 2>/dev/null; then
@@ -38,6 +47,7 @@ echo "✅ Python service started (PID: $PYTHON_PID)"
 echo "Starting PHP web server on port $PHP_PORT..."
 php -S 0.0.0.0:$PHP_PORT
 
-# If PHP exits, kill Python service
-kill $PYTHON_PID 2>/dev/null
+# If PHP exits, stop Python service (SIGTERM lets in-flight requests drain)
+kill -TERM $PYTHON_PID 2>/dev/null
+wait $PYTHON_PID 2>/dev/null
 